@@ -0,0 +1,196 @@
+from __future__ import annotations
+from typing import Callable
+import os
+import pickle
+import traceback
+from django.db import connections
+from .sim import (
+    NetworkSnapshot,
+    Route,
+    SimulationContext,
+    Station,
+    get_data,
+    process_simulation_output,
+)
+
+
+class Checkpoint:
+    """
+    A simulation which has been run up to some point in time and paused there. Branches are
+    forked from the checkpoint with os.fork, so each branch starts from an exact copy of the
+    whole simulation (SimPy environment and its pending processes, stations, transporters,
+    groups and the sampler's RNG state) without anything being serialised, and only the part
+    of the simulation after the checkpoint is run again for each branch. The pages of memory
+    holding the checkpoint are shared between branches until a branch writes to them.
+
+    Forking is only available on POSIX systems.
+    """
+
+    def __init__(
+        self,
+        env: SimulationContext,
+        stations: list[Station],
+        trips: list,
+        routes: list[Route],
+        itineraries: list,
+        end_time: int,
+    ) -> None:
+        self.env = env
+        self.stations = stations
+        self.trips = trips
+        self.routes = routes
+        self.itineraries = itineraries
+        self.end_time = end_time  # Time (relative to env_start) the branches run until
+
+    def station(self, station_id: str) -> Station:
+        for station in self.stations:
+            if station.id == station_id:
+                return station
+        raise KeyError(f"No station with id {station_id}")
+
+    def route(self, route_id: str) -> Route:
+        for route in self.routes:
+            if route.id == route_id:
+                return route
+        raise KeyError(f"No route with id {route_id}")
+
+    def fork(
+        self, sim_id: int, branches: dict[str, Callable[[Checkpoint], None] | None]
+    ) -> dict[str, dict]:
+        """
+        Runs every branch in its own forked process. Each branch's modifier is called with
+        the branch's copy of the checkpoint (None leaves it unchanged), then the branch is run
+        to the end of the simulation. Returns the simulation output of each branch by name.
+        Branches share the checkpoint's RNG state, so differences between branches come from
+        their modifications rather than the randomness.
+        """
+
+        # Forked branches must not share the parent's database connections
+        connections.close_all()
+
+        children = {}
+        for name, modify in branches.items():
+            read_fd, write_fd = os.pipe()
+            pid = os.fork()
+            if pid == 0:
+                os.close(read_fd)
+                self.run_branch(sim_id, modify, write_fd)
+            os.close(write_fd)
+            children[name] = (pid, read_fd)
+
+        outputs = {}
+        errors = {}
+        for name, (pid, read_fd) in children.items():
+            with os.fdopen(read_fd, "rb") as pipe:
+                data = pipe.read()
+            os.waitpid(pid, 0)
+
+            if not data:
+                errors[name] = "Branch exited without a result"
+                continue
+            ok, result = pickle.loads(data)
+            if ok:
+                outputs[name] = result
+            else:
+                errors[name] = result
+
+        if errors:
+            raise RuntimeError(
+                "\n".join(f"Branch '{name}' failed: {e}" for name, e in errors.items())
+            )
+        return outputs
+
+    def run_branch(
+        self, sim_id: int, modify: Callable[[Checkpoint], None] | None, write_fd: int
+    ) -> None:
+        """
+        Body of a forked branch. Sends (True, output) or (False, traceback) back through the
+        pipe and exits the child process without returning to the caller.
+        """
+
+        try:
+            if modify is not None:
+                modify(self)
+            if self.env.now < self.end_time:
+                self.env.run(self.end_time)
+            output = process_simulation_output(
+                self.stations,
+                self.routes,
+                self.itineraries,
+                sim_id,
+                self.trips,
+                self.env,
+            )
+            output["Seed"] = self.env.sampler.seed
+            payload = (True, output)
+        except BaseException:
+            payload = (False, traceback.format_exc())
+
+        with os.fdopen(write_fd, "wb") as pipe:
+            pipe.write(pickle.dumps(payload, protocol=pickle.HIGHEST_PROTOCOL))
+        os._exit(0)
+
+
+def run_to_checkpoint(
+    user_data: dict, checkpoint_time: int, network: NetworkSnapshot | None = None
+) -> Checkpoint:
+    """
+    Builds the simulation described by user_data and runs it until 'checkpoint_time', which is
+    given in minutes since midnight like env_start.
+    """
+
+    env_start = user_data["env_start"]
+    time_horizon = user_data["time_horizon"]
+    if not env_start <= checkpoint_time <= env_start + time_horizon:
+        raise ValueError(
+            f"Checkpoint time {checkpoint_time} is outside of the simulation "
+            f"({env_start} to {env_start + time_horizon})"
+        )
+
+    env = SimulationContext(seed=user_data.get("seed"))
+    stations, trips, routes, itineraries, _ = get_data(
+        env,
+        env_start,
+        time_horizon,
+        user_data["itineraries"],
+        user_data["snapshot_date"],
+        user_data["active_suburbs"],
+        user_data["active_stations"],
+        network,
+    )
+    if checkpoint_time > env_start:
+        env.run(checkpoint_time - env_start)
+
+    return Checkpoint(env, stations, trips, routes, itineraries, time_horizon)
+
+
+def close_station(station_id: str) -> Callable[[Checkpoint], None]:
+    """
+    Modifier which closes a station from the checkpoint onwards, so nobody can board there.
+    """
+
+    def modify(checkpoint: Checkpoint) -> None:
+        checkpoint.station(station_id).closed = True
+
+    return modify
+
+
+def add_transporters(route_id: str, extra: int) -> Callable[[Checkpoint], None]:
+    """
+    Modifier which lets 'extra' more transporters be spawned on a route from the checkpoint
+    onwards. If the route had already spawned its limit, its spawner is restarted on the trips
+    which depart at or after the checkpoint, so trips missed while the route was at its limit
+    are skipped rather than all spawned at once.
+    """
+
+    def modify(checkpoint: Checkpoint) -> None:
+        route = checkpoint.route(route_id)
+        route.transporter_spawn_max += extra
+        if not route.running.is_alive:
+            now = route.env_start + checkpoint.env.now
+            route.spawn_schedule = [
+                entry for entry in route.spawn_schedule if entry[0] >= now
+            ]
+            route.running = checkpoint.env.process(route.initiate_route())
+
+    return modify
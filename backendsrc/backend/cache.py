@@ -0,0 +1,149 @@
+from __future__ import annotations
+from hashlib import sha256
+from pathlib import Path
+from uuid import uuid4
+import json
+import os
+import pickle
+
+
+# Directory results are cached in, and how many bytes of results it may hold
+CACHE_DIR = Path(
+    os.environ.get(
+        "SIM_CACHE_DIR", Path(__file__).resolve().parent.parent / "sim_cache"
+    )
+)
+CACHE_MAX_BYTES = int(os.environ.get("SIM_CACHE_MAX_BYTES", 256 * 1024 * 1024))
+
+# Fields of a simulation request which decide its output
+CACHE_FIELDS = [
+    "env_start",
+    "time_horizon",
+    "itineraries",
+    "snapshot_date",
+    "active_suburbs",
+    "active_stations",
+    "seed",
+    "engine",
+]
+# List fields whose order doesn't change the output, which are sorted before hashing
+UNORDERED_FIELDS = ["active_suburbs", "active_stations"]
+GTFS_VERSION_FILE = "gtfs_version"
+RESULT_SUFFIX = ".pkl"
+
+
+class ResultCache:
+    """
+    Content addressed cache of simulation outputs on local disk. Each output is stored in its
+    own file named after a hash of the request fields which decide it (CACHE_FIELDS, written
+    out canonically) and the version of the GTFS data in the database, so an identical request
+    is served from the file instead of being run again. Lists whose order doesn't matter to the
+    simulation are sorted first, as are the itineraries (by id, the order get_data runs them
+    in), so the same request with its lists in another order is also a hit.
+
+    Only requests with a "seed" are cached, as a request without one is meant to be a fresh
+    random run every time. Files are touched whenever they are read, and once the directory
+    holds more than 'max_bytes' the least recently used files are removed. Reloading the GTFS
+    data should call invalidate, which moves to a new GTFS version and clears the cache.
+    """
+
+    def __init__(self, directory: Path = CACHE_DIR, max_bytes: int = CACHE_MAX_BYTES):
+        self.directory = Path(directory)
+        self.max_bytes = max_bytes
+
+    def key(self, user_data: dict) -> str | None:
+        if user_data.get("seed") is None:
+            return None
+
+        request = {field: user_data.get(field) for field in CACHE_FIELDS}
+        request["engine"] = request["engine"] or "agent"
+        for field in UNORDERED_FIELDS:
+            if request[field] is not None:
+                request[field] = sorted(request[field])
+        if request["itineraries"] is not None:
+            request["itineraries"] = sorted(
+                request["itineraries"], key=lambda itinerary: itinerary["itinerary_id"]
+            )
+        request["gtfs_version"] = self.gtfs_version()
+        canonical = json.dumps(
+            request, sort_keys=True, separators=(",", ":"), default=str
+        )
+        return sha256(canonical.encode()).hexdigest()
+
+    def path(self, key: str) -> Path:
+        return self.directory / f"{key}{RESULT_SUFFIX}"
+
+    def get(self, user_data: dict) -> dict | None:
+        """
+        Returns the cached output for the request, or None if it hasn't been cached.
+        """
+
+        key = self.key(user_data)
+        if key is None:
+            return None
+
+        path = self.path(key)
+        try:
+            with open(path, "rb") as f:
+                output = pickle.load(f)
+            os.utime(path)
+        except (OSError, pickle.UnpicklingError, EOFError):
+            return None
+        return output
+
+    def put(self, user_data: dict, output: dict) -> None:
+        key = self.key(user_data)
+        if key is None:
+            return
+
+        self.directory.mkdir(parents=True, exist_ok=True)
+        # Written to a temporary file first so a reader never sees half of a result
+        temp = self.directory / f".{key}.{uuid4().hex}"
+        with open(temp, "wb") as f:
+            pickle.dump(output, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(temp, self.path(key))
+        self.evict()
+
+    def evict(self) -> None:
+        """
+        Removes the least recently used results until the cache fits in max_bytes.
+        """
+
+        entries = []
+        for path in self.directory.glob(f"*{RESULT_SUFFIX}"):
+            try:
+                stat = path.stat()
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+
+        size = sum(entry[1] for entry in entries)
+        entries.sort()
+        for _, entry_size, path in entries:
+            if size <= self.max_bytes:
+                break
+            path.unlink(missing_ok=True)
+            size -= entry_size
+
+    def clear(self) -> None:
+        for path in self.directory.glob(f"*{RESULT_SUFFIX}"):
+            path.unlink(missing_ok=True)
+
+    def gtfs_version(self) -> str:
+        try:
+            return (self.directory / GTFS_VERSION_FILE).read_text().strip()
+        except OSError:
+            return ""
+
+    def invalidate(self) -> None:
+        """
+        Moves the cache to a new GTFS version and removes every cached result. Called whenever
+        the GTFS data in the database is reloaded.
+        """
+
+        self.directory.mkdir(parents=True, exist_ok=True)
+        (self.directory / GTFS_VERSION_FILE).write_text(uuid4().hex)
+        self.clear()
+
+
+RESULTS = ResultCache()
@@ -0,0 +1,120 @@
+from datetime import date, time
+from pathlib import Path
+import os
+import sys
+import django
+import pytest
+
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "backend.settings")
+django.setup()
+
+from django.db import transaction  # noqa: E402
+from db.models import (  # noqa: E402
+    Calendar as CalendarM,
+    Route as RouteM,
+    Shape as ShapeM,
+    Station as StationM,
+    Timetable as TimetableM,
+    Trip as TripM,
+)
+
+
+# Request for the network made by the 'network' fixture
+NETWORK_REQUEST = {
+    "env_start": 0,
+    "time_horizon": 60,
+    "itineraries": [
+        {
+            "itinerary_id": 0,
+            "routes": [{"route_id": "0", "start": "0", "end": "-2"}],
+        },
+        {
+            "itinerary_id": 1,
+            "routes": [
+                {"route_id": "walk", "start": "0", "end": "-3"},
+                {"route_id": "0", "start": "-3", "end": "-2"},
+            ],
+        },
+    ],
+    "snapshot_date": "2023-09-15",
+    "active_suburbs": ["St Lucia"],
+    "active_stations": ["0"],
+    "seed": 5,
+}
+
+
+@pytest.fixture
+def rollback():
+    """
+    Runs the test inside a transaction which is rolled back afterwards, so nothing it writes
+    is left in the database.
+    """
+
+    with transaction.atomic():
+        yield
+        transaction.set_rollback(True)
+
+
+@pytest.fixture
+def network(rollback):
+    """
+    Adds a bus route with two trips through three stations to the database, the same network
+    as test_sim.py, and returns a copy of NETWORK_REQUEST to simulate it. Rows left behind with
+    the same ids (e.g. by test_sim.py) are removed first, until the transaction is rolled back.
+    """
+
+    StationM.objects.filter(station_id__in=["0", "-3", "-2"]).delete()
+    RouteM.objects.filter(route_id="0").delete()
+
+    service = CalendarM.objects.create(
+        service_id="test",
+        monday=False,
+        tuesday=False,
+        wednesday=False,
+        thursday=False,
+        friday=True,
+        saturday=False,
+        sunday=False,
+        start_date=date(2023, 9, 15),
+        end_date=date(2023, 9, 15),
+    )
+    stations = [
+        StationM.objects.create(
+            station_id=station_id,
+            station_code=station_id,
+            name=name,
+            lat=lat,
+            long=lat,
+            location_type=3,
+            suburb="St Lucia",
+        )
+        for station_id, name, lat in [
+            ("0", "first stop", 0),
+            ("-3", "middle stop", 2),
+            ("-2", "last stop", 4),
+        ]
+    ]
+    route = RouteM.objects.create(
+        route_id="0", name="test", transport_type=3, capacity=50
+    )
+    shape = ShapeM.objects.create(
+        shape_id="test", shape_pt_lat=0, shape_pt_lon=0, shape_pt_sequence=0
+    )
+    ShapeM.objects.create(
+        shape_id="test", shape_pt_lat=4, shape_pt_lon=4, shape_pt_sequence=1
+    )
+
+    for trip_id, start in [("test_1", 10), ("test_2", 0)]:
+        trip = TripM.objects.create(
+            trip_id=trip_id, route_id=route, shape_id=shape, service_id=service
+        )
+        for sequence, station in enumerate(stations, 1):
+            TimetableM.objects.create(
+                trip_id=trip,
+                station=station,
+                arrival_time=time(0, start + 10 * (sequence - 1)),
+                sequence=sequence,
+            )
+
+    return dict(NETWORK_REQUEST)
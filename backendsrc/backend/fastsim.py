@@ -0,0 +1,388 @@
+from __future__ import annotations
+from heapq import heapify, heappop, heappush
+from math import ceil, floor
+import numpy as np
+from .recorder import ARRIVAL, PASSENGERS, STATION_PEOPLE, WALK_END, WALK_START
+from .sim import (
+    Bus,
+    Itinerary,
+    Route,
+    SimulationContext,
+    Station,
+    Suburb,
+    Train,
+    Walk,
+)
+
+
+WALK_WAIT = 0.5  # Minutes people wait at a stop before setting off on a walk
+
+
+class FastSimulation:
+    """
+    Macroscopic engine which runs the network built by get_data without any SimPy processes.
+    Instead of following groups of people, it keeps arrays of how many people are waiting at
+    each station for each stage of each itinerary, how many are riding each vehicle, and how
+    many are walking, and steps them forward one minute at a time. Boarding and alighting are
+    array operations over the stages, so the cost of a step doesn't depend on how many people
+    are in the simulation.
+
+    A stage is one leg of one itinerary. People waiting at a station in stage q want to ride
+    the route of leg q, and get off where that leg ends. Compared to the SimPy engine:
+
+    - Vehicles keep to their timetable, and boarding, alighting and bay queues take no time.
+    - People waiting for a route board in proportion to how many are waiting in each stage,
+      rather than in the order they arrived. Counts are fractional until they are reported.
+    - Suburbs and stations split people by their expected share rather than at random.
+    - Wait times are worked out per person from the number of people at each station over
+      time, rather than per group from journey logs.
+
+    Once run, the results are written back into the stations, routes and walks the network was
+    built from, so the output can be processed exactly like the SimPy engine's.
+    """
+
+    def __init__(
+        self,
+        env: SimulationContext,
+        env_start: int,
+        time_horizon: int,
+        stations: list[Station],
+        routes: list[Route],
+        suburbs: list[Suburb],
+    ) -> None:
+        self.env = env
+        self.env_start = env_start
+        self.time_horizon = time_horizon
+        self.stations = stations
+        self.routes = routes
+        self.station_index = {station: i for i, station in enumerate(stations)}
+        self.route_index = {route: i for i, route in enumerate(routes)}
+
+        self.build_stages(env.itineraries)
+        self.build_vehicles()
+        self.build_distributions(suburbs)
+
+        self.waiting = np.zeros((len(stations), self.num_stages))
+        self.finished = np.zeros(len(stations))
+        self.onboard = np.zeros((len(self.vehicles), self.num_stages))
+        self.arrivals = np.zeros(
+            len(stations)
+        )  # People who have arrived at each station
+        self.person_minutes = np.zeros(
+            len(stations)
+        )  # Total time spent at each station
+        self.walk_arrivals: dict[int, list[tuple[Walk, np.ndarray, int, float]]] = {}
+        self.active_steps: list[int] = []  # Heap of the steps left with something to do
+        self.scheduled: set[int] = set()  # Steps which have been pushed onto the heap
+
+    def build_stages(self, itineraries: list[Itinerary]) -> None:
+        """
+        Numbers every leg of every itinerary as a stage, and works out where people in each
+        stage go when they are put down at each station (see Station.put).
+        """
+
+        self.first_stage = []  # Stage of the first leg of each itinerary
+        stage_route = []
+        stage_gets_off = []
+        stage_route_last = []
+        stage_last_leg = []
+        for itinerary in itineraries:
+            self.first_stage.append(len(stage_route))
+            for leg, (route, gets_off_at) in enumerate(itinerary.routes):
+                stage_route.append(self.route_index[route])
+                stage_gets_off.append(self.station_index[gets_off_at])
+                stage_route_last.append(self.station_index[route.last_stop])
+                stage_last_leg.append(itinerary.last_leg(leg))
+
+        self.num_stages = len(stage_route)
+        self.stage_route = np.array(stage_route, dtype=int)
+        self.stage_gets_off = np.array(stage_gets_off, dtype=int)
+        stage_route_last = np.array(stage_route_last, dtype=int)
+        stage_last_leg = np.array(stage_last_leg, dtype=bool)
+        stages = np.arange(self.num_stages)
+
+        # Rows are stations, columns are stages
+        at_station = np.arange(len(self.stations))[:, None]
+        gets_off_here = self.stage_gets_off[None, :] == at_station
+        self.finishes_at = stage_last_leg[None, :] & gets_off_here
+        advances = ~stage_last_leg[None, :] & (
+            gets_off_here | (stage_route_last[None, :] == at_station)
+        )
+        self.next_stage = np.where(advances, stages + 1, stages)
+
+        self.route_stages = [
+            np.flatnonzero(self.stage_route == i) for i in range(len(self.routes))
+        ]
+        self.walks = [
+            (route, self.route_stages[i])
+            for i, route in enumerate(self.routes)
+            if route.get_type() == "Walk" and len(self.route_stages[i])
+        ]
+
+    def build_vehicles(self) -> None:
+        """
+        Creates a transporter for every departure in each route's spawn schedule (up to the
+        route's spawn limit for buses), and buckets every stop a transporter makes by the minute
+        it arrives.
+        """
+
+        self.vehicles = []
+        self.vehicle_paths = []
+        self.vehicle_events: dict[int, list[tuple[int, int]]] = {}
+
+        for route in self.routes:
+            if route.get_type() == "BusRoute":
+                schedule = route.spawn_schedule[: route.transporter_spawn_max]
+            elif route.get_type() == "TrainRoute":
+                schedule = route.spawn_schedule
+            else:
+                continue
+
+            for spawn_time, trip, timetable_index in schedule:
+                if route.get_type() == "BusRoute":
+                    vehicle = Bus(
+                        env=self.env,
+                        env_start=self.env_start,
+                        id=route.transporters_spawned,
+                        name=f"B{route.transporters_spawned}_{route.name}",
+                        trip=trip,
+                        route=route,
+                        location_index=timetable_index,
+                        people=[],
+                    )
+                    route.add_bus(vehicle)
+                    self.env.recorder.record(spawn_time, PASSENGERS, vehicle.entity, 0)
+                    stops = trip.stations[timetable_index:]
+                    durations = trip.leg_durations[timetable_index:]
+                else:
+                    start = route.get_stop_with_name(trip.timetable[timetable_index][0])
+                    vehicle = Train(
+                        env=self.env,
+                        env_start=self.env_start,
+                        id=route.transporters_spawned,
+                        name=f"T{route.transporters_spawned}_{route.name}",
+                        trip=trip,
+                        route=route,
+                        location_index=start,
+                        people=[],
+                    )
+                    route.add_train(vehicle)
+                    stops = route.stops[start : route.stops.index(route.last_stop) + 1]
+                    durations = [trip.leg_duration_to(stop) for stop in stops]
+                route.transporters_spawned += 1
+
+                v = len(self.vehicles)
+                self.vehicles.append(vehicle)
+                self.vehicle_paths.append([self.station_index[stop] for stop in stops])
+                time = spawn_time - self.env_start
+                for position in range(len(stops)):
+                    if position:
+                        time += durations[position]
+                    if time >= self.time_horizon:
+                        break
+                    self.vehicle_events.setdefault(ceil(time), []).append((v, position))
+
+    def build_distributions(self, suburbs: list[Suburb]) -> None:
+        """
+        Works out when each active suburb sends people out (following Suburb.suburb), and how
+        they are split across the suburb's stations and those stations' itineraries.
+        """
+
+        self.distributions: dict[int, list[tuple[int, np.ndarray]]] = {}
+        for suburb in suburbs:
+            if not suburb.active or not suburb.station_distribution:
+                continue
+
+            shares = []
+            total_share = sum(suburb.station_distribution.values())
+            for station, share in suburb.station_distribution.items():
+                itineraries = self.env.station_itinerary_lookup.get(station)
+                if not share or not itineraries:
+                    continue
+                stages = np.zeros(self.num_stages)
+                for itinerary in itineraries:
+                    stages[self.first_stage[itinerary]] += 1 / len(itineraries)
+                shares.append(
+                    (self.station_index[station], stages * share / total_share)
+                )
+
+            population = suburb.population
+            sends = []
+            time = 0
+            num_sends = 0
+            while num_sends < suburb.max_distributes:
+                if (time + self.env_start) % suburb.frequency == 0:
+                    sends.append((time, ceil(population / suburb.max_distributes)))
+                    population -= sends[-1][1]
+                    num_sends += 1
+                time += 1
+            if population > 0:
+                sends.append((time, population))
+
+            for time, num_people in sends:
+                if time >= self.time_horizon:
+                    continue
+                self.env.num_in_simulation += num_people
+                for station, stages in shares:
+                    self.distributions.setdefault(time, []).append(
+                        (station, stages * num_people)
+                    )
+
+    def run(self) -> dict[str, float]:
+        """
+        Runs the simulation to the end of the time horizon, writes the results back into the
+        network and returns the average wait at each station.
+
+        Only the minutes in which something is scheduled to happen (people leaving a suburb,
+        a walk ending or a vehicle stopping) are stepped. Nobody moves in between, so the time
+        people spend at stations during those stretches is added in one go.
+        """
+
+        self.scheduled = (
+            set(self.distributions) | set(self.vehicle_events) | set(self.walk_arrivals)
+        )
+        self.active_steps = list(self.scheduled)
+        heapify(self.active_steps)
+        totals = np.zeros(len(self.stations))
+        next_step = 0  # First step whose time at stations hasn't been added yet
+        while self.active_steps:
+            step = heappop(self.active_steps)
+            if step >= self.time_horizon:
+                break
+            now = step + self.env_start
+            self.person_minutes += totals * (step - next_step)
+
+            for station, people in self.distributions.get(step, []):
+                self.put(station, people)
+
+            for walk, people, walk_key, end in self.walk_arrivals.pop(step, []):
+                walk.people_count -= int(round(people.sum()))
+                self.env.recorder.record(end, WALK_END, walk.entity, walk_key)
+                self.put(self.station_index[walk.stops[1]], people)
+
+            for v, position in self.vehicle_events.get(step, []):
+                self.stop(v, position, now)
+
+            for walk, stages in self.walks:
+                self.start_walk(walk, stages, step, now)
+
+            previous = totals
+            totals = self.waiting.sum(axis=1) + self.finished
+            self.person_minutes += totals
+            next_step = step + 1
+            for i in np.flatnonzero(totals != previous):
+                self.env.recorder.record(
+                    now, STATION_PEOPLE, self.stations[i].entity, int(round(totals[i]))
+                )
+
+        self.person_minutes += totals * max(self.time_horizon - next_step, 0)
+
+        for i, station in enumerate(self.stations):
+            station.people_count = int(round(totals[i]))
+            station.finished_count = int(round(self.finished[i]))
+
+        return {
+            station.id: float(self.person_minutes[i] / self.arrivals[i])
+            for i, station in enumerate(self.stations)
+            if self.arrivals[i]
+        }
+
+    def put(self, station: int, people: np.ndarray) -> None:
+        """
+        Puts 'people' (a count for each stage) down at 'station'. People who have reached the
+        end of their itinerary finish here, and the rest move on to their next stage if their
+        leg ends here.
+        """
+
+        finishing = self.finishes_at[station]
+        self.finished[station] += people[finishing].sum()
+        self.waiting[station] += np.bincount(
+            self.next_stage[station],
+            weights=np.where(finishing, 0, people),
+            minlength=self.num_stages,
+        )
+        self.arrivals[station] += people.sum()
+
+    def stop(self, v: int, position: int, now: int) -> None:
+        """
+        Vehicle 'v' arrives at the stop at 'position' along its path. Like the SimPy engine,
+        it picks people up before dropping people off, except at the last stop where everyone
+        gets off.
+        """
+
+        vehicle = self.vehicles[v]
+        path = self.vehicle_paths[v]
+        station = path[position]
+        stop = self.stations[station]
+        onboard = self.onboard[v]
+        before = onboard.sum()
+
+        if vehicle.get_type() == "Bus" or position:
+            self.env.recorder.record(now, ARRIVAL, vehicle.entity, stop.entity)
+
+        last_stop = position == len(path) - 1
+        if not last_stop and not stop.closed:
+            stages = self.route_stages[self.route_index[vehicle.route]]
+            waiting = self.waiting[station, stages]
+            num_waiting = waiting.sum()
+            seats_left = vehicle.capacity - before
+            if num_waiting > 0 and seats_left > 0:
+                boarding = waiting * (min(num_waiting, seats_left) / num_waiting)
+                self.waiting[station, stages] -= boarding
+                onboard[stages] += boarding
+
+        if last_stop or stop == vehicle.route.last_stop:
+            getting_off = onboard.copy()
+        else:
+            getting_off = np.where(self.stage_gets_off == station, onboard, 0)
+        if getting_off.any():
+            onboard -= getting_off
+            self.put(station, getting_off)
+
+        passenger_count = int(round(onboard.sum()))
+        if last_stop or passenger_count != int(round(before)):
+            self.env.recorder.record(now, PASSENGERS, vehicle.entity, passenger_count)
+        vehicle.people_count = passenger_count
+
+    def start_walk(self, walk: Walk, stages: np.ndarray, step: int, now: int) -> None:
+        """
+        Everyone waiting to take 'walk' sets off once they have waited WALK_WAIT minutes. They
+        all take the same time to walk, sampled like Walk.walk_instance.
+        """
+
+        walkers = self.waiting[:, stages]
+        people = walkers.sum(axis=0)
+        num_people = people.sum()
+        if not num_people:
+            return
+
+        self.person_minutes += walkers.sum(axis=1) * WALK_WAIT
+        self.waiting[:, stages] = 0
+        walk.people_count += int(round(num_people))
+
+        expected_walk_time = walk.walk_time() * walk.walking_congestion
+        std_dev_walk_time = expected_walk_time * 1 / 3 * walk.get_num_people() / 100
+        walk_time = ceil(
+            self.env.sampler.truncated_gumbel(
+                expected_walk_time,
+                std_dev_walk_time,
+                expected_walk_time,
+                floor(expected_walk_time + std_dev_walk_time),
+            )
+        )
+
+        walk_key = walk.walks_started
+        walk.walks_started += 1
+        self.env.recorder.record(now + WALK_WAIT, WALK_START, walk.entity, walk_key)
+        arriving = np.zeros(self.num_stages)
+        arriving[stages] = people
+        end = now + WALK_WAIT + walk_time
+        arrival = ceil(end) - self.env_start
+        # A step already on the heap (for a distribution, a stop or another walk) mustn't be
+        # pushed again, or it would be stepped twice
+        if arrival not in self.scheduled:
+            self.scheduled.add(arrival)
+            heappush(self.active_steps, arrival)
+        self.walk_arrivals.setdefault(arrival, []).append(
+            (walk, arriving, walk_key, end)
+        )
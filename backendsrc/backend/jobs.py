@@ -0,0 +1,189 @@
+from __future__ import annotations
+from concurrent.futures import Future, ProcessPoolExecutor
+from multiprocessing import Manager
+from threading import Lock
+from time import time
+from uuid import uuid4
+import os
+from django.db import connections
+from .streaming import stream_simulation
+from .writer import WRITER
+
+
+# Number of simulations run at once by the job queue
+JOB_WORKERS = int(os.environ.get("SIM_JOB_WORKERS", os.cpu_count() or 1))
+JOB_HISTORY = 100  # Finished jobs kept for their results before the oldest are dropped
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+CANCELLED = "cancelled"
+
+
+class Job:
+    """
+    A simulation request submitted to the job queue. 'progress' and 'cancel' are shared with
+    the worker process running the job, through the queue's multiprocessing manager.
+    """
+
+    def __init__(self, sim_id: int, future: Future, progress, cancel) -> None:
+        self.id = uuid4().hex
+        self.sim_id = sim_id
+        self.future = future
+        self.progress = progress  # Latest progress message from the worker
+        self.cancel = cancel  # Set to ask the worker to stop
+        self.submitted = time()
+
+    def status(self) -> str:
+        if self.future.cancelled():
+            return CANCELLED
+        if self.future.done():
+            if self.future.exception() is not None:
+                return FAILED
+            return CANCELLED if self.future.result() is None else DONE
+        return RUNNING if self.progress.get("type") else QUEUED
+
+    def describe(self) -> dict:
+        """
+        Returns the job's status as a dict of the following format:
+
+        {
+            "job_id": str,
+            "sim_id": int,
+            "status": "queued", "running", "done", "failed" or "cancelled",
+            "progress": float, (fraction of the time horizon simulated so far)
+            "time": int or None, (simulation time reached, minutes since midnight)
+            "error": str, (only if the job failed)
+        }
+        """
+
+        status = self.status()
+        progress = dict(self.progress) if status in (QUEUED, RUNNING) else {}
+        output = {
+            "job_id": self.id,
+            "sim_id": self.sim_id,
+            "status": status,
+            "progress": 1.0 if status == DONE else progress.get("progress", 0.0),
+            "time": progress.get("time"),
+        }
+        if status == FAILED:
+            output["error"] = str(self.future.exception())
+        return output
+
+
+class JobQueue:
+    """
+    Runs simulation requests in the background on a local pool of worker processes, so a
+    request can return straight away and the frontend can poll for the result. Jobs and their
+    results only live in this process' memory, so no broker or extra service is needed, but
+    they are lost when the server restarts.
+
+    Jobs run through stream_simulation, which lets the worker report progress after every
+    slice of the simulation and check whether the job has been cancelled before running the
+    next one. Workers don't save anything themselves: once a job has finished without being
+    cancelled, its output is handed to the background writer from this process, so a failed
+    save is retried rather than failing the job.
+    """
+
+    def __init__(self, max_workers: int = JOB_WORKERS) -> None:
+        self.max_workers = max_workers
+        self.jobs: dict[str, Job] = {}
+        self.lock = Lock()
+        self.executor = None
+        self.manager = None
+
+    def submit(self, user_data: dict, sim_id: int) -> Job:
+        with self.lock:
+            # Forked workers must not share the parent's database connections
+            connections.close_all()
+            if self.executor is None:
+                self.manager = Manager()
+                self.executor = ProcessPoolExecutor(max_workers=self.max_workers)
+
+            progress = self.manager.dict()
+            cancel = self.manager.Event()
+            future = self.executor.submit(
+                run_job, dict(user_data), sim_id, progress, cancel
+            )
+            job = Job(sim_id, future, progress, cancel)
+            future.add_done_callback(save_result)
+            self.jobs[job.id] = job
+            self.prune()
+        return job
+
+    def get(self, job_id: str) -> Job | None:
+        with self.lock:
+            return self.jobs.get(job_id)
+
+    def cancel(self, job_id: str) -> Job | None:
+        """
+        Cancels a job. A queued job never starts, and a running job stops after the slice of
+        the simulation it is running.
+        """
+
+        job = self.get(job_id)
+        if job is not None and not job.future.cancel():
+            job.cancel.set()
+        return job
+
+    def prune(self) -> None:
+        finished = [job for job in self.jobs.values() if job.future.done()]
+        finished.sort(key=lambda job: job.submitted)
+        for job in finished[: max(len(finished) - JOB_HISTORY, 0)]:
+            del self.jobs[job.id]
+
+    def shutdown(self) -> None:
+        with self.lock:
+            if self.executor is not None:
+                self.executor.shutdown(cancel_futures=True)
+                self.manager.shutdown()
+                self.executor = None
+                self.manager = None
+
+
+def run_job(user_data: dict, sim_id: int, progress, cancel) -> dict | None:
+    """
+    Runs one job in a worker process. Returns the simulation output in the same format as
+    run_simulation, or None if the job was cancelled.
+    """
+
+    output = {"Simulation_id": sim_id}
+    seed = None
+    messages = stream_simulation(user_data, sim_id, save=False)
+    for message in messages:
+        if cancel.is_set():
+            messages.close()
+            return None
+
+        if message["type"] == "started":
+            seed = message["Seed"]
+            progress.update(type="started", progress=0.0)
+        elif message["type"] == "progress":
+            progress.update(
+                type="progress", progress=message["progress"], time=message["time"]
+            )
+        elif message["type"] == "section" and message["name"] == "Summary":
+            output.update(message["data"])
+        elif message["type"] == "section":
+            output[message["name"]] = message["data"]
+        elif message["type"] == "error":
+            raise RuntimeError(message["error"])
+
+    output["Seed"] = seed
+    return output
+
+
+def save_result(future: Future) -> None:
+    """
+    Queues a finished job's output to be saved, unless the job was cancelled or failed.
+    """
+
+    if future.cancelled() or future.exception() is not None:
+        return
+    output = future.result()
+    if output is not None:
+        WRITER.submit(output["Simulation_id"], output)
+
+
+JOBS = JobQueue()
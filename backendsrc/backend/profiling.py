@@ -0,0 +1,190 @@
+from __future__ import annotations
+from pathlib import Path
+from time import perf_counter
+from typing import Generator, TextIO
+import os
+import sys
+from simpy import Environment
+from simpy.events import Timeout
+
+
+# If set, every simulation is profiled and its summary table is written next to this path, in
+# a file named after the simulation (see profile_path)
+PROFILE_PATH = os.environ.get("SIM_PROFILE")
+
+
+class ProcessStats:
+    """
+    Counters for every process of one kind (e.g. bus_instance) on one route.
+    """
+
+    def __init__(self) -> None:
+        self.processes = 0  # Number of processes started
+        self.events = 0  # Events yielded back to the kernel
+        self.timeouts = 0  # Of which were timeouts
+        self.wall_time = 0.0  # Seconds spent running the process' own code
+
+
+class Profiler:
+    """
+    Opt-in profiler for a simulation's SimPy kernel. Once attached to an environment it
+    replaces the environment's process and step methods, so an environment which isn't being
+    profiled runs exactly as before.
+
+    Every process started is wrapped in a generator which times each time the process is
+    resumed and counts the events it yields, grouped by the name of the process' generator
+    function (bus_instance, initiate_route, walk_instance, ...) and the route it belongs to.
+    Time spent in a process doesn't include processes it starts or waits on, as those are
+    resumed by the kernel separately. The step loop is timed as a whole, so the difference
+    between the step time and the time spent in processes is the kernel's own overhead.
+    """
+
+    def __init__(self) -> None:
+        self.stats: dict[tuple[str, str | None], ProcessStats] = {}
+        self.steps = 0
+        self.step_time = 0.0
+
+    def attach(self, env: Environment) -> None:
+        process = env.process
+        step = env.step
+
+        def profiled_process(generator: Generator) -> None:
+            return process(self.profile(generator))
+
+        def profiled_step() -> None:
+            start = perf_counter()
+            try:
+                step()
+            finally:
+                self.step_time += perf_counter() - start
+                self.steps += 1
+
+        env.process = profiled_process
+        env.step = profiled_step
+
+    def profile(self, generator: Generator) -> Generator:
+        """
+        Runs 'generator' as the process would, passing events and values (or exceptions) between
+        it and the kernel, and records what it yields and how long it takes.
+        """
+
+        stats = self.stats_for(generator)
+        stats.processes += 1
+        value, error = None, None
+        while True:
+            start = perf_counter()
+            try:
+                if error is None:
+                    event = generator.send(value)
+                else:
+                    event = generator.throw(error)
+            except StopIteration as e:
+                stats.wall_time += perf_counter() - start
+                return e.value
+            except BaseException:
+                stats.wall_time += perf_counter() - start
+                raise
+            stats.wall_time += perf_counter() - start
+
+            stats.events += 1
+            if isinstance(event, Timeout):
+                stats.timeouts += 1
+
+            try:
+                value, error = (yield event), None
+            except BaseException as e:
+                value, error = None, e
+
+    def stats_for(self, generator: Generator) -> ProcessStats:
+        """
+        Returns the counters for the kind of process 'generator' is, and the route it's on.
+        Processes are methods of a route, or of a transporter which has a route, so the route is
+        found through the generator's 'self'.
+        """
+
+        kind = generator.__name__
+        owner = generator.gi_frame.f_locals.get("self") if generator.gi_frame else None
+        route = getattr(owner, "route", owner)
+        route_id = getattr(route, "id", None)
+
+        key = (kind, route_id)
+        if key not in self.stats:
+            self.stats[key] = ProcessStats()
+        return self.stats[key]
+
+    def summary(self) -> dict:
+        """
+        Returns the profile as a dict of the following format, with the most expensive kinds of
+        process first:
+
+        summary = {
+            "Processes": [
+                {
+                    "kind": str,
+                    "route": route_id or None,
+                    "processes": int,
+                    "events": int,
+                    "timeouts": int,
+                    "wall_time": float, (seconds)
+                },
+            ],
+            "Steps": int,
+            "StepTime": float, (seconds)
+            "ProcessTime": float, (seconds)
+        }
+        """
+
+        rows = [
+            {
+                "kind": kind,
+                "route": route_id,
+                "processes": stats.processes,
+                "events": stats.events,
+                "timeouts": stats.timeouts,
+                "wall_time": stats.wall_time,
+            }
+            for (kind, route_id), stats in self.stats.items()
+        ]
+        rows.sort(key=lambda row: row["wall_time"], reverse=True)
+        return {
+            "Processes": rows,
+            "Steps": self.steps,
+            "StepTime": self.step_time,
+            "ProcessTime": sum(row["wall_time"] for row in rows),
+        }
+
+    def dump(self, out: TextIO = sys.stdout) -> None:
+        """
+        Writes the summary to 'out' as a table.
+        """
+
+        summary = self.summary()
+        out.write(
+            f"{'kind':<20} {'route':<20} {'processes':>10} {'events':>10} "
+            f"{'timeouts':>10} {'wall (s)':>10}\n"
+        )
+        for row in summary["Processes"]:
+            out.write(
+                f"{row['kind']:<20} {str(row['route']):<20} {row['processes']:>10} "
+                f"{row['events']:>10} {row['timeouts']:>10} {row['wall_time']:>10.4f}\n"
+            )
+        out.write(
+            f"{summary['Steps']} steps in {summary['StepTime']:.4f}s, "
+            f"{summary['ProcessTime']:.4f}s of which in processes\n"
+        )
+
+    def write(self, path: str) -> None:
+        with open(path, "w") as out:
+            self.dump(out)
+
+
+def profile_path(sim_id: int) -> str:
+    """
+    Returns the file a simulation's profile is written to: PROFILE_PATH with the sim id and
+    process id added to its name (profile.txt becomes profile_sim_<sim_id>_<pid>.txt), so runs
+    in different processes, like jobs and sweep or replication workers, don't overwrite each
+    other's profile.
+    """
+
+    path = Path(PROFILE_PATH)
+    return str(path.with_name(f"{path.stem}_sim_{sim_id}_{os.getpid()}{path.suffix}"))
@@ -0,0 +1,137 @@
+from __future__ import annotations
+import os
+import numpy as np
+
+
+# If set, the records of every simulation are saved in this directory as sim_<id>.npz
+RECORD_DIR = os.environ.get("SIM_RECORD_DIR")
+
+# Every record is (time, kind, entity, count)
+RECORD_DTYPE = np.dtype(
+    [
+        ("time", np.float64),
+        ("kind", np.uint8),
+        ("entity", np.int32),
+        ("count", np.int64),
+    ]
+)
+
+STATION_PEOPLE = 0  # Number of people at a station
+PASSENGERS = 1  # Number of people on a transporter
+ARRIVAL = 2  # A transporter arrived at a stop, count is the stop's entity
+WALK_START = 3  # A walk set off, count is the walk's key
+WALK_END = 4  # A walk finished, count is the walk's key
+RECORD_KINDS = ["station_people", "passengers", "arrival", "walk_start", "walk_end"]
+
+RECORDER_CAPACITY = 16384  # Records the buffer has room for before it first grows
+RECORDER_CHUNK = 1024  # Records staged before being copied into the buffer together
+
+
+class Recorder:
+    """
+    Central store of everything a simulation run records over time: people waiting at
+    stations, passengers on transporters, transporter arrivals and walks. Each record is a
+    fixed width row in a preallocated NumPy structured array, which doubles in size whenever it
+    fills up. Records are staged in a short list and copied into the array a chunk at a time,
+    so recording one costs about as much as setting a dict item.
+
+    Stations, transporters and walks register themselves as entities and are then identified
+    by their index in 'entities'. Reading a series sorts the records by (kind, entity) once and
+    keeps the sort until more records are flushed.
+    """
+
+    def __init__(self, capacity: int = RECORDER_CAPACITY) -> None:
+        self.records = np.empty(capacity, RECORD_DTYPE)
+        self.size = 0
+        self.pending: list[tuple[float, int, int, int]] = []
+        self.entities: list[str] = []  # Name of each entity, by entity id
+        self.index = None  # (order, {key: (start, stop)}) for reading series
+
+    def register(self, name: str) -> int:
+        self.entities.append(name)
+        return len(self.entities) - 1
+
+    def record(self, time: float, kind: int, entity: int, count: int) -> None:
+        self.pending.append((time, kind, entity, count))
+        if len(self.pending) >= RECORDER_CHUNK:
+            self.flush()
+
+    def flush(self) -> None:
+        if not self.pending:
+            return
+
+        size = self.size + len(self.pending)
+        if size > len(self.records):
+            records = np.empty(max(2 * len(self.records), size), RECORD_DTYPE)
+            records[: self.size] = self.records[: self.size]
+            self.records = records
+        self.records[self.size : size] = self.pending
+        self.size = size
+        self.pending.clear()
+        self.index = None
+
+    def view(self) -> np.ndarray:
+        """
+        Returns every record so far, in the order they were recorded.
+        """
+
+        self.flush()
+        return self.records[: self.size]
+
+    def series(self, kind: int, entity: int) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Returns the times and counts of one entity's records of one kind, in the order they
+        were recorded.
+        """
+
+        records = self.view()
+        if self.index is None:
+            keys = records["kind"].astype(np.int64) << 32 | records["entity"]
+            order = np.argsort(keys, kind="stable")
+            unique, starts = np.unique(keys[order], return_index=True)
+            stops = np.append(starts[1:], len(order))
+            self.index = (order, dict(zip(unique.tolist(), zip(starts, stops))))
+
+        order, bounds = self.index
+        start, stop = bounds.get(kind << 32 | entity, (0, 0))
+        rows = order[start:stop]
+        return records["time"][rows], records["count"][rows]
+
+    def timeline(self, kind: int, entity: int) -> dict[float, int]:
+        """
+        Returns one entity's records of one kind as {time: count}. Where several records share a
+        time the latest is kept, as the per object dicts this replaced did.
+        """
+
+        times, counts = self.series(kind, entity)
+        return dict(zip(minutes(times), counts.tolist()))
+
+    def save(self, path: str) -> None:
+        """
+        Writes the run's records and entity names to a single .npz file.
+        """
+
+        np.savez_compressed(
+            path,
+            records=self.view(),
+            entities=np.array(self.entities),
+            kinds=np.array(RECORD_KINDS),
+        )
+
+    @classmethod
+    def load(cls, path: str) -> Recorder:
+        with np.load(path) as data:
+            records = data["records"]
+            recorder = cls(max(len(records), 1))
+            recorder.records[: len(records)] = records
+            recorder.size = len(records)
+            recorder.entities = data["entities"].tolist()
+        return recorder
+
+
+def minutes(times: np.ndarray) -> list[float]:
+    """
+    Converts recorded times back to Python numbers, with whole minutes as ints.
+    """
+
+    return [int(time) if time.is_integer() else time for time in times.tolist()]
@@ -0,0 +1,174 @@
+from __future__ import annotations
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+from math import sqrt
+import os
+import numpy as np
+from django.db import connections
+from .sim import run_simulation
+
+
+CONFIDENCE_Z = 1.96  # z-score of a 95% confidence interval
+
+# 97.5% quantile of Student's t distribution by degrees of freedom, for the 95% confidence
+# intervals of the small numbers of replications usually run
+T_QUANTILES = [
+    12.706, 4.303, 3.182, 2.776, 2.571, 2.447, 2.365, 2.306, 2.262, 2.228,
+    2.201, 2.179, 2.160, 2.145, 2.131, 2.120, 2.110, 2.101, 2.093, 2.086,
+    2.080, 2.074, 2.069, 2.064, 2.060, 2.056, 2.052, 2.048, 2.045, 2.042,
+]  # fmt: skip
+
+
+def run_replications(
+    user_data: dict, sim_id: int, replications: int, max_workers: int | None = None
+) -> dict:
+    """
+    Runs 'replications' independently seeded copies of the same simulation request across a
+    process pool, then merges them into means and confidence intervals. Each copy gets its own
+    seed spawned from user_data["seed"] (or fresh entropy if there isn't one), so a replicated
+    request is reproducible in the same way a single run is. Replications are not saved to the
+    database.
+
+    Returns a dict of the following format:
+
+    output = {
+        "Simulation_id": sim_id,
+        "Replications": replications,
+        "Seed": seed,
+        "Seeds": [seed, ...],
+        "Stations": {
+            station_id: {
+                "stationName": station_name,
+                "avg_wait": {"mean": float, "ci_low": float, "ci_high": float, "n": int},
+                "bottleneck_rate": float,
+            },
+        },
+        "PercentageArrived": {"mean": float, "ci_low": float, "ci_high": float, "n": int},
+        "Bottlenecks": [station_ids],
+    }
+    """
+
+    seed_sequence = np.random.SeedSequence(user_data.get("seed"))
+    seeds = [
+        int(child.generate_state(1)[0]) for child in seed_sequence.spawn(replications)
+    ]
+    workers = min(replications, max_workers or os.cpu_count() or 1)
+
+    # Forked workers must not share the parent's database connections
+    connections.close_all()
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        summaries = list(
+            executor.map(
+                run_replication, repeat(dict(user_data)), repeat(sim_id), seeds
+            )
+        )
+
+    output = merge_replications(summaries)
+    output["Simulation_id"] = sim_id
+    output["Replications"] = replications
+    output["Seed"] = seed_sequence.entropy
+    output["Seeds"] = seeds
+    return output
+
+
+def run_replication(user_data: dict, sim_id: int, seed: int) -> dict:
+    """
+    Runs a single replication in a worker process and returns a summary of its output.
+    """
+
+    output = run_simulation({**user_data, "seed": seed}, sim_id, save=False)
+    connections.close_all()
+    return summarise_output(output)
+
+
+def summarise_output(output: dict) -> dict:
+    """
+    Keeps only the parts of a simulation output which are merged across replications, so that
+    workers send back a few numbers per station instead of the whole output.
+    """
+
+    return {
+        "percentage_arrived": output["PercentageArrived"],
+        "stations": {
+            station_id: (
+                sd["stationName"],
+                None if sd["avg_wait"] == "N/A" else sd["avg_wait"],
+                sd["bottleneck"],
+            )
+            for station_id, sd in output["Stations"].items()
+        },
+    }
+
+
+def merge_replications(summaries: list[dict]) -> dict:
+    """
+    Merges replication summaries into per-station mean wait times and bottleneck rates, and the
+    mean percentage of people who arrived.
+    """
+
+    names = {}
+    waits = {}
+    bottlenecks = {}
+    for summary in summaries:
+        for station_id, (name, avg_wait, bottleneck) in summary["stations"].items():
+            names[station_id] = name
+            waits.setdefault(station_id, [])
+            bottlenecks[station_id] = bottlenecks.get(station_id, 0) + bottleneck
+            if avg_wait is not None:
+                waits[station_id].append(avg_wait)
+
+    output = {"Stations": {}, "Bottlenecks": []}
+    for station_id, name in names.items():
+        bottleneck_rate = bottlenecks[station_id] / len(summaries)
+        output["Stations"][station_id] = {
+            "stationName": name,
+            "avg_wait": confidence_interval(waits[station_id]),
+            "bottleneck_rate": bottleneck_rate,
+        }
+        if bottleneck_rate >= 0.5:
+            output["Bottlenecks"].append(station_id)
+
+    output["PercentageArrived"] = confidence_interval(
+        [summary["percentage_arrived"] for summary in summaries]
+    )
+    return output
+
+
+def confidence_interval(values: list[float]) -> dict | str:
+    """
+    Returns the mean of 'values' with a Student's t 95% confidence interval, or "N/A" if there
+    are no values.
+    """
+
+    if not values:
+        return "N/A"
+
+    mean = float(np.mean(values))
+    half_width = 0.0
+    if len(values) > 1:
+        t = t_quantile(len(values) - 1)
+        half_width = t * float(np.std(values, ddof=1)) / sqrt(len(values))
+    return {
+        "mean": mean,
+        "ci_low": mean - half_width,
+        "ci_high": mean + half_width,
+        "n": len(values),
+    }
+
+
+def t_quantile(df: int) -> float:
+    """
+    Returns the 97.5% quantile of Student's t distribution with 'df' degrees of freedom, from
+    T_QUANTILES, or from its Cornish-Fisher expansion around CONFIDENCE_Z past the table's end
+    (which is accurate to three decimal places there).
+    """
+
+    if df <= len(T_QUANTILES):
+        return T_QUANTILES[df - 1]
+
+    z = CONFIDENCE_Z
+    return (
+        z
+        + (z**3 + z) / (4 * df)
+        + (5 * z**5 + 16 * z**3 + 3 * z) / (96 * df**2)
+    )
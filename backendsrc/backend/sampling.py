@@ -0,0 +1,85 @@
+from __future__ import annotations
+from math import exp, floor, log
+from typing import Sequence, TypeVar
+import numpy as np
+
+
+BLOCK_SIZE = 4096  # Number of uniforms drawn from the generator at a time
+MAX_EXPONENT = 700.0  # Keeps exp() inside the range of a float
+
+T = TypeVar("T")
+
+
+class Sampler:
+    """
+    Per-simulation source of randomness. Every random draw made by a simulation goes through
+    one Sampler, which owns a seeded numpy Generator, so a simulation can be reproduced exactly
+    from its seed.
+
+    Uniforms are drawn from the generator in blocks of BLOCK_SIZE and handed out one at a time,
+    which avoids a numpy call for every scalar the simulation needs. Truncated Gumbel samples
+    are produced by inverting the CDF over the truncated range, so they always cost exactly one
+    uniform instead of looping until a sample happens to land inside the range.
+    """
+
+    def __init__(self, seed: int | None = None, block_size: int = BLOCK_SIZE) -> None:
+        if seed is None:
+            seed = int(np.random.SeedSequence().entropy % (2**32))
+        self.seed = seed
+        self.rng = np.random.default_rng(seed)
+        self.block_size = block_size
+        self.block = self.rng.random(block_size).tolist()
+        self.index = 0
+
+    def uniform(self) -> float:
+        """
+        Returns the next uniform sample in [0, 1) from the current block.
+        """
+
+        if self.index == self.block_size:
+            self.block = self.rng.random(self.block_size).tolist()
+            self.index = 0
+        u = self.block[self.index]
+        self.index += 1
+        return u
+
+    def randint(self, low: int, high: int) -> int:
+        """
+        Returns a random integer N such that low <= N <= high.
+        """
+
+        return low + floor(self.uniform() * (high - low + 1))
+
+    def choice(self, options: Sequence[T]) -> T:
+        return options[floor(self.uniform() * len(options))]
+
+    def normal(self, mean: float, std_dev: float) -> float:
+        return float(self.rng.normal(mean, std_dev))
+
+    def truncated_gumbel(
+        self, loc: float, scale: float, low: float, high: float
+    ) -> float:
+        """
+        Samples a Gumbel(loc, scale) distribution conditioned to lie within [low, high], using the
+        inverse CDF F^-1(u) = loc - scale * log(-log(u)) evaluated at a uniform drawn between
+        F(low) and F(high). A scale of zero collapses the distribution onto 'loc'.
+        """
+
+        if scale <= 0:
+            return min(max(loc, low), high)
+
+        cdf_low = self.gumbel_cdf(loc, scale, low)
+        cdf_high = self.gumbel_cdf(loc, scale, high)
+        u = cdf_low + self.uniform() * (cdf_high - cdf_low)
+        if u <= 0.0:
+            return low
+        if u >= 1.0:
+            return high
+
+        x = loc - scale * log(-log(u))
+        return min(max(x, low), high)
+
+    @staticmethod
+    def gumbel_cdf(loc: float, scale: float, x: float) -> float:
+        z = min(max(-(x - loc) / scale, -MAX_EXPONENT), MAX_EXPONENT)
+        return exp(-exp(z))
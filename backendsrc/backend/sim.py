@@ -1,15 +1,30 @@
 from __future__ import annotations
 from simpy import Environment, Resource
 from abc import ABC, abstractmethod
-from random import randint, randrange, choice
 from pathlib import Path
 from math import ceil, floor, log, pow, sqrt
+from array import array
+from collections import deque
+from typing import Iterator
 import django
 import os
 import sys
 from datetime import time, date, datetime
 from backend.queries import ALLOWED_SUBURBS
 from .itins import INPUT_ITINS
+from .profiling import PROFILE_PATH, Profiler, profile_path
+from .recorder import (
+    ARRIVAL,
+    PASSENGERS,
+    RECORD_DIR,
+    STATION_PEOPLE,
+    WALK_END,
+    WALK_START,
+    Recorder,
+    minutes,
+)
+from .sampling import Sampler
+from .trace import TRACE, TRACE_EVENTS, TRACE_VERBOSE, Tracer
 import time as t
 import numpy as np
 
@@ -25,34 +40,53 @@ from db.models import (
     Trip as TripM,
     Shape as ShapeM,
     Calendar as CalendarM,
-    StationSim,
-    RouteSim,
-    ItinerarySim,
     SimulationOutput,
-    TransporterOnRouteInfo,
-    PassengerChanges,
-    TransporterTimeOut,
-    WalkSim,
 )  # noqa: E402
+from django.db import transaction  # noqa: E402
+from .storage import read_output, write_output  # noqa: E402
 
 
 PERSON_BOARD_TIME = 0.1
 MINUTES_IN_DAY = 1440
 MINUTES_IN_HOUR = 60
-DEBUG = True
+CHECK_HEADCOUNTS = False  # Recount groups after every headcount change (debug only)
 ROUTE_NAMES = ["BusRoute", "TrainRoute"]
 LOAD_TIMES = {"Train": 0.0025, "Bus": 0.1}
-
-
-ITINERARIES = []  # Stores itinerary objects produced by the sim
-STATION_ITINERARY_LOOKUP = {}  # Stores possible stations for each itinerary.
-STATION_NAMES = {}  # Stores station objects for each station name
+SAVED_SIMS_PAGE_SIZE = 50  # Saved simulations listed per page by default
 
 
 def convert_date_to_int(time: time) -> int:
     return time.hour * MINUTES_IN_HOUR + time.minute
 
 
+class SimulationContext(Environment):
+    """
+    The SimPy environment for a single simulation run, along with all of the state which belongs
+    to that run. Every sim object keeps a reference to its context through 'env', so separate
+    runs never share state and everything a run created is freed once its context is no longer
+    referenced. This allows several simulations to run side by side in one process.
+
+    If 'profile' is True, a Profiler is attached which records where the run's time goes.
+    """
+
+    def __init__(
+        self, initial_time: int = 0, seed: int | None = None, profile: bool = False
+    ) -> None:
+        super().__init__(initial_time)
+        self.itineraries: list[Itinerary] = []  # Itinerary objects produced by the sim
+        self.station_itinerary_lookup = {}  # Possible itineraries for each station
+        self.station_names = {}  # Stores station objects for each station name
+        self.pool = PeoplePool()  # Every group of people created during the run
+        self.num_in_simulation = 0  # Total number of people distributed by suburbs
+        self.sampler = Sampler(seed)  # Source of randomness for the run
+        self.trace = Tracer(TRACE.level)  # Event trace for the run
+        self.recorder = Recorder()  # Everything the run records over time
+        self.profiler = None
+        if profile:
+            self.profiler = Profiler()
+            self.profiler.attach(self)
+
+
 class Itinerary:
     """
     Object to store multiple types of travel at a time. An itinerary is a list of
@@ -73,78 +107,247 @@ class Itinerary:
     def __str__(self):
         return f"Itinerary: ID: {self.id}, Routes: {self.routes}"
 
-    def get_current_type(self, people: People) -> str:
-        return self.routes[people.current_route_in_itin_index][0].get_type()
+    def get_current_type(self, leg: int) -> str:
+        return self.routes[leg][0].get_type()
+
+    def get_current(self, leg: int) -> tuple[Route, Station | None]:
+        return self.routes[leg]
+
+    def get_current_route(self, leg: int) -> Route:
+        return self.routes[leg][0]
 
-    def get_current(self, people: People) -> Route:
-        return self.routes[people.current_route_in_itin_index]
+    def last_leg(self, leg: int) -> bool:
+        return leg == len(self.routes) - 1
 
-    def get_current_route(self, people: People) -> Route:
-        return self.routes[people.current_route_in_itin_index][0]
 
-    def last_leg(self, people: People) -> bool:
-        return people.current_route_in_itin_index == len(self.routes) - 1
+Group = int  # Handle of a group of people stored in a PeoplePool
+NO_ENTRY = -1  # Log entry index used for a journey with nothing logged yet
 
 
-class People:
+class JourneyLog:
     """
-    People objects are generated to describe how a group of people will travel from
-    one location to another. Each People object contains a number of people in the group,
-    the time at which they will start their journey, the station at which they will start
-    their journey, and the time at which they will end their journey.
+    Append-only store for the journey logs of every group in a simulation. Each entry records
+    where a group was at a given time, and points back at the entry logged before it. A group's
+    log is identified by the index of its latest entry, so when a group is split both halves
+    keep pointing at the same history instead of copying it. Places are stored as small integer
+    codes into 'locations', so every column of the log is a flat array.
     """
 
-    num_in_simulation = 0
-    all_people = []
+    def __init__(self) -> None:
+        self.time = array("d")
+        self.parent = array("i")
+        self.where = array("i")  # Index into locations
+        self.locations: list[tuple[str, int]] = []
+        self.location_codes: dict[tuple[str, int], int] = {}
 
-    def __init__(
+    def append(self, head: int, time: float, where: tuple[str, int]) -> int:
+        """
+        Adds an entry after 'head' and returns the index of the new entry.
+        """
+
+        code = self.location_codes.get(where)
+        if code is None:
+            code = len(self.locations)
+            self.locations.append(where)
+            self.location_codes[where] = code
+
+        self.time.append(time)
+        self.parent.append(head)
+        self.where.append(code)
+        return len(self.where) - 1
+
+    def flatten(self, head: int) -> dict[float, tuple[str, int]]:
+        """
+        Returns the journey ending at 'head' as a {time: where} dict, oldest entry first. If
+        several entries share a time the latest one wins, but it keeps the position of the first.
+        """
+
+        entries = []
+        while head != NO_ENTRY:
+            entries.append(head)
+            head = self.parent[head]
+
+        log = {}
+        for entry in reversed(entries):
+            log[self.time[entry]] = self.locations[self.where[entry]]
+        return log
+
+    def stays(self, heads: list[int], end_time: float) -> dict[str, np.ndarray]:
+        """
+        Returns every stay made on the journeys ending at 'heads' as a table of columns:
+
+        stays = {
+            "group": index into 'heads' of the journey the stay was part of,
+            "location": location code of where the stay was,
+            "enter": time the stay started,
+            "leave": time of the next entry on the journey, or 'end_time' for the last one,
+        }
+
+        This matches flattening each journey: an entry followed by one at the same time isn't
+        a stay of its own. All of the journeys are walked back from their heads together, one
+        entry per journey at a time, so each step is an array operation and the whole table
+        costs one pass over the entries the journeys contain.
+        """
+
+        time = np.array(self.time, dtype=np.float64)
+        parent = np.array(self.parent, dtype=np.int64)
+        where = np.array(self.where, dtype=np.int64)
+
+        heads = np.array(heads, dtype=np.int64)
+        group = np.flatnonzero(heads != NO_ENTRY)
+        current = heads[group]
+        leave = np.full(len(current), end_time, dtype=np.float64)
+        latest = True
+
+        columns = {"group": [], "location": [], "enter": [], "leave": []}
+        while len(current):
+            enter = time[current]
+            kept = slice(None) if latest else enter < leave
+            columns["group"].append(group[kept])
+            columns["location"].append(where[current][kept])
+            columns["enter"].append(enter[kept])
+            columns["leave"].append(leave[kept])
+
+            previous = parent[current]
+            has_previous = previous != NO_ENTRY
+            group = group[has_previous]
+            current = previous[has_previous]
+            leave = enter[has_previous]
+            latest = False
+
+        return {
+            name: np.concatenate(column) if column else np.zeros(0, dtype=np.int64)
+            for name, column in columns.items()
+        }
+
+
+class PeoplePool:
+    """
+    Stores every group of people in a simulation as a row of parallel arrays, describing how the
+    group will travel from one location to another. Each group has a number of people, the time
+    at which they started their journey, the station at which they started their journey, their
+    itinerary and the leg of the itinerary they are currently on. The rest of the sim passes
+    groups around as integer handles into these arrays instead of as objects.
+
+    Journey logs live in a shared JourneyLog, and each group only stores the index of its latest
+    entry. Once a group reaches the end of its itinerary it is released: its journey log is kept
+    for the simulation output, and its handle goes on a free list to be reused by the next group.
+    """
+
+    def __init__(self) -> None:
+        self.count = array("i")
+        self.start_time = array("d")
+        self.itinerary = array("i")
+        self.leg = array("i")
+        self.origin = array("i")
+        self.head = array("i")  # Latest journey log entry of each group
+        self.journeys = JourneyLog()
+        self.finished_heads = array("i")
+        self.free: list[Group] = []
+        self.origins: list[Station] = []  # Stations referenced by the origin array
+        self.origin_index: dict[Station, int] = {}
+
+    def new(
         self,
-        env: Environment,
         count: int,
-        start_time: int,
+        start_time: float,
         start_location: Station,
         itinerary_index: int,
-        env_start: int,
-        current_route_in_itin_index: int = 0,
-    ) -> None:
-        self.env_start = env_start
-        self.env = env
-        self.num_people = count
-        self.start_time = start_time
-        self.start_location = start_location
-        self.end_time = None
-        self.itinerary_index = itinerary_index
-        self.current_route_in_itin_index = current_route_in_itin_index
-        self.people_log = {}
-        People.all_people.append(self)
-
-    def log(self, where: tuple[str, int]) -> None:
-        self.people_log[self.env.now + self.env_start] = where
+        leg: int = 0,
+        head: int = NO_ENTRY,
+    ) -> Group:
+        """
+        Creates a group, reusing a released handle if there is one, and returns its handle.
+        """
 
-    def __str__(self) -> str:
-        journey_time = (
-            self.end_time - self.start_time if self.end_time != None else "N/A"
+        origin = self.origin_index.get(start_location)
+        if origin is None:
+            origin = len(self.origins)
+            self.origins.append(start_location)
+            self.origin_index[start_location] = origin
+
+        if self.free:
+            group = self.free.pop()
+            self.count[group] = count
+            self.start_time[group] = start_time
+            self.itinerary[group] = itinerary_index
+            self.leg[group] = leg
+            self.origin[group] = origin
+            self.head[group] = head
+        else:
+            group = len(self.count)
+            self.count.append(count)
+            self.start_time.append(start_time)
+            self.itinerary.append(itinerary_index)
+            self.leg.append(leg)
+            self.origin.append(origin)
+            self.head.append(head)
+        return group
+
+    def split(self, group: Group, excess: int) -> Group:
+        """
+        Moves 'excess' people out of 'group' into a new group at the same point of the same
+        itinerary, and returns the new group's handle. The new group shares the journey logged
+        so far.
+        """
+
+        self.count[group] -= excess
+        return self.new(
+            excess,
+            self.start_time[group],
+            self.origins[self.origin[group]],
+            self.itinerary[group],
+            self.leg[group],
+            self.head[group],
         )
 
-        return f"Count: {self.get_num_people()}, Start Time: {self.start_time}, End Time: {self.end_time}, Journey Time: {journey_time}, Start Loc: {self.start_location.name}"
+    def release(self, group: Group) -> None:
+        """
+        Frees the handle of a group which has finished its journey, keeping its log.
+        """
+
+        self.finished_heads.append(self.head[group])
+        self.head[group] = NO_ENTRY
+        self.count[group] = 0
+        self.free.append(group)
 
-    def get_num_people(self) -> int:
-        return self.num_people
+    def log(self, group: Group, time: float, where: tuple[str, int]) -> None:
+        self.head[group] = self.journeys.append(self.head[group], time, where)
 
-    def change_num_people(self, change: int) -> None:
-        self.num_people += change
+    def get_log(self, group: Group) -> dict[float, tuple[str, int]]:
+        return self.journeys.flatten(self.head[group])
 
-    def next_route(self) -> None:
-        self.current_route_in_itin_index += 1
+    def all_logs(self) -> Iterator[dict[float, tuple[str, int]]]:
+        """
+        Yields the flattened journey log of every group, finished or not.
+        """
+
+        for head in self.all_heads():
+            yield self.journeys.flatten(head)
+
+    def all_heads(self) -> list[int]:
+        """
+        Returns the latest journey log entry of every group, finished or not.
+        """
+
+        free = set(self.free)
+        heads = list(self.finished_heads)
+        for group, head in enumerate(self.head):
+            if group not in free:
+                heads.append(head)
+        return heads
+
+    def describe(self, group: Group) -> str:
+        return f"Count: {self.count[group]}, Start Time: {self.start_time[group]}, Start Loc: {self.origins[self.origin[group]].name}"
 
 
 class Station:
     """
     Each Station object contains a SimPy Resource which represents the number of bus
-    bays available at the stop. Also a list of People objects representing the people
-    waiting at the bus stop is stored. The Station object also contains a dictionary
-    which maps the number of people waiting at the bus stop at a given time to the
-    time at which this number was recorded. This is used to generate a graph of the
+    bays available at the stop. The groups of people waiting at the stop are stored in FIFO
+    queues keyed by the route each group is waiting to take. The number of people waiting at
+    the stop is recorded in the run's recorder whenever it changes, and people_over_time maps
+    each time it was recorded to the number. This is used to generate a graph of the
     number of people waiting at the bus stop over time.
     """
 
@@ -164,111 +367,188 @@ class Station:
         self.name = name
         self.pos = pos
         self.bays = Resource(env, capacity=bays)
-        self.people = []
-        self.people_over_time = {}
+        self.waiting: dict[Route, deque[Group]] = {}
+        self.people_count = 0
+        self.finished_count = 0  # People who have finished their journey at this stop
+        self.route_counts: dict[Route, int] = {}
+        self.entity = env.recorder.register(f"Station {id}")
         self.station = None  # None on init, will be assigned by Suburb init
+        self.closed = False  # Nobody boards at a closed station
         self.log_cur_people()
 
     def busy_level(self) -> int:
         return ceil(self.num_people() / 100)
 
     def log_cur_people(self) -> None:
-        self.people_over_time[self.env.now + self.env_start] = self.num_people()
+        self.env.recorder.record(
+            self.env.now + self.env_start,
+            STATION_PEOPLE,
+            self.entity,
+            self.num_people(),
+        )
+
+    @property
+    def people_over_time(self) -> dict[float, int]:
+        return self.env.recorder.timeline(STATION_PEOPLE, self.entity)
 
     def __str__(self) -> str:
-        output = f"{self.name}: Total People = {self.num_people()}, Total Groups = {len(self.people)}"
-        for people in self.people:
-            output += f"\n{str(people)}"
+        groups = self.groups()
+        output = f"{self.name}: Total People = {self.num_people()}, Total Groups = {len(groups)}"
+        for group in groups:
+            output += f"\n{self.env.pool.describe(group)}"
         return output
 
-    def board(self, num_people_to_board: int, route: Route) -> list[People]:
+    def groups(self) -> list[Group]:
+        """
+        Returns every group waiting at this stop, across all of the route queues.
+        """
+
+        return [group for queue in self.waiting.values() for group in queue]
+
+    def queue(self, group: Group) -> None:
+        """
+        Adds 'group' to the back of the queue for the route they are currently waiting on.
+        """
+
+        pool = self.env.pool
+        route = self.env.itineraries[pool.itinerary[group]].get_current_route(
+            pool.leg[group]
+        )
+        if route not in self.waiting:
+            self.waiting[route] = deque()
+            self.route_counts[route] = 0
+        self.waiting[route].append(group)
+        self.change_count(route, pool.count[group])
+
+    def finish(self, group: Group) -> None:
+        """
+        Records that 'group' has reached the end of its itinerary at this stop. The people still
+        count towards this stop's headcount, but the group is released back to the pool.
+        """
+
+        self.finished_count += self.env.pool.count[group]
+        self.people_count += self.env.pool.count[group]
+        self.env.pool.release(group)
+        if CHECK_HEADCOUNTS:
+            self.check_headcount()
+
+    def remove(self, group: Group, route: Route) -> None:
+        """
+        Removes 'group' from the queue for 'route'. Groups leave their queue in the order they
+        joined it, so this is normally a pop from the front of the queue.
+        """
+
+        queue = self.waiting.get(route)
+        if not queue:
+            return
+        if queue[0] == group:
+            queue.popleft()
+        else:
+            try:
+                queue.remove(group)
+            except ValueError:
+                return
+        self.change_count(route, -self.env.pool.count[group])
+
+    def board(self, num_people_to_board: int, route: Route) -> list[Group]:
         """
         Given 'num_people_to_board' who are at the stop, and the 'route' of the bus which is stopping
-        this method returns a list 'people_to_get' containing the people which a bus can collect
-        from this stop.
+        this method returns a list 'people_to_get' containing the groups which a bus can collect
+        from this stop. Only the queue for 'route' is looked at, and groups are taken from the front
+        of it. If a group has to be split, the people left behind keep their place at the front.
         """
 
+        pool = self.env.pool
         cur_total = 0
         people_to_get = []
+        queue = self.waiting.get(route)
 
-        for people in self.people:
-            if ITINERARIES[people.itinerary_index].get_current_route(people) != route:
-                continue  # They dont want to board this
-            if people.get_num_people() + cur_total > num_people_to_board:
+        while queue and cur_total < num_people_to_board:
+            group = queue.popleft()
+            if pool.count[group] + cur_total > num_people_to_board:
                 # Would be adding too many people --> Split
-                excess = (people.get_num_people() + cur_total) - num_people_to_board
-                split = People(
-                    self.env,
-                    excess,
-                    people.start_time,
-                    people.start_location,
-                    people.itinerary_index,
-                    self.env_start,
-                    people.current_route_in_itin_index,
-                )
-                split.people_log = {k: v for (k, v) in people.people_log.items()}
-                people.change_num_people(-excess)
-                self.people.append(split)
-                people_to_get.append(people)
-                break
-            people_to_get.append(people)
-            cur_total += people.get_num_people()
-            if cur_total == num_people_to_board:
-                break
+                excess = (pool.count[group] + cur_total) - num_people_to_board
+                queue.appendleft(pool.split(group, excess))
+            people_to_get.append(group)
+            cur_total += pool.count[group]
 
-        for p in people_to_get:
-            self.people.remove(p)
+        if cur_total:
+            self.change_count(route, -cur_total)
         return people_to_get
 
-    def put(self, passengers: list[People], from_suburb=False) -> None:
+    def change_count(self, route: Route, change: int) -> None:
+        """
+        Updates the running headcounts for this stop after 'change' people joined (or left, if
+        negative) the queue for 'route'.
+        """
+
+        self.people_count += change
+        self.route_counts[route] += change
+        if CHECK_HEADCOUNTS:
+            self.check_headcount()
+
+    def check_headcount(self) -> None:
+        """
+        Debug check that the running headcounts match a full recount of the waiting groups.
+        """
+
+        for route, queue in self.waiting.items():
+            recount = sum(self.env.pool.count[group] for group in queue)
+            assert (
+                self.route_counts[route] == recount
+            ), f"{self.name}: route count {self.route_counts[route]} != {recount}"
+        recount = sum(self.route_counts.values()) + self.finished_count
+        assert (
+            self.people_count == recount
+        ), f"{self.name}: people count {self.people_count} != {recount}"
+
+    def put(self, passengers: list[Group], from_suburb=False) -> None:
         """
         This function is called when a bus arrives at a stop and has the chance to drop off
-        passengers. The list 'passengers' contains the people who are getting off the bus at this
-        stop. These people are added to the list of people waiting at the bus stop. The function
+        passengers. The list 'passengers' contains the groups who are getting off the bus at this
+        stop. These people are added to the people waiting at the bus stop. The function
         also logs the number of people waiting at the bus stop at the current time.
 
         There are various cases in this function, depending on the position of a group of people
-        within their itinerary. If a group of people is at the last leg of their itinerary then
-        they will be placed at the current station. If a group of people is not at the last leg
-        of their itinerary then they will be placed at the next station in their itinerary, and if
-        their next leg of the itinerary is a walk, then they will be queued up to walk.
+        within their itinerary. If a group of people is at the last leg of their itinerary and
+        this is where that leg ends, they have finished their journey at the current station. If
+        a group of people is not at the last leg of their itinerary then they will be placed at
+        the next station in their itinerary, and if their next leg of the itinerary is a walk,
+        then they will be queued up to walk.
         """
 
+        pool = self.env.pool
+        now = self.env.now + self.env_start
         for group in passengers:
-            group.log((self.name, self.id))
-            print(group.itinerary_index, len(ITINERARIES), ITINERARIES)
-            for itin in ITINERARIES:
-                print(itin)
-            if not ITINERARIES[group.itinerary_index].last_leg(group) and (
-                ITINERARIES[group.itinerary_index].get_current(group)[1] == self
-                or ITINERARIES[group.itinerary_index].get_current_route(group).last_stop
-                == self
-            ):
-                group.next_route()
-
-            if (
-                ITINERARIES[group.itinerary_index].get_current_type(group)
-                in ROUTE_NAMES
-            ):
-                self.people.append(group)
-            elif ITINERARIES[group.itinerary_index].get_current_type(group) == "Walk":
+            pool.log(group, now, (self.name, self.id))
+            itinerary = self.env.itineraries[pool.itinerary[group]]
+            leg = pool.leg[group]
+            route, gets_off_at = itinerary.get_current(leg)
+            if itinerary.last_leg(leg):
+                if gets_off_at == self:
+                    self.finish(group)
+                    continue
+            elif gets_off_at == self or route.last_stop == self:
+                leg += 1
+                pool.leg[group] = leg
+                route = itinerary.get_current_route(leg)
+
+            if route.get_type() in ROUTE_NAMES:
+                self.queue(group)
+            elif route.get_type() == "Walk":
                 # Queue people all up to walk
 
                 time_to_wait = 0.5
-                self.people.append(group)
-                self.env.process(
-                    ITINERARIES[group.itinerary_index]
-                    .get_current_route(group)
-                    .walk_instance(group, time_to_wait)
-                )
-
-            elif ITINERARIES[group.itinerary_index].last_leg(group):
-                self.people.append(group)
+                self.queue(group)
+                self.env.process(route.walk_instance(group, time_to_wait))
 
         self.log_cur_people()
 
     def num_people(self) -> int:
-        return sum([people.get_num_people() for people in self.people])
+        return self.people_count
+
+    def num_waiting(self, route: Route) -> int:
+        return self.route_counts.get(route, 0)
 
 
 class Transporter(ABC):
@@ -286,7 +566,7 @@ class Transporter(ABC):
         trip: Trip,
         route: Route,
         location_index: int = 0,
-        people: list[People] = [],
+        people: list[Group] = [],
         capacity: int = 50,
     ) -> None:
         self.env = env
@@ -295,13 +575,53 @@ class Transporter(ABC):
         self.name = name
         self.location_index = location_index
         self.people = people
+        self.people_count = sum(env.pool.count[group] for group in people)
         self.capacity = capacity
         self.trip = trip
         self.route = route
+        self.entity = env.recorder.register(f"{self.get_type()} {id}")
 
     def get_name(self) -> str:
         return f"{self.name}"
 
+    def stop_label(self, station: Station) -> str:
+        """
+        Name a stop is given in the transporter's time_log.
+        """
+
+        return station.name
+
+    def log_arrival(self, station: Station) -> None:
+        self.env.recorder.record(
+            self.env.now + self.env_start, ARRIVAL, self.entity, station.entity
+        )
+
+    def log_passengers(self) -> None:
+        self.env.recorder.record(
+            self.env.now + self.env_start,
+            PASSENGERS,
+            self.entity,
+            self.passenger_count(),
+        )
+
+    @property
+    def time_log(self) -> dict[str, float]:
+        """
+        The time the transporter last arrived at each stop.
+        """
+
+        times, stops = self.env.recorder.series(ARRIVAL, self.entity)
+        stations = self.route.stops + [stop for stop in self.trip.stations if stop]
+        entities = {station.entity: station for station in stations}
+        return {
+            self.stop_label(entities[stop]): time
+            for time, stop in zip(minutes(times), stops.tolist())
+        }
+
+    @property
+    def passenger_changes(self) -> dict[float, int]:
+        return self.env.recorder.timeline(PASSENGERS, self.entity)
+
     def load_passengers(self, station: Station) -> None:
         """
         Loads passengers from the current stop onto this transporter. Given the number of seats
@@ -309,24 +629,30 @@ class Transporter(ABC):
         onto the transporter. The function also logs the number of people waiting at the bus stop.
         """
 
+        if station.closed:
+            return
+
         seats_left = self.capacity - self.passenger_count()
-        people_at_stop = sum(group.get_num_people() for group in station.people)
+        people_at_stop = station.num_waiting(self.route)
         if not people_at_stop:
-            if DEBUG:
-                print(
-                    f"({self.env.now+self.env_start}): No passengers at stop {station.name}"
+            if self.env.trace.level >= TRACE_VERBOSE:
+                self.env.trace.record(
+                    self.env.now + self.env_start, "no_passengers", station.name
                 )
             return
 
         if not seats_left:
-            if DEBUG:
-                print(
-                    f"({self.env.now+self.env_start}): No seats left on bus {self.get_name()}"
+            if self.env.trace.level >= TRACE_VERBOSE:
+                self.env.trace.record(
+                    self.env.now + self.env_start,
+                    "no_seats",
+                    self.get_type(),
+                    self.get_name(),
                 )
             return
 
         people_to_ride = station.board(min(people_at_stop, seats_left), self.route)
-        num_people_to_board = sum([p.get_num_people() for p in people_to_ride])
+        num_people_to_board = sum(self.env.pool.count[p] for p in people_to_ride)
 
         avg_load_time = LOAD_TIMES[self.get_type()] * num_people_to_board
         std_dev_load_time = (
@@ -335,33 +661,47 @@ class Transporter(ABC):
             * 0.1
             * ceil(station.busy_level() / 5)
         )
-        load_time = 0
-        while (
-            load_time <= avg_load_time or load_time > avg_load_time + std_dev_load_time
-        ):
-            if std_dev_load_time < 1:
-                load_time = avg_load_time
-                break
-            load_time = round(np.random.gumbel(avg_load_time, std_dev_load_time), 1)
+        load_time = avg_load_time
+        if std_dev_load_time >= 1:
+            load_time = round(
+                self.env.sampler.truncated_gumbel(
+                    avg_load_time,
+                    std_dev_load_time,
+                    avg_load_time,
+                    avg_load_time + std_dev_load_time,
+                ),
+                1,
+            )
         yield self.env.timeout(load_time)
         self.people += people_to_ride
+        self.change_passenger_count(num_people_to_board)
 
         station.log_cur_people()
-        for people in people_to_ride:
-            people.log((self.name, self.id))
-        if DEBUG:
-            print(
-                f"({self.env.now+self.env_start}): {self.get_type()} {self.get_name()} loaded {num_people_to_board} people from {station.name} ({load_time})"
+        now = self.env.now + self.env_start
+        for group in people_to_ride:
+            self.env.pool.log(group, now, (self.name, self.id))
+        if self.env.trace.level >= TRACE_EVENTS:
+            self.env.trace.record(
+                self.env.now + self.env_start,
+                "loaded",
+                self.get_type(),
+                self.get_name(),
+                num_people_to_board,
+                station.name,
+                load_time,
             )
 
-    def get_people_deloading(self, station: Station) -> list[People]:
+    def get_people_deloading(self, station: Station) -> list[Group]:
         """
-        Returns a list of people from this transporter who are getting off at the current stop.
+        Returns a list of groups from this transporter who are getting off at the current stop.
         """
 
+        pool = self.env.pool
         people = []
         for group in self.people:
-            gets_off_at = ITINERARIES[group.itinerary_index].get_current(group)[1]
+            gets_off_at = self.env.itineraries[pool.itinerary[group]].get_current(
+                pool.leg[group]
+            )[1]
             if gets_off_at == station:
                 people.append(group)
         return people
@@ -379,12 +719,15 @@ class Transporter(ABC):
         else:
             people_deloading = self.get_people_deloading(station)
 
-        num_passengers_deloaded = sum(p.get_num_people() for p in people_deloading)
+        num_passengers_deloaded = sum(self.env.pool.count[p] for p in people_deloading)
 
         if not num_passengers_deloaded:
-            if DEBUG:
-                print(
-                    f"({self.env.now+self.env_start}): No passengers got off {self.get_type()}: {self.get_name()}"
+            if self.env.trace.level >= TRACE_VERBOSE:
+                self.env.trace.record(
+                    self.env.now + self.env_start,
+                    "no_deload",
+                    self.get_type(),
+                    self.get_name(),
                 )
             return
 
@@ -394,32 +737,56 @@ class Transporter(ABC):
             * station.busy_level()
             / 5
         )
-        deload_time = 0
-        while (
-            deload_time <= avg_load_time
-            or deload_time > avg_load_time + std_dev_load_time
-        ):
-            if std_dev_load_time < 1:
-                deload_time = avg_load_time
-                break
-            deload_time = round(np.random.gumbel(avg_load_time, std_dev_load_time), 1)
+        deload_time = avg_load_time
+        if std_dev_load_time >= 1:
+            deload_time = round(
+                self.env.sampler.truncated_gumbel(
+                    avg_load_time,
+                    std_dev_load_time,
+                    avg_load_time,
+                    avg_load_time + std_dev_load_time,
+                ),
+                1,
+            )
         yield self.env.timeout(deload_time)
 
-        if DEBUG:
-            print(
-                f"({self.env.now+self.env_start}): {self.get_type()} {self.get_name()} has dropped off {num_passengers_deloaded} people at {station.name} ({deload_time})"
+        if self.env.trace.level >= TRACE_EVENTS:
+            self.env.trace.record(
+                self.env.now + self.env_start,
+                "deloaded",
+                self.get_type(),
+                self.get_name(),
+                num_passengers_deloaded,
+                station.name,
+                deload_time,
             )
 
         station.put(people_deloading)
 
         self.people.clear()
+        self.change_passenger_count(-self.people_count)
 
     def move_to_next_stop(self, num_stops: int) -> None:
         new_location_index = (self.location_index + 1) % num_stops
         self.location_index = new_location_index
 
     def passenger_count(self) -> int:
-        return sum(group.get_num_people() for group in self.people)
+        return self.people_count
+
+    def change_passenger_count(self, change: int) -> None:
+        self.people_count += change
+        if CHECK_HEADCOUNTS:
+            self.check_headcount()
+
+    def check_headcount(self) -> None:
+        """
+        Debug check that the running passenger count matches a full recount of the groups on board.
+        """
+
+        recount = sum(self.env.pool.count[group] for group in self.people)
+        assert (
+            self.people_count == recount
+        ), f"{self.get_name()}: passenger count {self.people_count} != {recount}"
 
     @abstractmethod
     def get_type(self) -> str:
@@ -442,14 +809,12 @@ class Bus(Transporter):
         trip: Trip,
         route: Route,
         location_index: int = 0,
-        people: list[People] = [],
+        people: list[Group] = [],
         capacity: int = 50,
     ) -> None:
         super().__init__(
             env, env_start, id, name, trip, route, location_index, people, capacity
         )
-        self.time_log = {}
-        self.passenger_changes = {}
 
     def get_type(self) -> str:
         return "Bus"
@@ -458,7 +823,10 @@ class Bus(Transporter):
         return f"{self.id}, {self.trip}, {self.location_index}, {self.people}, {self.capacity}"
 
     def current_stop(self) -> Station:
-        return STATION_NAMES[self.trip.timetable[self.location_index][0]]
+        return self.trip.stations[self.location_index]
+
+    def stop_label(self, station: Station) -> str:
+        return f"{station.name} ({station.id})"
 
     def bus_instance(self, bus_route: BusRoute) -> None:
         """
@@ -468,83 +836,71 @@ class Bus(Transporter):
         point it will despawn.
         """
 
-        self.passenger_changes[self.env.now + self.env_start] = self.passenger_count()
+        self.log_passengers()
+        last_index = len(self.trip) - 1
         while True:
-            with self.current_stop().bays.request() as req:
+            cur_stop = self.current_stop()
+            with cur_stop.bays.request() as req:
                 yield req
-                if DEBUG:
-                    print(
-                        f"({self.env.now+bus_route.env_start}): Bus {self.get_name()} arrived at {self.current_stop().name}"
+                if self.env.trace.level >= TRACE_EVENTS:
+                    self.env.trace.record(
+                        self.env.now + self.env_start,
+                        "arrived",
+                        self.get_type(),
+                        self.get_name(),
+                        cur_stop.name,
                     )
-                self.time_log[
-                    f"{self.current_stop().name} ({self.current_stop().id})"
-                ] = (self.env.now + self.env_start)
+                self.log_arrival(cur_stop)
 
-                if self.current_stop().name != self.trip.timetable[-1][0]:
+                if self.location_index != last_index:
                     prev_passenger_count = self.passenger_count()
 
-                    yield self.env.process(self.load_passengers(self.current_stop()))
+                    yield self.env.process(self.load_passengers(cur_stop))
 
-                    yield self.env.process(self.deload_passengers(self.current_stop()))
+                    yield self.env.process(self.deload_passengers(cur_stop))
 
                     if prev_passenger_count != self.passenger_count():
-                        self.passenger_changes[
-                            self.env.now + self.env_start
-                        ] = self.passenger_count()
+                        self.log_passengers()
 
                 else:
-                    yield self.env.process(self.deload_passengers(self.current_stop()))
-                    self.passenger_changes[
-                        self.env.now + self.env_start
-                    ] = self.passenger_count()
+                    yield self.env.process(self.deload_passengers(cur_stop))
+                    self.log_passengers()
                     # Despawn
-                    if DEBUG:
-                        print(
-                            f"({self.env.now+bus_route.env_start}): Bus {self.get_name()} ended its journey."
+                    if self.env.trace.level >= TRACE_EVENTS:
+                        self.env.trace.record(
+                            self.env.now + self.env_start,
+                            "despawned",
+                            self.get_type(),
+                            self.get_name(),
                         )
                     break
 
-                previous_stop = STATION_NAMES[
-                    self.trip.timetable[self.location_index][0]
-                ]
-                self.move_to_next_stop(len(self.trip.timetable))
-
-                cur_stop = self.current_stop()
-
-                index = 0
-
-                for stop, time in self.trip.timetable:
-                    if cur_stop.name == stop:
-                        expected_travel_time = time - self.trip.timetable[index - 1][1]
-                        break
-                    index += 1
-                if expected_travel_time == 0:
-                    print("**Had a case where travel time was 0**")
-                    expected_travel_time = 1
-
-                if expected_travel_time < 0:
-                    if DEBUG:
-                        print("***ERROR*** Travel time <= 0!!!")
-                        exit()
-                    expected_travel_time = 1
+                previous_stop = cur_stop
+                self.move_to_next_stop(len(self.trip))
+                expected_travel_time = self.trip.leg_durations[self.location_index]
 
                 std_dev_travel_time = 4 * ceil(previous_stop.busy_level() / 10)
-                travel_time = 0
-                while (
-                    travel_time <= expected_travel_time
-                    or travel_time > expected_travel_time + std_dev_travel_time
-                ):
-                    if std_dev_travel_time < 1:
-                        travel_time = expected_travel_time
-                        break
+                travel_time = expected_travel_time
+                if std_dev_travel_time >= 1:
                     travel_time = ceil(
-                        np.random.gumbel(expected_travel_time, std_dev_travel_time)
+                        self.env.sampler.truncated_gumbel(
+                            expected_travel_time,
+                            std_dev_travel_time,
+                            expected_travel_time,
+                            expected_travel_time + std_dev_travel_time,
+                        )
                     )
 
             yield self.env.timeout(travel_time)
-            if DEBUG:
-                print(
-                    f"({self.env.now+bus_route.env_start}): Bus {self.get_name()} travelled from {previous_stop.name} to {self.current_stop().name} ({travel_time} mins)"
+            if self.env.trace.level >= TRACE_EVENTS:
+                self.env.trace.record(
+                    self.env.now + self.env_start,
+                    "travelled",
+                    self.get_type(),
+                    self.get_name(),
+                    previous_stop.name,
+                    self.current_stop().name,
+                    travel_time,
                 )
 
 
@@ -564,14 +920,12 @@ class Train(Transporter):
         trip: Trip,
         route: Route,
         location_index: int = 0,
-        people: list[People] = [],
+        people: list[Group] = [],
         capacity: int = 100,
     ) -> None:
         super().__init__(
             env, env_start, id, name, trip, route, location_index, people, capacity
         )
-        self.time_log = {}
-        self.passenger_changes = {}
 
     def get_type(self) -> str:
         return "Train"
@@ -590,9 +944,13 @@ class Train(Transporter):
         while True:
             with train_route.get_current_stop(self).bays.request() as req:
                 yield req
-                if DEBUG:
-                    print(
-                        f"({self.env.now+train_route.env_start}): Train {self.get_name()} arrived at {train_route.get_current_stop(self).name}"
+                if self.env.trace.level >= TRACE_EVENTS:
+                    self.env.trace.record(
+                        self.env.now + self.env_start,
+                        "arrived",
+                        self.get_type(),
+                        self.get_name(),
+                        train_route.get_current_stop(self).name,
                     )
                 if train_route.get_current_stop(self) != train_route.last_stop:
                     yield self.env.process(
@@ -602,65 +960,52 @@ class Train(Transporter):
                     yield self.env.process(
                         self.deload_passengers(train_route.get_current_stop(self))
                     )
-                    self.passenger_changes[
-                        self.env.now + self.env_start
-                    ] = self.passenger_count()
+                    self.log_passengers()
 
                 else:
                     yield self.env.process(
                         self.deload_passengers(train_route.get_current_stop(self))
                     )
-                    self.passenger_changes[
-                        self.env.now + self.env_start
-                    ] = self.passenger_count()
+                    self.log_passengers()
                     # Despawn
-                    if DEBUG:
-                        print(
-                            f"({self.env.now+train_route.env_start}): Train {self.get_name()} ended its journey."
+                    if self.env.trace.level >= TRACE_EVENTS:
+                        self.env.trace.record(
+                            self.env.now + self.env_start,
+                            "despawned",
+                            self.get_type(),
+                            self.get_name(),
                         )
                     break
 
                 previous_stop = train_route.stops[self.location_index]
                 self.move_to_next_stop(len(train_route.stops))
                 cur_stop = train_route.get_current_stop(self)
-                expected_travel_time = 0
-                index = 0
-                for stop, time in self.trip.timetable:
-                    if cur_stop.name == stop:
-                        travel_time = time - self.trip.timetable[index - 1][1]
-                        break
-                    index += 1
-
-                if expected_travel_time == 0:
-                    # Some train stops have very small distances between, to stop teleportation, make min one
-                    print("**Had a case where travel time was 0**")
-                    expected_travel_time = 1
-
-                if expected_travel_time < 0:
-                    if DEBUG:
-                        print("***ERROR*** Travel time <= 0!!!")
-                        exit()
-                    expected_travel_time = 1
+                # Some train stops have very small distances between, the compiled trip already
+                # makes these legs at least one minute to stop teleportation
+                expected_travel_time = self.trip.leg_duration_to(cur_stop)
 
             std_dev_travel_time = 4 * ceil(previous_stop.busy_level() / 10)
-            travel_time = 0
-            while (
-                travel_time <= expected_travel_time
-                or travel_time > expected_travel_time + std_dev_travel_time
-            ):
-                if std_dev_travel_time < 1:
-                    travel_time = expected_travel_time
-                    break
+            travel_time = expected_travel_time
+            if std_dev_travel_time >= 1:
                 travel_time = ceil(
-                    np.random.gumbel(expected_travel_time, std_dev_travel_time)
+                    self.env.sampler.truncated_gumbel(
+                        expected_travel_time,
+                        std_dev_travel_time,
+                        expected_travel_time,
+                        expected_travel_time + std_dev_travel_time,
+                    )
                 )
             yield self.env.timeout(travel_time)
-            self.time_log[train_route.get_current_stop(self).name] = (
-                self.env.now + self.env_start
-            )
-            if DEBUG:
-                print(
-                    f"({self.env.now+train_route.env_start}): Train {self.get_name()} travelled from {previous_stop.name} to {train_route.get_current_stop(self).name} ({travel_time} mins)"
+            self.log_arrival(train_route.get_current_stop(self))
+            if self.env.trace.level >= TRACE_EVENTS:
+                self.env.trace.record(
+                    self.env.now + self.env_start,
+                    "travelled",
+                    self.get_type(),
+                    self.get_name(),
+                    previous_stop.name,
+                    train_route.get_current_stop(self).name,
+                    travel_time,
                 )
 
 
@@ -690,10 +1035,30 @@ class Route(ABC):
         self.transporter_spawn_max = transporter_spawn_max
         self.trip_timing_data = trip_timing_data
         self.transporters_spawned = 0
+        # (lat, long) of each point along the route, in order
+        self.shape: list[tuple[float, float]] = []
 
     def get_stations(self):
         return self.stops
 
+    def compile_spawn_schedule(self) -> list[tuple[int, Trip, int]]:
+        """
+        Builds the list of (spawn_time, trip, timetable_index) entries for this route, sorted by
+        spawn time. A trip is spawned at the first stop in its timetable which is reached at or
+        after the start of the simulation, so trips that are already underway at 'env_start' join
+        the route part way through.
+        """
+
+        schedule = []
+        for trip in self.trip_timing_data:
+            trip.compile(self.stops, self.env.station_names)
+            for index, (_, arrival_time) in enumerate(trip.timetable):
+                if arrival_time >= self.env_start:
+                    schedule.append((arrival_time, trip, index))
+                    break
+        schedule.sort(key=lambda entry: entry[0])
+        return schedule
+
     @abstractmethod
     def initiate_route(self) -> None:
         pass
@@ -723,47 +1088,38 @@ class BusRoute(Route):
         super().__init__(
             env, env_start, id, name, stops, trip_timing_data, transporter_spawn_max
         )
+        self.spawn_schedule = self.compile_spawn_schedule()
         self.running = self.env.process(self.initiate_route())
         self.transporters: list[Bus] = []
 
     def initiate_route(self) -> None:
         """
         A function to initiate the route. Will spawn busses on the according time
-        intervals and then handle how these buses transport people along the route
+        intervals and then handle how these buses transport people along the route. The spawner
+        sleeps until the next departure in the spawn schedule and finishes once it is exhausted.
         """
 
-        trips_to_iniate = self.trip_timing_data
-        while True:
-            station_info = None
-            trip_info = None
-            trips_inited = []
-            for trip in trips_to_iniate:
-                for station, arrival_time in trip.timetable:
-                    if (
-                        arrival_time == (self.env.now + self.env_start)
-                        and self.transporter_spawn_max != self.transporters_spawned
-                    ):
-                        station_info = (station, arrival_time)
-                        trip_info = trip
-                        # Now have a trip to start
-                        new_bus = Bus(
-                            env=self.env,
-                            env_start=self.env_start,
-                            id=self.transporters_spawned,
-                            name=f"B{self.transporters_spawned}_{self.name}",
-                            trip=trip_info,
-                            route=self,
-                            location_index=trip_info.timetable.index(station_info),
-                            people=[],
-                        )
-                        self.transporters_spawned += 1
-                        self.add_bus(new_bus)
-                        self.env.process(new_bus.bus_instance(self))
-                        trips_inited.append(trip)
-            for trip in trips_inited:
-                trips_to_iniate.remove(trip)
+        for spawn_time, trip, timetable_index in self.spawn_schedule:
+            if self.transporter_spawn_max == self.transporters_spawned:
+                break
 
-            yield self.env.timeout(1)
+            delay = spawn_time - (self.env.now + self.env_start)
+            if delay > 0:
+                yield self.env.timeout(delay)
+
+            new_bus = Bus(
+                env=self.env,
+                env_start=self.env_start,
+                id=self.transporters_spawned,
+                name=f"B{self.transporters_spawned}_{self.name}",
+                trip=trip,
+                route=self,
+                location_index=timetable_index,
+                people=[],
+            )
+            self.transporters_spawned += 1
+            self.add_bus(new_bus)
+            self.env.process(new_bus.bus_instance(self))
 
     def get_type(self) -> str:
         return "BusRoute"
@@ -798,43 +1154,35 @@ class TrainRoute(Route):
         super().__init__(
             env, env_start, id, name, stops, trip_timing_data, transporter_spawn_max
         )
+        self.spawn_schedule = self.compile_spawn_schedule()
         self.running = self.env.process(self.initiate_route())
         self.transporters: list[Train] = []
 
     def initiate_route(self) -> None:
         """
         A function to initiate the route. Will spawn trains at stops according to the trip timing
-        data.
+        data, sleeping until the next departure in the spawn schedule.
         """
-        trips_to_iniate = self.trip_timing_data
-        while True:
-            station_info = None
-            trip_info = None
-            trips_inited = []
-            for trip in trips_to_iniate:
-                for station, arrival_time in trip.timetable:
-                    if arrival_time == (self.env.now + self.env_start):
-                        station_info = (station, arrival_time)
-                        trip_info = trip
-                        # Now have a trip to start
-                        new_train = Train(
-                            env=self.env,
-                            env_start=self.env_start,
-                            id=self.transporters_spawned,
-                            name=f"T{self.transporters_spawned}_{self.name}",
-                            trip=trip_info,
-                            route=self,
-                            location_index=self.get_stop_with_name(station_info[0]),
-                            people=[],
-                        )
-                        self.transporters_spawned += 1
-                        self.add_train(new_train)
-                        self.env.process(new_train.train_instance(self))
-                        trips_inited.append(trip)
-            for trip in trips_inited:
-                trips_to_iniate.remove(trip)
+        for spawn_time, trip, timetable_index in self.spawn_schedule:
+            delay = spawn_time - (self.env.now + self.env_start)
+            if delay > 0:
+                yield self.env.timeout(delay)
 
-            yield self.env.timeout(1)
+            new_train = Train(
+                env=self.env,
+                env_start=self.env_start,
+                id=self.transporters_spawned,
+                name=f"T{self.transporters_spawned}_{self.name}",
+                trip=trip,
+                route=self,
+                location_index=self.get_stop_with_name(
+                    trip.timetable[timetable_index][0]
+                ),
+                people=[],
+            )
+            self.transporters_spawned += 1
+            self.add_train(new_train)
+            self.env.process(new_train.train_instance(self))
 
     def get_type(self) -> str:
         return "TrainRoute"
@@ -859,57 +1207,104 @@ class Walk(Route):
         id: int,
         stops: list[Station],
         location_index: int = 0,
-        people: list[People] = [],
+        people: list[Group] = [],
     ) -> None:
         super().__init__(env, env_start, id, None, stops, None, None)
         self.walking_congestion = 1
         self.location_index = location_index
         self.people = people
-        self.walk_time_log = {}
+        self.people_count = sum(env.pool.count[group] for group in people)
+        self.entity = env.recorder.register(f"Walk {id}")
+        self.walks_started = 0
         self.duration = 0
 
     def initiate_route(self) -> None:
         return super().initiate_route()
 
-    def walk_instance(self, people: People, time_to_leave=0) -> None:
+    @property
+    def walk_time_log(self) -> dict[int, list[float | None]]:
         """
-        Walking process for People walking from one stop to another.
+        The [start, end] of every walk by key, where end is None for walks still going.
+        """
+
+        recorder = self.env.recorder
+        starts, keys = recorder.series(WALK_START, self.entity)
+        walks = {
+            key: [start, None] for key, start in zip(keys.tolist(), minutes(starts))
+        }
+        ends, keys = recorder.series(WALK_END, self.entity)
+        for key, end in zip(keys.tolist(), minutes(ends)):
+            walks[key][1] = end
+        return walks
+
+    def walk_instance(self, group: Group, time_to_leave=0) -> None:
+        """
+        Walking process for a group of people walking from one stop to another. Each walk is
+        recorded with the next free key, and shows up in walk_time_log as [start, end].
         """
         yield self.env.timeout(time_to_leave)
-        try:
-            self.first_stop.people.remove(people)
-        except ValueError:
-            pass
-        people.log((None, self.id))
-        self.walk_time_log[people] = [self.env.now + self.env_start, None]
-        self.people.append(people)
+        pool = self.env.pool
+        num_people = pool.count[group]
+        self.first_stop.remove(group, self)
+        pool.log(group, self.env.now + self.env_start, (None, self.id))
+        walk_key = self.walks_started
+        self.walks_started += 1
+        self.env.recorder.record(
+            self.env.now + self.env_start, WALK_START, self.entity, walk_key
+        )
+        self.people.append(group)
+        self.change_num_people(num_people)
         self.stops[0].log_cur_people()
         expected_walk_time = self.walk_time() * self.walking_congestion
         std_dev_walk_time = expected_walk_time * 1 / 3 * self.get_num_people() / 100
-        walk_time = 0
-        while (
-            walk_time < expected_walk_time
-            or walk_time > expected_walk_time + std_dev_walk_time
-        ):
-            walk_time = ceil(np.random.gumbel(expected_walk_time, std_dev_walk_time))
-        print("Will walk for: ", expected_walk_time, std_dev_walk_time, walk_time)
+        walk_time = ceil(
+            self.env.sampler.truncated_gumbel(
+                expected_walk_time,
+                std_dev_walk_time,
+                expected_walk_time,
+                floor(expected_walk_time + std_dev_walk_time),
+            )
+        )
         yield self.env.timeout(walk_time)
-        self.people.remove(people)
-        self.walk_time_log[people][1] = self.env.now + self.env_start
-        self.stops[1].put([people])
-        if DEBUG:
-            print(
-                f"({self.env_start+self.env.now}): {people.get_num_people()} people walked from {self.stops[0].name} to {self.stops[1].name} ({walk_time} mins)"
+        self.people.remove(group)
+        self.change_num_people(-num_people)
+        self.env.recorder.record(
+            self.env.now + self.env_start, WALK_END, self.entity, walk_key
+        )
+        self.stops[1].put([group])
+        if self.env.trace.level >= TRACE_EVENTS:
+            self.env.trace.record(
+                self.env.now + self.env_start,
+                "walked",
+                num_people,
+                self.stops[0].name,
+                self.stops[1].name,
+                walk_time,
             )
 
     def get_num_people(self) -> int:
-        return sum(group.get_num_people() for group in self.people)
+        return self.people_count
+
+    def change_num_people(self, change: int) -> None:
+        self.people_count += change
+        if CHECK_HEADCOUNTS:
+            self.check_headcount()
+
+    def check_headcount(self) -> None:
+        """
+        Debug check that the running walker count matches a full recount of the walking groups.
+        """
+
+        recount = sum(self.env.pool.count[group] for group in self.people)
+        assert (
+            self.people_count == recount
+        ), f"Walk {self.id}: walker count {self.people_count} != {recount}"
 
     def walk_time(self) -> int:
         """
         Reponsible for calculating the walk time between two locations
         """
-        return randint(5, 20)
+        return self.env.sampler.randint(5, 20)
 
     def get_type(self) -> str:
         return "Walk"
@@ -950,18 +1345,21 @@ class Suburb:
     def suburb(self) -> None:
         """
         Every `frequency` minutes, will distribute random amount of population to nearby
-        stations.
+        stations. Between distributions the suburb sleeps until the next one is due, rather than
+        waking up every minute to check.
         """
         current_distribution = 0
 
         while current_distribution < self.max_distributes:
-            if (self.env.now + self.env_start) % self.frequency == 0:
-                have_distributed = self.distribute_people(
-                    ceil(self.population / (self.max_distributes))
-                )
+            wait = -(self.env.now + self.env_start) % self.frequency
+            if wait:
+                yield self.env.timeout(wait)
 
-                current_distribution += 1
-                self.population -= have_distributed
+            have_distributed = self.distribute_people(
+                ceil(self.population / (self.max_distributes))
+            )
+            current_distribution += 1
+            self.population -= have_distributed
             yield self.env.timeout(1)
 
         # distribute remaining people if there are any
@@ -978,7 +1376,7 @@ class Suburb:
 
             if not possible_stations:
                 continue
-            station = choice(possible_stations)
+            station = self.env.sampler.choice(possible_stations)
             if not self.station_distribution[station]:
                 continue
 
@@ -987,22 +1385,26 @@ class Suburb:
             if num_for_stop > num_people - people_distributed:
                 num_for_stop = num_people - people_distributed
 
-            people_arriving_at_stop = People(
-                env=self.env,
+            people_arriving_at_stop = self.env.pool.new(
                 count=num_for_stop,
                 start_time=self.env.now,
                 start_location=station,
-                itinerary_index=choice(STATION_ITINERARY_LOOKUP[station]),
-                current_route_in_itin_index=0,  # SHOULD always be 0, each active station has unique itin.
-                env_start=self.env_start,
+                itinerary_index=self.env.sampler.choice(
+                    self.env.station_itinerary_lookup[station]
+                ),
+                leg=0,  # SHOULD always be 0, each active station has unique itin.
             )
 
             station.put([people_arriving_at_stop], from_suburb=True)
-            People.num_in_simulation += people_arriving_at_stop.get_num_people()
-
-            if DEBUG:
-                print(
-                    f"({self.env.now+self.env_start}): {num_for_stop} people arrived at {station.name} in {self.name}"
+            self.env.num_in_simulation += num_for_stop
+
+            if self.env.trace.level >= TRACE_EVENTS:
+                self.env.trace.record(
+                    self.env.now + self.env_start,
+                    "distributed",
+                    num_for_stop,
+                    station.name,
+                    self.name,
                 )
 
             people_distributed += num_for_stop
@@ -1010,18 +1412,89 @@ class Suburb:
 
 
 class Trip:
-    """This trip object will be created to hold transporter timings"""
+    """
+    This trip object will be created to hold transporter timings. Once the stations on the trip
+    exist, the timetable is compiled into parallel tuples so transporters can look up their
+    stops and expected travel times by index:
+
+    stations[i]       - Station object for the i'th stop of the trip
+    arrival_times[i]  - Scheduled arrival time (minutes) at the i'th stop
+    leg_durations[i]  - Scheduled travel time from stop i - 1 to stop i, at least one minute
+    stop_index        - Maps each Station to the index of its first appearance in the trip
+    """
 
     def __init__(self, timetable: list[tuple[str, int]]) -> None:
         self.timetable = timetable
+        self.stations: tuple[Station, ...] = ()
+        self.arrival_times: tuple[int, ...] = tuple(time for _, time in timetable)
+        self.leg_durations: tuple[int, ...] = ()
+        self.stop_index: dict[Station, int] = {}
+
+    def __len__(self) -> int:
+        return len(self.timetable)
+
+    def compile(self, stops: list[Station], station_names: dict[str, Station]) -> None:
+        """
+        Resolves the station names in the timetable to Station objects and precomputes the
+        duration of each leg. Names are looked up in 'station_names' first and then in 'stops'
+        (the stops of the route this trip runs on). Legs with a zero or negative duration are
+        repaired to one minute so transporters never teleport between stops.
+        """
+
+        stops_by_name = {}
+        for stop in stops:
+            stops_by_name.setdefault(stop.name, stop)
+
+        self.stations = tuple(
+            station_names.get(name, stops_by_name.get(name))
+            for name, _ in self.timetable
+        )
+        self.arrival_times = tuple(time for _, time in self.timetable)
+        self.leg_durations = tuple(
+            max(self.arrival_times[i] - self.arrival_times[i - 1], 1) if i else 1
+            for i in range(len(self.arrival_times))
+        )
+        self.stop_index = {}
+        for index, station in enumerate(self.stations):
+            if station is not None:
+                self.stop_index.setdefault(station, index)
+
+    def leg_duration_to(self, station: Station) -> int:
+        """
+        Returns the scheduled travel time into 'station', or one minute if the trip never stops
+        there.
+        """
+
+        index = self.stop_index.get(station)
+        return self.leg_durations[index] if index is not None else 1
 
 
 def run_simulation(
-    user_data: dict[dict], sim_id: int
+    user_data: dict[dict],
+    sim_id: int,
+    save: bool = True,
+    network: NetworkSnapshot | None = None,
 ) -> tuple[list[Station], list[Trip], list[Route], list[Itinerary], int, dict[dict]]:
-    """Main function to run the simulation"""
+    """
+    Main function to run the simulation. Each call builds its own SimulationContext, so runs
+    don't share state. If user_data contains a "seed", every random draw in the simulation comes
+    from a generator seeded with it, so the same request reproduces the same output. The seed
+    that was used is returned in the output. If 'save' is False the results are not written to
+    the database, otherwise they are queued on the background writer in writer.py, which saves
+    them after the output has been returned. Setting user_data["engine"] to "fast" runs the
+    network on the macroscopic engine in fastsim.py instead of SimPy. If user_data["profile"]
+    is True (or SIM_PROFILE is set) the output includes a profile of where the run's time went,
+    which with SIM_PROFILE is also written to a file named after the simulation. 'network' can
+    be a NetworkSnapshot already loaded for the request's itineraries and snapshot date, in
+    which case the network isn't read from the database again. If SIM_RECORD_DIR is set, the run's
+    records are also saved there as sim_<sim_id>.npz. If SIM_TRACE is set, the run's trace is
+    dumped once it has finished (see Tracer.save).
+    """
 
-    env = Environment()
+    env = SimulationContext(
+        seed=user_data.get("seed"),
+        profile=bool(user_data.get("profile") or PROFILE_PATH),
+    )
 
     stations, trips, routes, itineraries, suburbs = get_data(
         env,
@@ -1031,16 +1504,46 @@ def run_simulation(
         user_data["snapshot_date"],
         user_data["active_suburbs"],
         user_data["active_stations"],
+        network,
     )
 
     print(f"Models successfully created for simulation #{sim_id}.")
 
-    env.run(user_data["time_horizon"])
+    avg_wait_times = None
+    if user_data.get("engine", "agent") == "fast":
+        # Imported here as the fast engine is built on the models in this module
+        from .fastsim import FastSimulation
+
+        avg_wait_times = FastSimulation(
+            env,
+            user_data["env_start"],
+            user_data["time_horizon"],
+            stations,
+            routes,
+            suburbs,
+        ).run()
+    else:
+        env.run(user_data["time_horizon"])
     print(f"Simulation #{sim_id} successfully ran.")
-    output = process_simulation_output(stations, routes, itineraries, sim_id, trips)
+    if env.trace.level:
+        env.trace.save(sim_id)
+    output = process_simulation_output(
+        stations, routes, itineraries, sim_id, trips, env, avg_wait_times
+    )
+    output["Seed"] = env.sampler.seed
+    if env.profiler is not None:
+        output["Profile"] = env.profiler.summary()
+        if PROFILE_PATH:
+            env.profiler.write(profile_path(sim_id))
+    if RECORD_DIR:
+        env.recorder.save(os.path.join(RECORD_DIR, f"sim_{sim_id}.npz"))
     print(f"Simulation #{sim_id} output processed.")
-    load_sim_data_into_db(stations, routes, itineraries, sim_id)
-    print(f"Simulation #{sim_id} loaded into db.")
+    if save:
+        # Imported here as the writer saves outputs through this module
+        from .writer import WRITER
+
+        WRITER.submit(sim_id, output)
+        print(f"Simulation #{sim_id} queued to be loaded into db.")
 
     return output
 
@@ -1051,10 +1554,14 @@ def process_simulation_output(
     itineraries: list[Itinerary],
     sim_id: int,
     trips: list[Trip],
+    env: SimulationContext,
+    avg_wait_times: dict[str, float] | None = None,
 ) -> dict[dict]:
     """
     Analyse all the models once the simulation has finished running and returns the
-    information which will be sent to the frontend.
+    information which will be sent to the frontend. The average wait at each station is worked
+    out from the journey logs of the simulation's groups, unless an engine which doesn't keep
+    journey logs passes them in as 'avg_wait_times'.
 
     output has the following format:
 
@@ -1104,34 +1611,42 @@ def process_simulation_output(
         ],
         "Bottlenecks": [
             station_ids
-        ]
+        ],
+        "PercentageArrived": percentage_arrived
     }
     """
 
-    output = {"Simulation_id": sim_id, "Routes": {}, "Stations": {}, "Itineraries": {}}
+    output = {"Simulation_id": sim_id}
+    output["Routes"] = routes_output(routes)
+
+    if avg_wait_times is None:
+        avg_wait_times = average_wait_times(env, stations[0].env_start + env.now)
+    output["Stations"], bottlenecks = stations_output(stations, avg_wait_times)
+
+    output["Itineraries"] = itineraries_output(itineraries)
+    output["Bottlenecks"] = bottlenecks
+    output["PercentageArrived"] = percentage_arrived(itineraries, env)
+    return output
+
+
+def routes_output(routes: list[Route]) -> dict[dict]:
+    """
+    Returns the "Routes" section of the simulation output.
+    """
 
+    output = {}
     for route in routes:
-        output["Routes"][route.id] = {}
-        rd = output["Routes"][route.id]
+        output[route.id] = {}
+        rd = output[route.id]
         rd["method"] = route.get_type()
         if route.get_type() == "BusRoute":
             rd["BusesOnRoute"] = {}
             br = rd["BusesOnRoute"]
-            shape_id = TripM.objects.filter(route_id=route.id).first().shape_id.shape_id
-            shapes = ShapeM.objects.filter(shape_id=shape_id)
-
-            shape_out = [
-                (shape.shape_pt_sequence, shape.shape_pt_lat, shape.shape_pt_lon)
-                for shape in shapes
-            ]
-            shape_out.sort(key=lambda x: x[0])
-            shape_out = [
-                {"sequence": i, "lat": b, "long": c}
-                for i, (a, b, c) in enumerate(shape_out)
+            rd["shape"] = [
+                {"sequence": i, "lat": lat, "long": long}
+                for i, (lat, long) in enumerate(route.shape)
             ]
 
-            rd["shape"] = shape_out
-
             for bus in route.transporters:
                 br[bus.id] = {
                     "Timeout": bus.time_log,
@@ -1141,7 +1656,9 @@ def process_simulation_output(
             rd["Walkout"] = route.walk_time_log
 
         rd["stations"] = {}
-        for station in route.stops:
+        for sequence, station in enumerate(route.stops):
+            if station.id in rd["stations"]:
+                continue  # Stops visited twice keep the sequence of their first visit
             rd["stations"][station.id] = {}
             sd = rd["stations"][station.id]
             sd["stationName"] = station.name
@@ -1149,89 +1666,63 @@ def process_simulation_output(
                 "lat": station.pos[0],
                 "long": station.pos[1],
             }
-            sd["sequence"] = route.stops.index(station)
-
-    people = People.all_people
-    station_waits = {}
-    station_groups = {}
-    for group in people:
-        log = group.people_log
-        index = 0
-        for time, entry in log.items():
-            try:
-                if index != len(list(log.keys())) - 1:
-                    if entry[1] not in station_waits:
-                        station_waits[entry[1]] = [list(log.keys())[index + 1] - time]
-                    else:
-                        station_waits[entry[1]].append(
-                            list(log.keys())[index + 1] - time
-                        )
-                else:
-                    # Is the last entry in log
-                    end_sim = station.env_start + station.env.now
-                    if entry[1] not in station_waits:
-                        station_waits[entry[1]] = [end_sim - time]
-                    else:
-                        station_waits[entry[1]].append(end_sim - time)
-                if entry[1] not in station_groups:
-                    station_groups[entry[1]] = 1
-                else:
-                    station_groups[entry[1]] += 1
-            except:
-                # Format error
-                pass
-            index += 1
+            sd["sequence"] = sequence
+    return output
 
-    destination = itineraries[0].routes[-1][1]
 
-    num_arrived = destination.num_people()
-    num_late = People.num_in_simulation - num_arrived
+def stations_output(
+    stations: list[Station], avg_wait_times: dict[str, float]
+) -> tuple[dict[dict], list[bool]]:
+    """
+    Returns the "Stations" section of the simulation output along with the "Bottlenecks"
+    section, as whether a station is a bottleneck depends on the waits at every station.
+    """
 
-    avg_wait_times = {}
+    output = {}
     bottles = {}
     for station in stations:
-        output["Stations"][station.id] = {}
-        sd = output["Stations"][station.id]
+        output[station.id] = {}
+        sd = output[station.id]
         sd["stationName"] = station.name
         sd["pos"] = {
             "lat": station.pos[0],
             "long": station.pos[1],
         }
-        if station.id in station_waits:
-            sd["avg_wait"] = sum(station_waits[station.id]) / len(
-                station_waits[station.id]
-            )
-            avg_wait_times[station.id] = sum(station_waits[station.id]) / len(
-                station_waits[station.id]
-            )
-        else:
-            sd["avg_wait"] = "N/A"
+        sd["avg_wait"] = avg_wait_times.get(station.id, "N/A")
         sd["PeopleChangesOverTime"] = station.people_over_time
-    data = np.array(list(avg_wait_times.values()))
-
-    mean = np.mean(data)
-    std = np.std(data)
+    waited = [station for station in stations if station.id in avg_wait_times]
+    data = np.array([avg_wait_times[station.id] for station in waited])
 
     threshold = 1
-    outliers = []
-    for x in data:
-        z = (x - mean) / std
-        if abs(z) > threshold and x > mean:
-            outliers.append(x)
+    bottleneck = np.zeros(len(data), dtype=bool)
+    if len(data):
+        mean = np.mean(data)
+        std = np.std(data)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            z = (data - mean) / std
+        bottleneck = (np.abs(z) > threshold) & (data > mean)
+    bottlenecks = {station.id for station, b in zip(waited, bottleneck) if b}
 
     for station in stations:
-        sd = output["Stations"][station.id]
-        if sd["avg_wait"] in outliers:
+        sd = output[station.id]
+        if station.id in bottlenecks:
             sd["bottleneck"] = True
             bottles[station.id] = True
         else:
             sd["bottleneck"] = False
 
-    percentage_arrived = (num_arrived) / (num_late + num_arrived) * 100
+    return output, list(bottles.values())
+
+
+def itineraries_output(itineraries: list[Itinerary]) -> dict[dict]:
+    """
+    Returns the "Itineraries" section of the simulation output.
+    """
 
+    output = {}
     for itinerary in itineraries:
-        output["Itineraries"][itinerary.id] = {}
-        itin_d = output["Itineraries"][itinerary.id]
+        output[itinerary.id] = {}
+        itin_d = output[itinerary.id]
         itin_d["Routes"] = {}
         for route_tuple in itinerary.routes:
             route = route_tuple[0]
@@ -1239,37 +1730,183 @@ def process_simulation_output(
             rd = itin_d["Routes"][route.id]
             for stop in route.stops:
                 rd.add(stop.name)
-    output["Bottlenecks"] = list(bottles.values())
     return output
 
 
+def percentage_arrived(itineraries: list[Itinerary], env: SimulationContext) -> float:
+    """
+    Returns the percentage of the people distributed by suburbs who have reached the
+    destination of the itineraries.
+    """
+
+    destination = itineraries[0].routes[-1][1]
+
+    num_arrived = destination.num_people()
+    num_late = env.num_in_simulation - num_arrived
+
+    return (num_arrived) / (num_late + num_arrived) * 100
+
+
+def average_wait_times(env: SimulationContext, end_sim: float) -> dict[str, float]:
+    """
+    Works out how long groups spent at each place they were logged at, using the time until
+    their next log entry (or until 'end_sim' for their last entry), and returns the average for
+    each place.
+    """
+
+    journeys = env.pool.journeys
+    stays = journeys.stays(env.pool.all_heads(), end_sim)
+
+    # Places are averaged by id, and several locations (e.g. buses on different routes) can
+    # share one
+    ids = {}
+    id_of_location = np.array(
+        [ids.setdefault(where[1], len(ids)) for where in journeys.locations],
+        dtype=np.int64,
+    )
+    place = id_of_location[stays["location"]]
+    total = np.bincount(
+        place, weights=stays["leave"] - stays["enter"], minlength=len(ids)
+    )
+    count = np.bincount(place, minlength=len(ids))
+
+    return {id: float(total[i] / count[i]) for id, i in ids.items() if count[i]}
+
+
+class NetworkSnapshot:
+    """
+    Plain data copy of the parts of the GTFS network that a simulation request needs: the
+    timetabled trips and shape of every route used by its itineraries, the stations those trips
+    and walks visit, and the stations in each allowed suburb. It is loaded from the database once by
+    load_network and holds no model instances, so it can be pickled and handed to worker
+    processes, which then build as many simulations from it as they like without touching the
+    database.
+    """
+
+    def __init__(self, snapshot_date: date) -> None:
+        self.snapshot_date = snapshot_date
+        # (route_id, name, [[(station_id, arrival_time), ...] for each trip])
+        self.routes: list[tuple[str, str, list[list[tuple[str, int]]]]] = []
+        # route_id -> [(lat, long), ...] of the route's shape
+        self.shapes: dict[str, list[tuple[float, float]]] = {}
+        self.stations: dict[
+            str, tuple[str, float, float]
+        ] = {}  # id -> (name, lat, long)
+        self.suburbs: dict[str, list[str]] = {}  # Station ids in each allowed suburb
+
+
+def load_network(snapshot_date: str, itineraries: list) -> NetworkSnapshot:
+    """
+    Reads everything needed to simulate 'itineraries' on 'snapshot_date' from the database into
+    a NetworkSnapshot.
+    """
+
+    if not snapshot_date:
+        snapshot_date = datetime.date.today()
+    else:
+        snapshot_date = datetime.strptime(snapshot_date, "%Y-%m-%d").date()
+
+    day_of_week = snapshot_date.strftime("%A").lower()
+    network = NetworkSnapshot(snapshot_date)
+
+    # Get all calendar objects (containing service info) that run on the requested d.o.t.w
+    calendars = CalendarM.objects.all().filter(
+        start_date__lte=snapshot_date, end_date__gte=snapshot_date, **{day_of_week: 1}
+    )
+
+    route_ids = set()
+    walk_station_ids = set()
+    for itinerary in itineraries:
+        for route in itinerary["routes"]:
+            if route["route_id"] != "walk":
+                route_ids.add(route["route_id"])
+            else:
+                walk_station_ids.update((route["start"], route["end"]))
+
+    db_routes = RouteM.objects.all().filter(route_id__in=list(route_ids))
+
+    for route in db_routes:
+        # Get trip_ids that run on this day for this particular route
+        db_trips = TripM.objects.all().filter(service_id__in=calendars, route_id=route)
+        if not db_trips:
+            raise Exception(
+                f"No trips exist for route {route.name} on {snapshot_date.strftime('%Y-%m-%d')}"
+            )
+
+        route_trips = []
+        for trip in db_trips:
+            db_timetables = (
+                TimetableM.objects.all()
+                .filter(trip_id=trip)
+                .select_related("station")
+                .order_by("sequence")
+            )
+
+            timetable = []
+            for stop in db_timetables:
+                station = stop.station
+                network.stations[station.station_id] = (
+                    station.name,
+                    station.lat,
+                    station.long,
+                )
+                timetable.append(
+                    (station.station_id, convert_date_to_int(stop.arrival_time))
+                )
+            route_trips.append(timetable)
+
+        network.routes.append((route.route_id, route.name, route_trips))
+
+        # The route is drawn along the shape of its first trip
+        shape = TripM.objects.filter(route_id=route).select_related("shape_id").first()
+        network.shapes[route.route_id] = list(
+            ShapeM.objects.filter(shape_id=shape.shape_id.shape_id).values_list(
+                "shape_pt_lat", "shape_pt_lon"
+            )
+        )
+
+    for station in StationM.objects.filter(station_id__in=list(walk_station_ids)):
+        network.stations[station.station_id] = (station.name, station.lat, station.long)
+
+    # Sorted so that a seeded run creates (and samples) its suburbs in the same order in
+    # every process
+    suburb_names = sorted(
+        {suburb["suburb"] for suburb in StationM.objects.order_by().values("suburb")}
+        & set(ALLOWED_SUBURBS)
+    )
+    for sub_name in suburb_names:
+        network.suburbs[sub_name] = [
+            station["station_id"]
+            for station in StationM.objects.order_by().filter(suburb=sub_name).values()
+        ]
+
+    return network
+
+
 def get_data(
-    env: Environment,
+    env: SimulationContext,
     env_start: int,
     time_horizon: int,
     itineraries: list,  # Go to views.py for format
     snapshot_date: str,
     active_suburbs: list[str],
     active_stations: list[str],
+    network: NetworkSnapshot | None = None,
 ) -> tuple[
     dict[int, Station], list[Trip], dict[int, BusRoute], list[Itinerary], list[Suburb]
 ]:
     """
     This function accesses the data from the database and converts it into simulation
-    objects.
+    objects. If a NetworkSnapshot that was loaded for the same itineraries is passed in as
+    'network' the database is not used at all.
     """
 
-    if not snapshot_date:
-        snapshot_date = datetime.date.today()
-    else:
-        snapshot_date = datetime.strptime(snapshot_date, "%Y-%m-%d").date()
+    if network is None:
+        network = load_network(snapshot_date, itineraries)
 
-    day_of_week = snapshot_date.strftime("%A").lower()
-
-    # Get all calendar objects (containing service info) that run on the requested d.o.t.w
-    calendars = CalendarM.objects.all().filter(
-        start_date__lte=snapshot_date, end_date__gte=snapshot_date, **{day_of_week: 1}
-    )
+    # Itineraries are built in order of id, so the output doesn't depend on the order they
+    # were sent in
+    itineraries = sorted(itineraries, key=lambda itinerary: itinerary["itinerary_id"])
 
     # Get all routes that are used in the itineraries
     route_ids = {}
@@ -1289,8 +1926,6 @@ def get_data(
                 walks[f"Walk_{walk_id}"] = (start, end)
                 walk_id += 1
 
-    db_routes = RouteM.objects.all().filter(route_id__in=list(route_ids.keys()))
-
     sim_routes = {}
     sim_trips = []
     sim_stations = {}
@@ -1306,63 +1941,39 @@ def get_data(
     )
     sim_stations.update({"-1": suncorp})
 
-    for route in db_routes:
-        # Get trip_ids that run on this day for this particular route
-        db_trips = TripM.objects.all().filter(service_id__in=calendars, route_id=route)
-        if not db_trips:
-            raise Exception(
-                f"No trips exist for route {route.name} on {snapshot_date.strftime('%Y-%m-%d')}"
-            )
-
-        if not db_trips:
-            continue
-
+    for route_id, route_name, trips in network.routes:
         route_stations = {}
         route_trips = []
 
         ## Create sim Trips ##
-        for trip in db_trips:
-            # Get Timetables for that trip
+        for timetable in trips:
             sim_timetables = []
-            db_timetables = (
-                TimetableM.objects.all().filter(trip_id=trip).order_by("sequence")
-            )
 
-            for timetable in db_timetables:
-                sim_timetables.append(
-                    (
-                        timetable.station.name,
-                        convert_date_to_int(timetable.arrival_time),
-                    )
-                )
+            for station_id, arrival_time in timetable:
+                name, lat, long = network.stations[station_id]
+                sim_timetables.append((name, arrival_time))
 
                 # Filter stations for this route and add to global list
-                timetable_station = StationM.objects.filter(
-                    station_id=timetable.station.station_id
-                ).first()
-
-                if timetable_station.station_id not in sim_stations.keys():
+                if station_id not in sim_stations.keys():
                     new_station = Station(
                         env,
-                        timetable_station.station_id,
-                        timetable_station.name,
-                        (timetable_station.lat, timetable_station.long),
+                        station_id,
+                        name,
+                        (lat, long),
                         1,
                         env_start,
                     )
-                    if new_station.name in STATION_NAMES:
+                    if new_station.name in env.station_names:
                         pass  # Likely OK as stations may appear on multiple iterations of same route, etc, etc
                     else:
-                        STATION_NAMES[new_station.name] = new_station
+                        env.station_names[new_station.name] = new_station
 
-                    sim_stations[timetable_station.station_id] = new_station
+                    sim_stations[station_id] = new_station
                     if new_station.id not in route_stations.keys():
-                        route_stations[timetable_station.station_id] = new_station
+                        route_stations[station_id] = new_station
                 else:
                     if new_station.id not in route_stations.keys():
-                        route_stations[timetable_station.station_id] = sim_stations[
-                            timetable_station.station_id
-                        ]
+                        route_stations[station_id] = sim_stations[station_id]
 
             new_trip = Trip(sim_timetables)
 
@@ -1373,49 +1984,34 @@ def get_data(
         new_route = BusRoute(
             env,
             env_start,
-            route.route_id,
-            route.name,
+            route_id,
+            route_name,
             [route for route in route_stations.values()],
             route_trips,
         )
+        new_route.shape = network.shapes[route_id]
 
-        if route.route_id in sim_routes.keys():
+        if route_id in sim_routes.keys():
             print("***ERROR*** Duplicate route id")
         else:
-            sim_routes[route.route_id] = new_route
+            sim_routes[route_id] = new_route
 
     # Create walks
     walks_from_stops = {}
     for walk_id in walks:
         if walk_id not in sim_routes:
             # Create stations used in walk if they dont already exist
-
-            if walks[walk_id][0] not in sim_stations:
-                print(walks[walk_id][0])
-                # Get station from db
-                station = StationM.objects.filter(station_id=walks[walk_id][0]).first()
-                sim_stations[walks[walk_id][0]] = Station(
-                    env,
-                    walks[walk_id][0],
-                    walks[walk_id][0],
-                    (station.lat, station.long),
-                    1,
-                    env_start,
-                )
-
-            if walks[walk_id][1] not in sim_stations:
-                print(sim_stations)
-                print(walks[walk_id][1])
-                # Get station from db
-                station = StationM.objects.filter(station_id=walks[walk_id][1]).first()
-                sim_stations[walks[walk_id][1]] = Station(
-                    env,
-                    walks[walk_id][1],
-                    walks[walk_id][1],
-                    (station.lat, station.long),
-                    1,
-                    env_start,
-                )
+            for station_id in walks[walk_id]:
+                if station_id not in sim_stations:
+                    _, lat, long = network.stations[station_id]
+                    sim_stations[station_id] = Station(
+                        env,
+                        station_id,
+                        station_id,
+                        (lat, long),
+                        1,
+                        env_start,
+                    )
 
             stops = [
                 sim_stations[walks[walk_id][0]],
@@ -1431,10 +2027,12 @@ def get_data(
         for route in itinerary["routes"]:
             if route["route_id"] != "walk":
                 for station in sim_routes[route["route_id"]].stops:
-                    if STATION_ITINERARY_LOOKUP.get(station):
-                        STATION_ITINERARY_LOOKUP[station].append(len(ITINERARIES))
+                    if env.station_itinerary_lookup.get(station):
+                        env.station_itinerary_lookup[station].append(
+                            len(env.itineraries)
+                        )
                     else:
-                        STATION_ITINERARY_LOOKUP[station] = [len(ITINERARIES)]
+                        env.station_itinerary_lookup[station] = [len(env.itineraries)]
 
                 routes.append(
                     (
@@ -1453,15 +2051,10 @@ def get_data(
         )
 
         sim_itineraries.append(new_itin)
-        ITINERARIES.append(new_itin)
-
-    suburbs_db = StationM.objects.order_by().values("suburb").distinct()
+        env.itineraries.append(new_itin)
 
-    suburb_names = [suburb["suburb"] for suburb in suburbs_db.values()]
-    list_set = set(suburb_names)
-    suburb_names = list(list_set)
     suburbs_out = []
-    people_in_attendance = np.random.normal(350000, 100000)
+    people_in_attendance = env.sampler.normal(350000, 100000)
     print("People in attendance: ", people_in_attendance)
     hotel_suburbs = [
         "Brisbane City",
@@ -1476,23 +2069,13 @@ def get_data(
         tourist_extra = 1 / 3 * people_in_attendance  # Will distribute to hotel suburbs
     people_in_attendance -= tourist_extra
 
-    for sub_name in suburb_names:
+    for sub_name, stations in network.suburbs.items():
         # Create suburb for each
-        if sub_name not in ALLOWED_SUBURBS:
-            continue  # Don't gen non allowed
         distribute_frequency = 10
         max_distributes = 2
-        stations_in_suburb = StationM.objects.order_by().filter(suburb=sub_name)
-        active_stations_in_suburb_id = [
-            station["station_id"]
-            for station in StationM.objects.order_by()
-            .filter(suburb=sub_name, station_id__in=active_stations)
-            .values()
+        active_stations_in_suburb = [
+            sim_stations[id] for id in stations if id in active_stations
         ]
-        active_stations_in_suburb = []
-        for id in active_stations_in_suburb_id:
-            active_stations_in_suburb.append(sim_stations[id])
-        stations = [station["station_id"] for station in stations_in_suburb.values()]
         num_stations = len(active_stations_in_suburb)
         pop_distribution = {}
         active = sub_name in active_suburbs
@@ -1531,130 +2114,56 @@ def get_data(
     return stations_out, trips_out, routes_out, itineraries_out, suburbs_out
 
 
-def load_bus_or_train_route_into_db(route, sim_output):
+def load_sim_data_into_db(sim_id: int, output: dict) -> None:
     """
-    This function loads bus or train routes into the database.
+    Saves a simulation's output into the database, so it can be sent to the frontend again
+    without rerunning the simulation. Each time series in the output is stored as one SimSeries
+    row of packed arrays, and the rest of the output is stored on the SimulationOutput row, all
+    in one transaction and a handful of queries however long the run was.
     """
 
-    for station in route.stops:
-        for transporter in route.transporters:
-            for stop_name, time in transporter.time_log.items():
-                for time, passenger_count in transporter.passenger_changes.items():
-                    bus_time_out = TransporterTimeOut.objects.create(
-                        sim_id=sim_output,
-                        stop_name=stop_name,
-                        time=time,
-                    )
-                    bus_time_out.save()
+    with transaction.atomic():
+        sim_output, created = SimulationOutput.objects.get_or_create(
+            simulation_id=sim_id
+        )
 
-                    passenger_changes = PassengerChanges.objects.create(
-                        sim_id=sim_output,
-                        time=time,
-                        passenger_count=passenger_count,
-                    )
-                    passenger_changes.save()
-
-                    transporter_on_route = TransporterOnRouteInfo.objects.create(
-                        transporter_id=transporter.id,
-                        sim_id=sim_output,
-                        transporter_timeout=TransporterTimeOut.objects.order_by(
-                            "-transporter_timeout_id"
-                        ).first(),
-                        transporter_passenger_changes=PassengerChanges.objects.order_by(
-                            "-passenger_changes_id"
-                        ).first(),
-                    )
-                    transporter_on_route.save()
-
-                    route_sim = RouteSim.objects.create(
-                        route_id=route.id,
-                        sim_id=sim_output,
-                        method=route.get_type(),
-                        transporters_on_route=TransporterOnRouteInfo.objects.order_by(
-                            "-transporter_id"
-                        ).first(),
-                        stations=StationSim.objects.filter(
-                            sim_id=sim_output, name=station.name
-                        ).first(),
-                    )
-                    route_sim.save()
+        if not created:
+            print(f"Simulation #{sim_id} already exists in database, skipping save...")
+            return
 
+        write_output(sim_output, output)
 
-def load_walk_into_db(walk: Walk, sim_output):
+
+def load_sim_output(sim_id: int) -> dict | None:
     """
-    This function loads walks into the database.
+    Returns the stored output of a saved simulation, in the same format it was sent to the
+    frontend in, or None if the simulation hasn't been saved with its output.
     """
 
-    walk_sim = WalkSim.objects.create(
-        walk_id=walk.id,
-        from_station=StationM.objects.filter(
-            name=walk.first_stop.name, station_id=walk.first_stop.id
-        ).first(),
-        to_station=StationM.objects.filter(
-            name=walk.last_stop.name, station_id=walk.last_stop.id
-        ).first(),
-        duration=0,
-    )
-    walk_sim.save()
+    return read_output(sim_id)
 
 
-def load_sim_data_into_db(
-    stations: list[Station],
-    routes: list[Route],
-    itineraries: list[Itinerary],
-    sim_id: int,
-) -> None:
+def list_saved_sim_outputs(
+    after: int | None = None, limit: int = SAVED_SIMS_PAGE_SIZE
+) -> tuple[list[dict], int | None]:
     """
-    Generate all the data for the simulation and load it into the database (convert to SimStation,
-    SimRoute, SimItinerary objects), then using these generation SimOutput object.
+    Returns one page of the saved simulations which have a stored output, ordered by sim id,
+    starting after the sim id 'after'. The second value is the 'after' to pass for the next
+    page, or None if this was the last one. Pages are found with a keyset on the primary key,
+    so every page costs a single indexed query however far into the list it is.
     """
 
-    sim_output, created = SimulationOutput.objects.get_or_create(simulation_id=sim_id)
-
-    if not created:
-        print(f"Simulation #{sim_id} already exists in database, skipping save...")
-        return
-
-    # Create Stations
-    for station in stations:
-        for time, num_people in station.people_over_time.items():
-            passenger_changes = PassengerChanges.objects.create(
-                sim_id=sim_output,
-                time=time,
-                passenger_count=num_people,
-            )
-
-            passenger_changes.save()
-
-            station_sim = StationSim.objects.create(
-                station_id=station.id,
-                sim_id=sim_output,
-                name=station.name,
-                lat=station.pos[0],
-                long=station.pos[1],
-                passenger_count=PassengerChanges.objects.order_by(
-                    "-passenger_changes_id"
-                ).first(),
-            )
-
-            station_sim.save()
-
-    # Create Routes
-    for route in routes:
-        if route.get_type() == "BusRoute" or route.get_type() == "TrainRoute":
-            load_bus_or_train_route_into_db(route, sim_output)
-        elif route.get_type() == "Walk":
-            load_walk_into_db(route, sim_output)
+    saved = SimulationOutput.objects.filter(output__isnull=False)
+    if after is not None:
+        saved = saved.filter(simulation_id__gt=after)
+    rows = list(
+        saved.order_by("simulation_id").values("simulation_id", "created")[: limit + 1]
+    )
 
-    # Create Itineraries
-    for itinerary in itineraries:
-        for route in itinerary.routes:
-            itin = ItinerarySim.objects.create(
-                itinerary_id=itinerary.id,
-                sim_id=sim_output,
-                routes=RouteSim.objects.order_by("-route_sim_id").first(),
-            )
-            itin.save()
+    page = [{"sim_id": row["simulation_id"], "created": row["created"]} for row in rows]
+    if len(page) > limit:
+        return page[:limit], page[limit - 1]["sim_id"]
+    return page, None
 
 
 def generate_itins(user_data: dict) -> dict:
@@ -1828,7 +2337,7 @@ def test_sim_with_trains_basic():
     waiting is required.
     """
 
-    env = Environment()
+    env = SimulationContext()
 
     # Create Stations.
     StationA = Station(env, 0, "StationA", (0, 0), 1, 0, 0)
@@ -1858,7 +2367,7 @@ def test_sim_with_trains_basic():
     )
 
     # Create Itineraries.
-    ITINERARIES.append(Itinerary(env, 0, [(RouteA, StationC)]))
+    env.itineraries.append(Itinerary(env, 0, [(RouteA, StationC)]))
 
     env.run(100)
 
@@ -1878,7 +2387,7 @@ def test_sim_with_trains_collision():
     waiting is required.
     """
 
-    env = Environment()
+    env = SimulationContext()
 
     # Create Stations.
     StationA = Station(env, 0, "StationA", (0, 0), 1, 0, 0)
@@ -1908,13 +2417,13 @@ def test_sim_with_trains_collision():
     RouteB = TrainRoute(env, 0, 0, "RouteB", [StationD, StationB, StationC], [TripB], 1)
 
     # Create Itineraries.
-    ITINERARIES.append(Itinerary(env, 0, [(RouteA, StationC)]))
-    ITINERARIES.append(Itinerary(env, 1, [(RouteB, StationD)]))
+    env.itineraries.append(Itinerary(env, 0, [(RouteA, StationC)]))
+    env.itineraries.append(Itinerary(env, 1, [(RouteB, StationD)]))
 
-    STATION_ITINERARY_LOOKUP[StationA] = [0]
-    STATION_ITINERARY_LOOKUP[StationB] = [0, 1]
-    STATION_ITINERARY_LOOKUP[StationC] = [0, 1]
-    STATION_ITINERARY_LOOKUP[StationD] = [0]
+    env.station_itinerary_lookup[StationA] = [0]
+    env.station_itinerary_lookup[StationB] = [0, 1]
+    env.station_itinerary_lookup[StationC] = [0, 1]
+    env.station_itinerary_lookup[StationD] = [0]
 
     env.run(100)
 
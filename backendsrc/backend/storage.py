@@ -0,0 +1,177 @@
+from __future__ import annotations
+import numpy as np
+from db.models import SimSeries, SimulationOutput
+from .recorder import ARRIVAL, PASSENGERS, STATION_PEOPLE, WALK_END, WALK_START, minutes
+
+
+TIMES_DTYPE = np.dtype("<f8")
+VALUES_DTYPE = np.dtype("<i8")
+
+
+def pack(times: list[float], values: list[int]) -> dict:
+    return {
+        "times": np.array(list(times), TIMES_DTYPE).tobytes(),
+        "values": np.array(list(values), VALUES_DTYPE).tobytes(),
+    }
+
+
+def unpack(row: SimSeries) -> tuple[list[float], list[int]]:
+    times = np.frombuffer(row.times, TIMES_DTYPE)
+    values = np.frombuffer(row.values, VALUES_DTYPE)
+    return minutes(times), values.tolist()
+
+
+def split_series(output: dict) -> tuple[dict, list[tuple[str, int, dict]]]:
+    """
+    Takes the time series out of a simulation output. Returns the rest of the output (a copy,
+    'output' itself isn't changed) with None where each series was, so the output keeps its
+    order, and the series as (entity_id, kind, packed arrays):
+
+    - Each station's PeopleChangesOverTime, as its STATION_PEOPLE series.
+    - Each transporter's PassengerChangesOverTime as its PASSENGERS series, and its Timeout as
+      its ARRIVAL series with the sequence of each stop on the route as the values.
+      Transporters are identified as "route_id:transporter_id".
+    - Each walk's Walkout as its WALK_START and WALK_END series, with the walk keys as values.
+
+    A Timeout whose stops can't be told apart by their label is left in the output.
+    """
+
+    output = copy_dicts(output)
+    series = []
+
+    for station_id, sd in output.get("Stations", {}).items():
+        people = sd.get("PeopleChangesOverTime")
+        if people is not None:
+            sd["PeopleChangesOverTime"] = None
+            series.append(
+                (str(station_id), STATION_PEOPLE, pack(people.keys(), people.values()))
+            )
+
+    for route_id, rd in output.get("Routes", {}).items():
+        stops = stop_sequences(rd)
+        for transporter_id, td in rd.get("BusesOnRoute", {}).items():
+            entity_id = f"{route_id}:{transporter_id}"
+            changes = td["PassengerChangesOverTime"]
+            td["PassengerChangesOverTime"] = None
+            series.append(
+                (entity_id, PASSENGERS, pack(changes.keys(), changes.values()))
+            )
+            if stops is not None and all(label in stops for label in td["Timeout"]):
+                timeout = td["Timeout"]
+                td["Timeout"] = None
+                sequences = [stops[label] for label in timeout]
+                series.append((entity_id, ARRIVAL, pack(timeout.values(), sequences)))
+
+        walks = rd.get("Walkout")
+        if walks is not None:
+            rd["Walkout"] = None
+            started = [(walk[0], key) for key, walk in walks.items()]
+            ended = [
+                (walk[1], key) for key, walk in walks.items() if walk[1] is not None
+            ]
+            for kind, entries in ((WALK_START, started), (WALK_END, ended)):
+                times = [time for time, _ in entries]
+                keys = [int(key) for _, key in entries]
+                series.append((str(route_id), kind, pack(times, keys)))
+
+    return output, series
+
+
+def copy_dicts(value):
+    """
+    Copies the nested dicts of an output, sharing everything else (lists, sets, numbers) with
+    the original.
+    """
+
+    if isinstance(value, dict):
+        return {key: copy_dicts(item) for key, item in value.items()}
+    return value
+
+
+def merge_series(output: dict, rows: list[SimSeries]) -> dict:
+    """
+    Puts the series taken out by split_series back into 'output', in place, and returns it.
+    """
+
+    series = {(row.entity_id, row.kind): row for row in rows}
+
+    for station_id, sd in output.get("Stations", {}).items():
+        row = series.get((station_id, STATION_PEOPLE))
+        if row is not None:
+            sd["PeopleChangesOverTime"] = dict(zip(*unpack(row)))
+
+    for route_id, rd in output.get("Routes", {}).items():
+        stops = stop_sequences(rd) or {}
+        labels = {sequence: label for label, sequence in stops.items()}
+        for transporter_id, td in rd.get("BusesOnRoute", {}).items():
+            entity_id = f"{route_id}:{transporter_id}"
+            arrivals = series.get((entity_id, ARRIVAL))
+            if arrivals is not None:
+                times, sequences = unpack(arrivals)
+                td["Timeout"] = {
+                    labels[sequence]: time for time, sequence in zip(times, sequences)
+                }
+            changes = series.get((entity_id, PASSENGERS))
+            if changes is not None:
+                td["PassengerChangesOverTime"] = dict(zip(*unpack(changes)))
+
+        started = series.get((route_id, WALK_START))
+        if started is not None:
+            walks = {key: [time, None] for time, key in zip(*unpack(started))}
+            ended = series.get((route_id, WALK_END))
+            if ended is not None:
+                for time, key in zip(*unpack(ended)):
+                    walks[key][1] = time
+            rd["Walkout"] = walks
+
+    return output
+
+
+def stop_sequences(rd: dict) -> dict[str, int] | None:
+    """
+    Maps the label each stop of a route has in its transporters' Timeout to the stop's sequence
+    on the route, or returns None if two stops would have the same label.
+    """
+
+    sequences = {}
+    for station_id, sd in rd.get("stations", {}).items():
+        if rd.get("method") == "BusRoute":
+            label = f"{sd['stationName']} ({station_id})"
+        else:
+            label = sd["stationName"]
+        if label in sequences:
+            return None
+        sequences[label] = sd["sequence"]
+    return sequences
+
+
+def write_output(sim_output: SimulationOutput, output: dict) -> None:
+    """
+    Stores a simulation's output: the time series as one SimSeries row each, and the rest of
+    the output on the SimulationOutput row, in a few queries however long the run was.
+    """
+
+    sim_output.output, series = split_series(output)
+    sim_output.save(update_fields=["output"])
+    SimSeries.objects.bulk_create(
+        [
+            SimSeries(sim_id=sim_output, entity_id=entity_id, kind=kind, **arrays)
+            for entity_id, kind, arrays in series
+        ]
+    )
+
+
+def read_output(sim_id: int) -> dict | None:
+    """
+    Returns a stored simulation output, with its time series put back, in the same format it
+    was sent to the frontend in. Takes two queries.
+    """
+
+    output = (
+        SimulationOutput.objects.filter(simulation_id=sim_id)
+        .values_list("output", flat=True)
+        .first()
+    )
+    if output is None:
+        return None
+    return merge_series(output, list(SimSeries.objects.filter(sim_id=sim_id)))
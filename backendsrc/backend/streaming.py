@@ -0,0 +1,125 @@
+from __future__ import annotations
+from typing import Iterator
+from .sim import (
+    NetworkSnapshot,
+    SimulationContext,
+    average_wait_times,
+    get_data,
+    itineraries_output,
+    percentage_arrived,
+    routes_output,
+    stations_output,
+)
+from .writer import WRITER
+
+
+STREAM_INTERVAL = 10  # Minutes of simulated time between progress messages
+
+
+def stream_simulation(
+    user_data: dict,
+    sim_id: int,
+    save: bool = True,
+    network: NetworkSnapshot | None = None,
+    interval: int = STREAM_INTERVAL,
+) -> Iterator[dict]:
+    """
+    Runs the simulation described by user_data like run_simulation, but yields messages as the
+    run goes instead of returning the output once everything is done. The simulation is run
+    'interval' minutes at a time, with a progress message after each slice, and then each
+    section of the output is yielded as soon as it has been worked out. Messages have one of the
+    following formats, in this order:
+
+    {"type": "started", "Simulation_id": sim_id, "Seed": seed}
+    {
+        "type": "progress",
+        "time": int, (minutes since midnight)
+        "progress": float, (fraction of the time horizon simulated so far)
+        "Stations": {station_id: num_people, ...},
+    }
+    {"type": "section", "name": "Routes", "data": {...}}
+    {"type": "section", "name": "Stations", "data": {...}}
+    {"type": "section", "name": "Itineraries", "data": {...}}
+    {
+        "type": "section",
+        "name": "Summary",
+        "data": {"Bottlenecks": [...], "PercentageArrived": percentage_arrived},
+    }
+    {"type": "done", "Simulation_id": sim_id}
+
+    The sections hold the same data as the matching parts of run_simulation's output. If 'save'
+    is True the output is then queued on the background writer before the "done" message. If
+    the run fails part way through, an {"type": "error", "error": str} message is the last one.
+    The macroscopic engine can't be paused, so it sends a single progress message at the end.
+    """
+
+    env_start = user_data["env_start"]
+    time_horizon = user_data["time_horizon"]
+    env = SimulationContext(seed=user_data.get("seed"))
+    yield {"type": "started", "Simulation_id": sim_id, "Seed": env.sampler.seed}
+
+    try:
+        stations, trips, routes, itineraries, suburbs = get_data(
+            env,
+            env_start,
+            time_horizon,
+            user_data["itineraries"],
+            user_data["snapshot_date"],
+            user_data["active_suburbs"],
+            user_data["active_stations"],
+            network,
+        )
+        print(f"Models successfully created for simulation #{sim_id}.")
+
+        avg_wait_times = None
+        if user_data.get("engine", "agent") == "fast":
+            from .fastsim import FastSimulation
+
+            avg_wait_times = FastSimulation(
+                env, env_start, time_horizon, stations, routes, suburbs
+            ).run()
+            yield progress(env_start, time_horizon, time_horizon, stations)
+        else:
+            while env.now < time_horizon:
+                env.run(min(env.now + interval, time_horizon))
+                yield progress(env_start, env.now, time_horizon, stations)
+        print(f"Simulation #{sim_id} successfully ran.")
+        if env.trace.level:
+            env.trace.save(sim_id)
+
+        output = {"Simulation_id": sim_id, "Routes": routes_output(routes)}
+        yield section("Routes", output["Routes"])
+        if avg_wait_times is None:
+            avg_wait_times = average_wait_times(env, env_start + env.now)
+        output["Stations"], bottlenecks = stations_output(stations, avg_wait_times)
+        yield section("Stations", output["Stations"])
+        output["Itineraries"] = itineraries_output(itineraries)
+        yield section("Itineraries", output["Itineraries"])
+        summary = {
+            "Bottlenecks": bottlenecks,
+            "PercentageArrived": percentage_arrived(itineraries, env),
+        }
+        yield section("Summary", summary)
+
+        if save:
+            output.update(summary, Seed=env.sampler.seed)
+            WRITER.submit(sim_id, output)
+            print(f"Simulation #{sim_id} queued to be loaded into db.")
+    except Exception as e:
+        yield {"type": "error", "error": str(e)}
+        return
+
+    yield {"type": "done", "Simulation_id": sim_id}
+
+
+def progress(env_start: int, now: float, time_horizon: int, stations: list) -> dict:
+    return {
+        "type": "progress",
+        "time": env_start + now,
+        "progress": now / time_horizon if time_horizon else 1.0,
+        "Stations": {station.id: station.num_people() for station in stations},
+    }
+
+
+def section(name: str, data: dict) -> dict:
+    return {"type": "section", "name": name, "data": data}
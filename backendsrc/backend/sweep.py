@@ -0,0 +1,82 @@
+from __future__ import annotations
+from concurrent.futures import ProcessPoolExecutor
+from itertools import product
+import os
+from django.db import connections
+from .sim import NetworkSnapshot, load_network, run_simulation
+
+
+SWEEP_PARAMETERS = ["env_start", "time_horizon", "active_suburbs", "active_stations"]
+
+# Network shared by every variant run in a worker process, set once by init_worker
+WORKER_NETWORK: NetworkSnapshot | None = None
+
+
+def run_sweep(
+    user_data: dict, sim_id: int, grid: dict[str, list], max_workers: int | None = None
+) -> dict:
+    """
+    Runs one simulation for every combination of the values in 'grid', which maps any of
+    SWEEP_PARAMETERS to a list of values to try. Parameters missing from the grid keep their
+    value from user_data. The network for user_data's itineraries and snapshot date is read from
+    the database once and sent to each worker process when it starts, so the variants only differ
+    in the simulation itself and run side by side. Every variant uses user_data["seed"] if given,
+    so differences between variants come from the parameters rather than the randomness. Sweep
+    results are not saved to the database.
+
+    Returns a dict of the following format:
+
+    output = {
+        "Simulation_id": sim_id,
+        "Variants": [
+            {
+                "Parameters": {parameter: value, ...},
+                "Output": output of run_simulation,
+            },
+        ],
+    }
+    """
+
+    for parameter in grid:
+        if parameter not in SWEEP_PARAMETERS:
+            raise ValueError(f"Cannot sweep over '{parameter}'")
+        if not grid[parameter]:
+            raise ValueError(f"No values given to sweep '{parameter}' over")
+
+    variants = [dict(zip(grid.keys(), values)) for values in product(*grid.values())]
+    network = load_network(user_data["snapshot_date"], user_data["itineraries"])
+    workers = min(len(variants), max_workers or os.cpu_count() or 1)
+
+    # Forked workers must not share the parent's database connections
+    connections.close_all()
+    with ProcessPoolExecutor(
+        max_workers=workers, initializer=init_worker, initargs=(network,)
+    ) as executor:
+        outputs = list(
+            executor.map(
+                run_variant,
+                [{**user_data, **variant} for variant in variants],
+                [sim_id] * len(variants),
+            )
+        )
+
+    return {
+        "Simulation_id": sim_id,
+        "Variants": [
+            {"Parameters": variant, "Output": output}
+            for variant, output in zip(variants, outputs)
+        ],
+    }
+
+
+def init_worker(network: NetworkSnapshot) -> None:
+    global WORKER_NETWORK
+    WORKER_NETWORK = network
+
+
+def run_variant(user_data: dict, sim_id: int) -> dict:
+    """
+    Runs a single variant of a sweep in a worker process using the worker's shared network.
+    """
+
+    return run_simulation(user_data, sim_id, save=False, network=WORKER_NETWORK)
@@ -0,0 +1,79 @@
+from backend.branching import Checkpoint, add_transporters, close_station
+from backend.sim import (
+    BusRoute,
+    Itinerary,
+    SimulationContext,
+    Station,
+    Suburb,
+    Trip,
+)
+
+
+def checkpoint(spawn_max: int, checkpoint_time: int = 60) -> Checkpoint:
+    """
+    Builds a bus route with a trip departing every 10 minutes from t=4, runs it until
+    'checkpoint_time' and returns the checkpoint.
+    """
+
+    env = SimulationContext(seed=2)
+    stops = [Station(env, str(i), f"S{i}", (i, i), 1, 0) for i in range(3)]
+    for station in stops:
+        env.station_names[station.name] = station
+    trips = [
+        Trip([(s.name, 4 + 10 * k + 5 * j) for j, s in enumerate(stops)])
+        for k in range(12)
+    ]
+    route = BusRoute(env, 0, "R1", "R1", stops, trips, transporter_spawn_max=spawn_max)
+    itineraries = [Itinerary(env, 0, [(route, stops[-1])])]
+    env.itineraries.extend(itineraries)
+    env.station_itinerary_lookup[stops[0]] = [0]
+    Suburb(env, "X", {stops[0]: 100}, stops, 1000, 10, 12, True, 0)
+    env.run(checkpoint_time)
+    return Checkpoint(env, stops, trips, [route], itineraries, 120)
+
+
+def spawn_times(output: dict) -> dict[int, float]:
+    buses = output["Routes"]["R1"]["BusesOnRoute"]
+    return {bus_id: min(bus["Timeout"].values()) for bus_id, bus in buses.items()}
+
+
+def test_add_transporters_spawns_from_the_checkpoint():
+    """A route at its limit spawns its extra transporters on the trips after the checkpoint"""
+
+    outputs = checkpoint(spawn_max=2).fork(
+        1, {"unchanged": None, "more": add_transporters("R1", 3)}
+    )
+
+    assert spawn_times(outputs["unchanged"]) == {0: 4, 1: 14}
+    assert spawn_times(outputs["more"]) == {0: 4, 1: 14, 2: 64, 3: 74, 4: 84}
+
+
+def test_add_transporters_to_a_running_spawner():
+    outputs = checkpoint(spawn_max=8).fork(1, {"more": add_transporters("R1", 2)})
+    assert sorted(spawn_times(outputs["more"]).values()) == [
+        4 + 10 * k for k in range(10)
+    ]
+
+
+def test_close_station():
+    """Nobody boards at a closed station after the checkpoint, so its count only grows"""
+
+    outputs = checkpoint(spawn_max=12).fork(
+        1, {"open": None, "closed": close_station("0")}
+    )
+
+    def counts_after(output: dict) -> list[int]:
+        people = output["Stations"]["0"]["PeopleChangesOverTime"]
+        return [count for time, count in sorted(people.items()) if time > 60]
+
+    closed = counts_after(outputs["closed"])
+    assert closed == sorted(closed)
+    opened = counts_after(outputs["open"])
+    assert opened != sorted(opened)
+
+
+def test_branches_share_the_checkpoint():
+    """A branch without changes gives the same output every time it is forked"""
+
+    outputs = checkpoint(spawn_max=12).fork(1, {"a": None, "b": None})
+    assert outputs["a"] == outputs["b"]
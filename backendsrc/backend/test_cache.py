@@ -0,0 +1,86 @@
+import os
+from backend.cache import ResultCache
+from backend.conftest import NETWORK_REQUEST
+from backend.sim import run_simulation
+
+
+def request(**fields) -> dict:
+    return {**NETWORK_REQUEST, **fields}
+
+
+def test_put_and_get(tmp_path):
+    cache = ResultCache(tmp_path)
+    assert cache.get(request()) is None
+
+    cache.put(request(), {"Stations": {"0": {"avg_wait": 3.5}}})
+    assert cache.get(request()) == {"Stations": {"0": {"avg_wait": 3.5}}}
+    assert cache.get(request(seed=6)) is None
+    assert cache.get(request(engine="fast")) is None
+
+
+def test_unseeded_requests_are_not_cached(tmp_path):
+    cache = ResultCache(tmp_path)
+    cache.put(request(seed=None), {})
+    assert cache.get(request(seed=None)) is None
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_key_is_canonical(tmp_path):
+    """List order which doesn't change the output doesn't change the key either"""
+
+    cache = ResultCache(tmp_path)
+    base = request(active_suburbs=["St Lucia", "Toowong"], active_stations=["0", "1"])
+    reordered = request(
+        active_suburbs=["Toowong", "St Lucia"],
+        active_stations=["1", "0"],
+        itineraries=NETWORK_REQUEST["itineraries"][::-1],
+        engine="agent",
+        profile=False,
+    )
+    assert cache.key(base) == cache.key(reordered)
+
+    legs = NETWORK_REQUEST["itineraries"][1]["routes"]
+    swapped = {"itinerary_id": 1, "routes": legs[::-1]}
+    changed = request(itineraries=[NETWORK_REQUEST["itineraries"][0], swapped])
+    assert cache.key(base) != cache.key(changed)
+
+
+def test_least_recently_used_are_evicted(tmp_path):
+    cache = ResultCache(tmp_path, max_bytes=10**9)
+    for seed in range(3):
+        cache.put(request(seed=seed), {"seed": seed, "padding": "x" * 1000})
+    size = cache.path(cache.key(request(seed=0))).stat().st_size
+
+    # Seed 1 was used least recently, then seed 0 and seed 2
+    for age, seed in [(300, 1), (200, 0), (100, 2)]:
+        path = cache.path(cache.key(request(seed=seed)))
+        os.utime(path, (path.stat().st_atime, path.stat().st_mtime - age))
+    assert cache.get(request(seed=0)) is not None  # Touches seed 0
+
+    cache.max_bytes = 2 * size
+    cache.evict()
+    assert cache.get(request(seed=1)) is None
+    assert cache.get(request(seed=2)) is not None
+    assert cache.get(request(seed=0)) is not None
+
+
+def test_invalidate(tmp_path):
+    """Reloading the GTFS data clears the cache and changes every key"""
+
+    cache = ResultCache(tmp_path)
+    cache.put(request(), {"Seed": 5})
+    key = cache.key(request())
+
+    cache.invalidate()
+    assert cache.get(request()) is None
+    assert cache.key(request()) != key
+    assert list(tmp_path.glob("*.pkl")) == []
+
+
+def test_itinerary_order_does_not_change_the_output(network):
+    """Requests which share a key give the same output when run"""
+
+    reordered = dict(network, itineraries=network["itineraries"][::-1])
+    assert run_simulation(network, 1, save=False) == run_simulation(
+        reordered, 1, save=False
+    )
@@ -0,0 +1,77 @@
+import pytest
+from backend.fastsim import FastSimulation
+from backend.sim import SimulationContext, run_simulation
+from benchmarks.network import build_network
+
+
+def benchmark_network(seed: int) -> tuple:
+    env = SimulationContext(seed=seed)
+    return env, *build_network(env, 0, 20, 4, 20, 2000, 20, seed)
+
+
+def fast_run(seed: int, time_horizon: int = 300) -> FastSimulation:
+    env, stations, trips, routes, itineraries, suburbs = benchmark_network(seed)
+    simulation = FastSimulation(env, 0, time_horizon, stations, routes, suburbs)
+    simulation.run()
+    return simulation
+
+
+def walking(simulation: FastSimulation) -> float:
+    """People still walking when the run ended"""
+
+    return sum(
+        people.sum()
+        for arrivals in simulation.walk_arrivals.values()
+        for _, people, _, _ in arrivals
+    )
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_people_are_conserved(seed):
+    """Everyone distributed is waiting, riding, walking or finished at the end of a run"""
+
+    simulation = fast_run(seed)
+    assert simulation.env.num_in_simulation == 2000
+    assert simulation.waiting.sum() + simulation.onboard.sum() + walking(
+        simulation
+    ) + simulation.finished.sum() == pytest.approx(2000)
+
+
+def test_vehicles_keep_to_their_timetable():
+    simulation = fast_run(0)
+    assert len(simulation.vehicles) == 4 * 20
+    for bus in simulation.vehicles:
+        trip = bus.trip
+        assert bus.time_log == {
+            bus.stop_label(stop): time
+            for stop, time in zip(trip.stations, trip.arrival_times)
+        }
+        assert bus.passenger_count() == 0  # Everyone gets off at the stadium
+
+
+def test_people_arrive_like_the_simpy_engine():
+    """
+    The fast engine skips bay queues and boarding times, so more people make it to the
+    stadium, but not many more
+    """
+
+    fast = agent = 0
+    for seed in range(5):
+        fast += fast_run(seed).stations[-1].num_people()
+
+        env, stations, trips, routes, itineraries, suburbs = benchmark_network(seed)
+        env.run(300)
+        agent += stations[-1].num_people()
+
+    assert fast == pytest.approx(agent, rel=0.1)
+
+
+def test_fast_output_has_the_same_form(network):
+    """Output from the fast engine can be used wherever the SimPy engine's is"""
+
+    fast = run_simulation(dict(network, engine="fast"), 1, save=False)
+    agent = run_simulation(network, 1, save=False)
+    assert fast.keys() == agent.keys()
+    assert fast["Routes"].keys() == agent["Routes"].keys()
+    assert fast["Stations"].keys() == agent["Stations"].keys()
+    assert fast["Seed"] == agent["Seed"] == 5
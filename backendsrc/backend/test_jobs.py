@@ -0,0 +1,101 @@
+from time import sleep, time
+import pytest
+import backend.jobs
+from backend.jobs import CANCELLED, DONE, FAILED, QUEUED, RUNNING, JobQueue
+
+
+def fake_stream(user_data: dict, sim_id: int, save: bool = True):
+    """
+    Stands in for stream_simulation, taking user_data["slices"] slices of 0.1 seconds each.
+    """
+
+    assert not save, "Job workers must leave saving to the parent"
+    yield {"type": "started", "Simulation_id": sim_id, "Seed": 1}
+    slices = user_data["slices"]
+    for i in range(1, slices + 1):
+        sleep(0.1)
+        yield {"type": "progress", "time": i, "progress": i / slices, "Stations": {}}
+    if user_data.get("fail"):
+        yield {"type": "error", "error": "no trips"}
+        return
+    yield {"type": "section", "name": "Routes", "data": {}}
+    yield {"type": "section", "name": "Summary", "data": {"PercentageArrived": 1.0}}
+    yield {"type": "done", "Simulation_id": sim_id}
+
+
+class FakeWriter:
+    def __init__(self) -> None:
+        self.submitted = []
+
+    def submit(self, sim_id: int, output: dict) -> None:
+        self.submitted.append((sim_id, output))
+
+
+@pytest.fixture
+def queue(monkeypatch):
+    monkeypatch.setattr(backend.jobs, "stream_simulation", fake_stream)
+    writer = FakeWriter()
+    monkeypatch.setattr(backend.jobs, "WRITER", writer)
+    queue = JobQueue(max_workers=1)
+    queue.writer = writer
+    yield queue
+    queue.shutdown()
+
+
+def wait(job, statuses, timeout: float = 10) -> str:
+    end = time() + timeout
+    while job.status() not in statuses and time() < end:
+        sleep(0.02)
+    return job.status()
+
+
+def test_job_runs_and_is_saved_by_the_parent(queue):
+    job = queue.submit({"slices": 3}, 7)
+    assert job.status() in (QUEUED, RUNNING)
+    assert wait(job, (DONE, FAILED)) == DONE
+
+    output = {"Simulation_id": 7, "Routes": {}, "PercentageArrived": 1.0, "Seed": 1}
+    assert job.future.result() == output
+    assert job.describe()["progress"] == 1.0
+    sleep(0.1)  # Done callbacks run just after the result is set
+    assert queue.writer.submitted == [(7, output)]
+    assert queue.get(job.id) is job
+
+
+def test_progress_is_reported(queue):
+    job = queue.submit({"slices": 20}, 1)
+    assert wait(job, (RUNNING,)) == RUNNING
+    end = time() + 10
+    while not job.describe()["progress"] and time() < end:
+        sleep(0.02)
+    assert 0 < job.describe()["progress"] < 1
+    assert job.describe()["time"] >= 1
+
+
+def test_cancel_running_job(queue):
+    job = queue.submit({"slices": 50}, 2)
+    assert wait(job, (RUNNING,)) == RUNNING
+    queue.cancel(job.id)
+    assert wait(job, (CANCELLED, DONE)) == CANCELLED
+    sleep(0.1)
+    assert queue.writer.submitted == []
+
+
+def test_cancel_queued_job(queue):
+    running = queue.submit({"slices": 20}, 3)
+    queued = queue.submit({"slices": 1}, 4)
+    assert queued.status() == QUEUED
+    queue.cancel(queued.id)
+    queue.cancel(running.id)
+    assert wait(running, (CANCELLED,)) == CANCELLED
+    assert wait(queued, (CANCELLED,)) == CANCELLED
+    sleep(0.1)
+    assert queue.writer.submitted == []
+
+
+def test_failed_job(queue):
+    job = queue.submit({"slices": 1, "fail": True}, 5)
+    assert wait(job, (DONE, FAILED)) == FAILED
+    assert job.describe()["error"] == "no trips"
+    sleep(0.1)
+    assert queue.writer.submitted == []
@@ -0,0 +1,158 @@
+from backend.sim import (
+    BusRoute,
+    Itinerary,
+    SimulationContext,
+    Station,
+    Suburb,
+    Trip,
+)
+
+
+def line(env: SimulationContext, num_stops: int = 3) -> tuple[list[Station], BusRoute]:
+    """
+    Builds a bus route through 'num_stops' stations, with a trip every 6 minutes, and an
+    itinerary riding it from the first stop to the last.
+    """
+
+    stops = [Station(env, str(i), f"S{i}", (i, i), 1, 0) for i in range(num_stops)]
+    for station in stops:
+        env.station_names[station.name] = station
+    trips = [
+        Trip([(s.name, k * 6 + j * 4) for j, s in enumerate(stops)]) for k in range(10)
+    ]
+    route = BusRoute(env, 0, "R1", "R1", stops, trips, transporter_spawn_max=10)
+    env.itineraries.append(Itinerary(env, 0, [(route, stops[-1])]))
+    return stops, route
+
+
+def test_finished_group_is_released():
+    """A group put down where its last leg ends finishes there instead of queueing again"""
+
+    env = SimulationContext(seed=1)
+    stops, route = line(env)
+    pool = env.pool
+    group = pool.new(7, 0, stops[0], 0)
+
+    stops[-1].put([group])
+
+    assert stops[-1].finished_count == 7
+    assert stops[-1].num_people() == 7
+    assert stops[-1].num_waiting(route) == 0
+    assert stops[-1].groups() == []
+    assert pool.free == [group]
+    assert list(pool.all_logs()) == [{0: ("S2", "2")}]
+
+
+def test_group_part_way_is_queued():
+    env = SimulationContext(seed=1)
+    stops, route = line(env)
+    group = env.pool.new(7, 0, stops[0], 0)
+
+    stops[1].put([group])
+
+    assert stops[1].finished_count == 0
+    assert stops[1].num_waiting(route) == 7
+    assert stops[1].groups() == [group]
+    assert env.pool.free == []
+
+
+def test_released_handle_is_reused():
+    """A new group takes a finished group's handle without touching anyone else's log"""
+
+    env = SimulationContext(seed=1)
+    stops, route = line(env)
+    pool = env.pool
+    finished = pool.new(7, 0, stops[0], 0)
+    other = pool.new(3, 0, stops[0], 0)
+    pool.log(other, 1, ("S0", "0"))
+    pool.log(other, 2, ("S1", "1"))
+    stops[-1].put([finished])
+
+    reused = pool.new(5, 4, stops[1], 0)
+    assert reused == finished
+    assert pool.count[reused] == 5
+    assert pool.start_time[reused] == 4
+    assert pool.get_log(reused) == {}
+
+    pool.log(reused, 6, ("S1", "1"))
+    assert pool.get_log(reused) == {6: ("S1", "1")}
+    assert pool.get_log(other) == {1: ("S0", "0"), 2: ("S1", "1")}
+    assert list(pool.all_logs()) == [
+        {0: ("S2", "2")},  # The finished group's log is kept
+        {6: ("S1", "1")},
+        {1: ("S0", "0"), 2: ("S1", "1")},
+    ]
+
+
+def test_everyone_finishes_at_the_last_stop():
+    """In a full run, people who reach the last stop finish there and don't board again"""
+
+    env = SimulationContext(seed=3)
+    stops, route = line(env, 4)
+    env.station_itinerary_lookup[stops[0]] = [0]
+    Suburb(env, "X", {stops[0]: 100}, stops, 200, 10, 2, True, 0)
+    env.run(120)
+
+    last = stops[-1]
+    assert last.finished_count == 200
+    assert last.num_people() == 200
+    assert last.groups() == []
+    assert sum(bus.passenger_count() for bus in route.transporters) == 0
+    assert len(env.pool.free) == len(env.pool.count)
+
+
+def test_split_groups_share_their_log():
+    """Both halves of a split keep the journey so far without it being copied"""
+
+    env = SimulationContext(seed=1)
+    stops, route = line(env)
+    pool = env.pool
+    group = pool.new(10, 0, stops[0], 0)
+    pool.log(group, 0, ("S0", "0"))
+    pool.log(group, 2, ("S1", "1"))
+
+    half = pool.split(group, 4)
+    assert (pool.count[group], pool.count[half]) == (6, 4)
+    assert pool.get_log(half) == pool.get_log(group)
+    assert len(pool.journeys.time) == 2
+
+    pool.log(group, 5, ("S2", "2"))
+    pool.log(half, 7, ("S2", "2"))
+    assert pool.get_log(group) == {0: ("S0", "0"), 2: ("S1", "1"), 5: ("S2", "2")}
+    assert pool.get_log(half) == {0: ("S0", "0"), 2: ("S1", "1"), 7: ("S2", "2")}
+    assert len(pool.journeys.time) == 4
+
+
+def test_stays_match_flattened_logs():
+    """The stays table has one row per stay of each flattened log, with shared prefixes"""
+
+    env = SimulationContext(seed=1)
+    stops, route = line(env)
+    pool = env.pool
+    group = pool.new(10, 0, stops[0], 0)
+    pool.log(group, 0, ("S0", "0"))
+    pool.log(group, 2, ("S1", "1"))
+    pool.log(group, 2, ("S1", "1"))  # Logged twice at the same time, one stay
+    half = pool.split(group, 4)
+    pool.log(half, 7, ("S2", "2"))
+
+    heads = [pool.head[group], pool.head[half]]
+    stays = pool.journeys.stays(heads, 10)
+    rows = sorted(
+        (
+            int(g),
+            pool.journeys.locations[location],
+            float(enter),
+            float(leave),
+        )
+        for g, location, enter, leave in zip(
+            stays["group"], stays["location"], stays["enter"], stays["leave"]
+        )
+    )
+    assert rows == [
+        (0, ("S0", "0"), 0.0, 2.0),
+        (0, ("S1", "1"), 2.0, 10.0),
+        (1, ("S0", "0"), 0.0, 2.0),
+        (1, ("S1", "1"), 2.0, 7.0),
+        (1, ("S2", "2"), 7.0, 10.0),
+    ]
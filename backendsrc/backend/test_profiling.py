@@ -0,0 +1,45 @@
+import os
+import pytest
+import backend.profiling
+import backend.sim
+from backend.sim import run_simulation
+
+
+def test_profiled_run_gives_the_same_output(network):
+    """Wrapping the processes doesn't change what the simulation does"""
+
+    profiled = run_simulation(dict(network, profile=True), 1, save=False)
+    plain = run_simulation(network, 1, save=False)
+
+    assert "Profile" not in plain
+    assert profiled.pop("Profile")
+    assert profiled == plain
+
+
+def test_summary(network):
+    summary = run_simulation(dict(network, profile=True), 1, save=False)["Profile"]
+    rows = {(row["kind"], row["route"]): row for row in summary["Processes"]}
+
+    assert rows["initiate_route", "0"]["processes"] == 1
+    assert rows["bus_instance", "0"]["processes"] == 2  # One per trip
+    assert rows["bus_instance", "0"]["events"] >= rows["bus_instance", "0"]["timeouts"]
+    assert ("walk_instance", "Walk_0") in rows
+    assert rows["suburb", None]["processes"] == 1
+
+    times = [row["wall_time"] for row in summary["Processes"]]
+    assert times == sorted(times, reverse=True)
+    assert summary["ProcessTime"] == pytest.approx(sum(times))
+    assert summary["Steps"] > 0
+
+
+def test_profile_written_per_simulation(network, monkeypatch, tmp_path):
+    path = str(tmp_path / "profile.txt")
+    monkeypatch.setattr(backend.profiling, "PROFILE_PATH", path)
+    monkeypatch.setattr(backend.sim, "PROFILE_PATH", path)
+
+    output = run_simulation(network, 7, save=False)
+
+    assert "Profile" in output
+    written = tmp_path / f"profile_sim_7_{os.getpid()}.txt"
+    assert os.listdir(tmp_path) == [written.name]
+    assert "bus_instance" in written.read_text()
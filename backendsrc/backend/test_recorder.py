@@ -0,0 +1,130 @@
+import numpy as np
+import backend.recorder
+from backend.recorder import PASSENGERS, STATION_PEOPLE, WALK_START, Recorder
+from backend.sim import (
+    BusRoute,
+    Itinerary,
+    SimulationContext,
+    Station,
+    Suburb,
+    Trip,
+    Walk,
+)
+
+
+def records(recorder: Recorder) -> list[tuple]:
+    return [tuple(record) for record in recorder.view().tolist()]
+
+
+def test_buffer_grows(monkeypatch):
+    """Records are staged a chunk at a time, and the buffer doubles whenever it fills up"""
+
+    monkeypatch.setattr(backend.recorder, "RECORDER_CHUNK", 3)
+    recorder = Recorder(capacity=4)
+    expected = [(float(i), i % 5, i, 10 * i) for i in range(10)]
+    for record in expected:
+        recorder.record(*record)
+
+    assert recorder.size == 9  # Three chunks have been copied in
+    assert len(recorder.pending) == 1
+    assert len(recorder.records) == 16
+    assert records(recorder) == expected
+    assert recorder.pending == []
+
+
+def test_staged_records_are_read():
+    """Reading a series flushes what is staged, and sees records added after an earlier read"""
+
+    recorder = Recorder()
+    station = recorder.register("Station 0")
+    recorder.record(0, STATION_PEOPLE, station, 5)
+    recorder.record(2.5, STATION_PEOPLE, station, 7)
+    assert recorder.timeline(STATION_PEOPLE, station) == {0: 5, 2.5: 7}
+
+    recorder.record(4, STATION_PEOPLE, station, 3)
+    recorder.record(4, STATION_PEOPLE, station, 1)
+    recorder.record(4, PASSENGERS, station, 9)
+    assert recorder.timeline(STATION_PEOPLE, station) == {0: 5, 2.5: 7, 4: 1}
+    assert recorder.timeline(PASSENGERS, station) == {4: 9}
+    assert recorder.timeline(PASSENGERS, station + 1) == {}
+
+
+def test_save_and_load(tmp_path):
+    recorder = Recorder(capacity=2)
+    station = recorder.register("Station 0")
+    bus = recorder.register("Bus 0")
+    for time in range(5):
+        recorder.record(time, STATION_PEOPLE, station, time * 2)
+        recorder.record(time + 0.5, PASSENGERS, bus, time)
+    path = tmp_path / "sim_1.npz"
+    recorder.save(path)
+
+    loaded = Recorder.load(path)
+    assert np.array_equal(loaded.view(), recorder.view())
+    assert loaded.entities == ["Station 0", "Bus 0"]
+    assert loaded.timeline(PASSENGERS, bus) == recorder.timeline(PASSENGERS, bus)
+    with np.load(path) as data:
+        assert data["kinds"].tolist() == backend.recorder.RECORD_KINDS
+
+    empty = tmp_path / "empty.npz"
+    Recorder().save(empty)
+    assert Recorder.load(empty).size == 0
+
+
+def walk_network() -> tuple:
+    """
+    People walk from S0 to S1, then ride a bus from S1 to S3.
+    """
+
+    env = SimulationContext(seed=2)
+    stops = [Station(env, str(i), f"S{i}", (i, i), 1, 0) for i in range(4)]
+    for station in stops:
+        env.station_names[station.name] = station
+    trips = [
+        Trip([(s.name, 5 + k * 6 + j * 4) for j, s in enumerate(stops)])
+        for k in range(10)
+    ]
+    route = BusRoute(env, 0, "R1", "R1", stops, trips, transporter_spawn_max=10)
+    walk = Walk(env, 0, "Walk_0", [stops[0], stops[1]], 0, [])
+    env.itineraries.append(Itinerary(env, 0, [(walk, stops[1]), (route, stops[-1])]))
+    env.station_itinerary_lookup[stops[0]] = [0]
+    Suburb(env, "X", {stops[0]: 100}, stops, 200, 10, 2, True, 0)
+    env.run(90)
+    return env, stops, route, walk
+
+
+def test_properties():
+    """Whole minutes come back as ints, and counts are always ints"""
+
+    env, stops, route, walk = walk_network()
+
+    for station in stops:
+        for time, count in station.people_over_time.items():
+            assert type(time) is int or not float(time).is_integer()
+            assert type(count) is int
+
+    bus = route.transporters[0]
+    assert all(type(count) is int for count in bus.passenger_changes.values())
+    assert bus.passenger_changes[5] == 0  # Logged when the bus spawns
+    assert list(bus.time_log) == ["S0 (0)", "S1 (1)", "S2 (2)", "S3 (3)"]
+    assert all(type(time) is int for time in bus.time_log.values())
+
+    walks = walk.walk_time_log
+    assert list(walks) == list(range(len(walks)))
+    for start, end in walks.values():
+        assert start % 1 == 0.5  # People wait half a minute before setting off
+        assert end is None or end > start
+
+
+def test_loaded_records_match_the_run(tmp_path):
+    env, stops, route, walk = walk_network()
+    path = tmp_path / "sim_1.npz"
+    env.recorder.save(path)
+
+    loaded = Recorder.load(path)
+    for station in stops:
+        assert (
+            loaded.timeline(STATION_PEOPLE, station.entity) == station.people_over_time
+        )
+    starts, keys = loaded.series(WALK_START, walk.entity)
+    assert keys.tolist() == list(walk.walk_time_log)
@@ -0,0 +1,91 @@
+from math import sqrt
+import pytest
+from backend.replications import (
+    confidence_interval,
+    merge_replications,
+    summarise_output,
+    t_quantile,
+)
+from db.views import sim_request
+from rest_framework.test import APIRequestFactory
+
+
+def summary(percentage_arrived: float, stations: dict) -> dict:
+    return {"percentage_arrived": percentage_arrived, "stations": stations}
+
+
+def test_merge_replications():
+    """Replications are merged per station, skipping N/A waits"""
+
+    output = merge_replications(
+        [
+            summary(
+                0.5, {"0": ("first stop", 4.0, True), "1": ("last stop", None, False)}
+            ),
+            summary(
+                0.7, {"0": ("first stop", 6.0, False), "1": ("last stop", 2.0, False)}
+            ),
+            summary(
+                0.6, {"0": ("first stop", 5.0, True), "1": ("last stop", None, False)}
+            ),
+        ]
+    )
+
+    first = output["Stations"]["0"]
+    assert first["stationName"] == "first stop"
+    assert first["avg_wait"]["mean"] == pytest.approx(5.0)
+    assert first["avg_wait"]["n"] == 3
+    assert first["bottleneck_rate"] == pytest.approx(2 / 3)
+    assert output["Stations"]["1"]["avg_wait"] == {
+        "mean": 2.0,
+        "ci_low": 2.0,
+        "ci_high": 2.0,
+        "n": 1,
+    }
+    assert output["Bottlenecks"] == ["0"]
+    assert output["PercentageArrived"]["mean"] == pytest.approx(0.6)
+
+
+def test_merge_replications_station_with_no_waits():
+    output = merge_replications([summary(1.0, {"0": ("stop", None, False)})] * 2)
+    assert output["Stations"]["0"]["avg_wait"] == "N/A"
+    assert output["Bottlenecks"] == []
+
+
+def test_confidence_interval_uses_students_t():
+    """Three replications use t with 2 degrees of freedom rather than the normal 1.96"""
+
+    interval = confidence_interval([4.0, 5.0, 6.0])
+    half_width = 4.303 * 1.0 / sqrt(3)
+    assert interval["ci_low"] == pytest.approx(5.0 - half_width)
+    assert interval["ci_high"] == pytest.approx(5.0 + half_width)
+    assert confidence_interval([]) == "N/A"
+
+
+def test_t_quantile():
+    assert t_quantile(1) == 12.706
+    assert t_quantile(30) == 2.042
+    assert t_quantile(60) == pytest.approx(2.000, abs=1e-3)
+    assert t_quantile(120) == pytest.approx(1.980, abs=1e-3)
+    assert t_quantile(10**6) == pytest.approx(1.960, abs=1e-3)
+
+
+def test_summarise_output():
+    output = {
+        "PercentageArrived": 0.25,
+        "Stations": {
+            "0": {"stationName": "stop", "avg_wait": "N/A", "bottleneck": False},
+            "1": {"stationName": "other", "avg_wait": 3.5, "bottleneck": True},
+        },
+    }
+    assert summarise_output(output) == summary(
+        0.25, {"0": ("stop", None, False), "1": ("other", 3.5, True)}
+    )
+
+
+@pytest.mark.parametrize("replications", ["abc", None, 0, -2])
+def test_bad_replications_rejected(replications):
+    request = APIRequestFactory().post(
+        "/", {"replications": replications}, format="json"
+    )
+    assert sim_request(request, sim_id=1).status_code == 400
@@ -0,0 +1,101 @@
+from backend.sim import BusRoute, SimulationContext, Station, TrainRoute, Trip
+
+
+def stations(env: SimulationContext, env_start: int, num_stops: int) -> list[Station]:
+    stops = [
+        Station(env, str(i), f"S{i}", (i, i), 1, env_start) for i in range(num_stops)
+    ]
+    for station in stops:
+        env.station_names[station.name] = station
+    return stops
+
+
+def bus_route(env_start: int, spawn_max: int) -> tuple[SimulationContext, BusRoute]:
+    """
+    An empty bus route through four stops 4 minutes apart, with a trip every 6 minutes from
+    minute 0. Nobody travels on it, so buses keep exactly to their timetable.
+    """
+
+    env = SimulationContext(seed=1)
+    stops = stations(env, env_start, 4)
+    trips = [
+        Trip([(s.name, k * 6 + j * 4) for j, s in enumerate(stops)]) for k in range(10)
+    ]
+    route = BusRoute(
+        env, env_start, "R1", "R1", stops, trips, transporter_spawn_max=spawn_max
+    )
+    return env, route
+
+
+def test_spawn_schedule():
+    """Each trip spawns at its first stop at or after env_start, in order of spawn time"""
+
+    env, route = bus_route(20, 10)
+    assert [(time, index) for time, _, index in route.spawn_schedule] == [
+        (20, 2),  # Trip 2 is at its third stop when the simulation starts
+        (22, 1),
+        (24, 0),
+        (30, 0),
+        (36, 0),
+        (42, 0),
+        (48, 0),
+        (54, 0),
+    ]
+    assert route.spawn_schedule[0][1] is route.trip_timing_data[2]
+
+
+def test_one_bus_per_trip():
+    env, route = bus_route(20, 10)
+    env.run(100)
+
+    assert route.transporters_spawned == 8
+    assert not route.running.is_alive  # The spawner finished with the schedule
+    for bus, (spawn_time, trip, index) in zip(route.transporters, route.spawn_schedule):
+        assert bus.trip is trip
+        assert min(bus.passenger_changes) == spawn_time
+        assert bus.time_log == {
+            bus.stop_label(stop): time
+            for stop, time in zip(trip.stations[index:], trip.arrival_times[index:])
+        }
+
+
+def test_spawn_max():
+    env, route = bus_route(20, 3)
+    env.run(100)
+
+    assert route.transporters_spawned == 3
+    assert [bus.trip for bus in route.transporters] == [
+        trip for _, trip, _ in route.spawn_schedule[:3]
+    ]
+    assert not route.running.is_alive
+
+
+def test_trip_compile():
+    """Zero and negative legs are clamped to a minute, and revisits keep the first index"""
+
+    env = SimulationContext(seed=1)
+    a, b, c = stations(env, 0, 3)
+    route_only = Station(env, "9", "S9", (9, 9), 1, 0)  # Only known to the route
+    trip = Trip([("S0", 10), ("S1", 10), ("S2", 8), ("S0", 15), ("S9", 18)])
+    trip.compile([a, route_only], env.station_names)
+
+    assert trip.stations == (a, b, c, a, route_only)
+    assert trip.arrival_times == (10, 10, 8, 15, 18)
+    assert trip.leg_durations == (1, 1, 1, 7, 3)
+    assert trip.stop_index == {a: 0, b: 1, c: 2, route_only: 4}
+    assert trip.leg_duration_to(a) == 1
+    assert trip.leg_duration_to(route_only) == 3
+    assert trip.leg_duration_to(Station(env, "8", "S8", (8, 8), 1, 0)) == 1
+
+
+def test_trains_travel_scheduled_legs():
+    """Trains take each leg's scheduled time, clamped to a minute, rather than always a minute"""
+
+    env = SimulationContext(seed=1)
+    stops = stations(env, 0, 4)
+    trip = Trip([("S0", 2), ("S1", 7), ("S2", 7), ("S3", 15)])
+    route = TrainRoute(env, 0, "T1", "T1", stops, [trip])
+    env.run(60)
+
+    (train,) = route.transporters
+    assert train.time_log == {"S1": 7, "S2": 8, "S3": 16}
@@ -0,0 +1,76 @@
+from backend.sampling import Sampler
+from backend.sim import (
+    BusRoute,
+    Itinerary,
+    SimulationContext,
+    Station,
+    Suburb,
+    Trip,
+)
+
+
+def draws(sampler: Sampler, n: int = 10000) -> list:
+    output = []
+    for _ in range(n):
+        output.append(sampler.uniform())
+        output.append(sampler.randint(0, 9))
+        output.append(sampler.choice(["a", "b", "c"]))
+        output.append(sampler.truncated_gumbel(5, 2, 0, 10))
+    return output
+
+
+def test_same_seed_same_draws():
+    """Two samplers with the same seed give the same draws, across block boundaries"""
+
+    assert draws(Sampler(7)) == draws(Sampler(7))
+    assert draws(Sampler(7)) != draws(Sampler(8))
+
+
+def test_block_size_does_not_change_draws():
+    """Uniforms come out in the generator's order whatever the block size"""
+
+    assert [Sampler(3, block_size=5).uniform() for _ in range(50)] == [
+        Sampler(3).uniform() for _ in range(50)
+    ]
+
+
+def test_unseeded_sampler_reports_its_seed():
+    """A sampler without a seed picks one, and that seed reproduces it"""
+
+    sampler = Sampler()
+    assert draws(Sampler(sampler.seed), 100) == draws(sampler, 100)
+
+
+def test_ranges():
+    """Samples stay inside the ranges asked for"""
+
+    sampler = Sampler(1)
+    for _ in range(10000):
+        assert 0 <= sampler.uniform() < 1
+        assert 2 <= sampler.randint(2, 4) <= 4
+        assert 1 <= sampler.truncated_gumbel(0, 3, 1, 2) <= 2
+    assert sampler.truncated_gumbel(5, 0, 0, 3) == 3
+
+
+def run_network(seed: int) -> dict:
+    env = SimulationContext(seed=seed)
+    stops = [Station(env, str(i), f"S{i}", (i, i), 1, 0) for i in range(4)]
+    for station in stops:
+        env.station_names[station.name] = station
+    trips = [
+        Trip([(s.name, 5 + k * 6 + j * 4) for j, s in enumerate(stops)])
+        for k in range(10)
+    ]
+    route = BusRoute(env, 0, "R1", "R1", stops, trips, transporter_spawn_max=10)
+    env.itineraries.append(Itinerary(env, 0, [(route, stops[-1])]))
+    env.station_itinerary_lookup[stops[0]] = [0]
+    env.station_itinerary_lookup[stops[1]] = [0]
+    Suburb(env, "X", {stops[0]: 50, stops[1]: 50}, stops, 500, 10, 2, True, 0)
+    env.run(120)
+    return {station.name: station.people_over_time for station in stops}
+
+
+def test_seeded_run_is_reproducible():
+    """A simulation run twice with the same seed produces the same output"""
+
+    assert run_network(11) == run_network(11)
@@ -0,0 +1,63 @@
+import pytest
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from backend.sim import list_saved_sim_outputs
+from db.models import SimulationOutput
+from db.views import get_sim_data, list_saved_sims
+from rest_framework.test import APIRequestFactory
+
+
+@pytest.fixture
+def saved(rollback):
+    """
+    Replaces the saved simulations with ids 1 to 7, of which 4 was saved without an output.
+    """
+
+    SimulationOutput.objects.all().delete()
+    for sim_id in range(1, 8):
+        output = None if sim_id == 4 else {"Simulation_id": sim_id}
+        SimulationOutput.objects.create(simulation_id=sim_id, output=output)
+
+
+def test_pages(saved):
+    """Every simulation with an output is listed once, in order, a page at a time"""
+
+    pages = []
+    after = None
+    while True:
+        with CaptureQueriesContext(connection) as queries:
+            page, after = list_saved_sim_outputs(after, 2)
+        assert len(queries) == 1
+        pages.append([row["sim_id"] for row in page])
+        if after is None:
+            break
+
+    assert pages == [[1, 2], [3, 5], [6, 7]]
+
+
+def test_last_page_is_full(saved):
+    page, after = list_saved_sim_outputs(5, 2)
+    assert [row["sim_id"] for row in page] == [6, 7]
+    assert after is None
+    assert list_saved_sim_outputs(7, 2) == ([], None)
+
+
+def test_list_saved_sims_view(saved):
+    factory = APIRequestFactory()
+    response = list_saved_sims(factory.get("/", {"after": 2, "limit": 3}))
+    assert [row["sim_id"] for row in response.data["results"]] == [3, 5, 6]
+    assert response.data["next"] == 6
+
+    for params in [{"after": "x"}, {"limit": "0"}, {"limit": "many"}]:
+        assert list_saved_sims(factory.get("/", params)).status_code == 400
+
+
+def test_get_sim_data_view(saved):
+    factory = APIRequestFactory()
+    response = get_sim_data(factory.get("/", {"sim_id": 3}))
+    assert response.data == {"Simulation_id": 3}
+
+    assert get_sim_data(factory.get("/", {"sim_id": 4})).status_code == 404
+    assert get_sim_data(factory.get("/", {"sim_id": 99})).status_code == 404
+    assert get_sim_data(factory.get("/", {"sim_id": "x"})).status_code == 400
+    assert get_sim_data(factory.get("/")).status_code == 400
@@ -5,7 +5,6 @@ from sim import (
     Walk,
     Itinerary,
     Suburb,
-    ITINERARIES,
     run_simulation,
 )
 from simpy import Environment
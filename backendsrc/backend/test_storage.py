@@ -0,0 +1,91 @@
+import json
+import pytest
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from backend.recorder import ARRIVAL, PASSENGERS, STATION_PEOPLE, WALK_END, WALK_START
+from backend.sim import load_sim_data_into_db, load_sim_output, run_simulation
+from backend.storage import merge_series, split_series
+from db.models import SimSeries, SimulationOutput
+from rest_framework.utils.encoders import JSONEncoder
+
+
+@pytest.fixture(params=["agent", "fast"])
+def output(request, network):
+    SimulationOutput.objects.filter(simulation_id=1).delete()
+    return run_simulation(dict(network, engine=request.param), 1, save=False)
+
+
+def storage_queries(queries) -> int:
+    """
+    Counts the queries on the output tables, leaving out the savepoints of the transaction.
+    """
+
+    return sum(
+        "simseries" in query["sql"] or "simulationoutput" in query["sql"]
+        for query in queries.captured_queries
+    )
+
+
+def as_json(output: dict) -> dict:
+    """
+    Returns the output as the frontend gets it, with the stops of each itinerary's routes
+    sorted as they are sent in no particular order.
+    """
+
+    output = json.loads(json.dumps(output, cls=JSONEncoder))
+    for itinerary in output.get("Itineraries", {}).values():
+        for route_id, stops in itinerary["Routes"].items():
+            itinerary["Routes"][route_id] = sorted(stops)
+    return output
+
+
+def test_split_and_merge(output):
+    """Merging the series back into the rest of the output gives the original output"""
+
+    skeleton, series = split_series(output)
+    assert skeleton["Stations"]["0"]["PeopleChangesOverTime"] is None
+    assert skeleton["Routes"]["0"]["BusesOnRoute"][0]["Timeout"] is None
+    assert output["Stations"]["0"]["PeopleChangesOverTime"] is not None
+    assert {(entity_id, kind) for entity_id, kind, _ in series} >= {
+        ("0", STATION_PEOPLE),
+        ("0:0", PASSENGERS),
+        ("0:0", ARRIVAL),
+        ("Walk_0", WALK_START),
+        ("Walk_0", WALK_END),
+    }
+
+    rows = [
+        SimSeries(entity_id=entity_id, kind=kind, **arrays)
+        for entity_id, kind, arrays in series
+    ]
+    assert merge_series(skeleton, rows) == output
+    assert list(skeleton) == list(output)
+
+
+def test_save_and_load(output):
+    with CaptureQueriesContext(connection) as queries:
+        load_sim_data_into_db(1, output)
+    assert storage_queries(queries) == 4
+
+    with CaptureQueriesContext(connection) as queries:
+        loaded = load_sim_output(1)
+    assert storage_queries(queries) == 2
+    assert as_json(loaded) == as_json(output)
+
+
+def test_saving_twice_keeps_the_first_output(output):
+    load_sim_data_into_db(1, output)
+    count = SimSeries.objects.filter(sim_id=1).count()
+
+    load_sim_data_into_db(1, {**output, "PercentageArrived": -1})
+    assert SimSeries.objects.filter(sim_id=1).count() == count
+    assert as_json(load_sim_output(1)) == as_json(output)
+
+
+def test_output_without_series(rollback):
+    SimulationOutput.objects.filter(simulation_id=1).delete()
+    SimulationOutput.objects.create(
+        simulation_id=1, output={"Stations": {"0": {"stationName": "first stop"}}}
+    )
+    assert load_sim_output(1) == {"Stations": {"0": {"stationName": "first stop"}}}
+    assert load_sim_output(2) is None
@@ -0,0 +1,97 @@
+import json
+import pytest
+import backend.streaming
+from backend.sim import run_simulation
+from backend.streaming import stream_simulation
+from db.views import sim_request
+from rest_framework.test import APIRequestFactory
+from rest_framework.utils.encoders import JSONEncoder
+
+
+class FakeWriter:
+    def __init__(self) -> None:
+        self.submitted = []
+
+    def submit(self, sim_id: int, output: dict) -> str:
+        self.submitted.append((sim_id, output))
+        return "pending"
+
+
+@pytest.fixture
+def writer(monkeypatch):
+    writer = FakeWriter()
+    monkeypatch.setattr(backend.streaming, "WRITER", writer)
+    return writer
+
+
+def join(messages: list[dict]) -> dict:
+    """
+    Puts the streamed sections back together into a simulation output.
+    """
+
+    started = messages[0]
+    output = {"Simulation_id": started["Simulation_id"]}
+    for message in messages:
+        if message["type"] != "section":
+            continue
+        if message["name"] == "Summary":
+            output.update(message["data"])
+        else:
+            output[message["name"]] = message["data"]
+    output["Seed"] = started["Seed"]
+    return output
+
+
+@pytest.mark.parametrize("engine", ["agent", "fast"])
+def test_streamed_sections_match_run_simulation(network, writer, engine):
+    request = dict(network, engine=engine)
+    messages = list(stream_simulation(request, 1, save=False, interval=25))
+
+    types = [message["type"] for message in messages]
+    sections = [message["name"] for message in messages if message["type"] == "section"]
+    assert types[0] == "started"
+    assert types[-1] == "done"
+    assert sections == ["Routes", "Stations", "Itineraries", "Summary"]
+    assert join(messages) == run_simulation(request, 1, save=False)
+    assert writer.submitted == []
+
+
+def test_progress_slices(network, writer):
+    messages = list(stream_simulation(network, 1, save=False, interval=25))
+    progress = [message for message in messages if message["type"] == "progress"]
+
+    assert [message["time"] for message in progress] == [25, 50, 60]
+    assert [message["progress"] for message in progress] == [25 / 60, 50 / 60, 1.0]
+    stations = join(messages)["Stations"]
+    assert progress[-1]["Stations"].keys() == stations.keys()
+
+
+def test_saved_output_matches_run_simulation(network, writer):
+    list(stream_simulation(network, 1))
+    ((sim_id, output),) = writer.submitted
+    assert sim_id == 1
+    assert output == run_simulation(network, 1, save=False)
+
+
+def test_error_is_the_last_message(network, writer):
+    request = dict(network, snapshot_date="not a date")
+    messages = list(stream_simulation(request, 1))
+
+    assert [message["type"] for message in messages] == ["started", "error"]
+    assert messages[-1]["error"]
+    assert writer.submitted == []
+
+
+def test_streamed_response_is_ndjson(network, writer):
+    request = APIRequestFactory().post("/", dict(network, stream=True), format="json")
+    response = sim_request(request, sim_id=1)
+
+    assert response.status_code == 201
+    assert response["Content-Type"] == "application/x-ndjson"
+    body = b"".join(response.streaming_content).decode()
+    assert body.endswith("\n")
+    messages = [json.loads(line) for line in body.splitlines()]
+
+    expected = run_simulation(network, 1, save=False)
+    assert join(messages) == json.loads(json.dumps(expected, cls=JSONEncoder))
+    assert len(writer.submitted) == 1
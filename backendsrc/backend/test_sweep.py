@@ -0,0 +1,37 @@
+import pytest
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from backend.sim import load_network, run_simulation
+from backend.sweep import run_sweep
+
+
+def test_simulation_from_snapshot_makes_no_queries(network):
+    """Once the network has been loaded, running a variant doesn't touch the database"""
+
+    snapshot = load_network(network["snapshot_date"], network["itineraries"])
+    assert snapshot.shapes == {"0": [(0.0, 0.0), (4.0, 4.0)]}
+
+    with CaptureQueriesContext(connection) as queries:
+        output = run_simulation(network, 1, save=False, network=snapshot)
+
+    assert len(queries) == 0
+    assert output["Routes"]["0"]["shape"] == [
+        {"sequence": 0, "lat": 0.0, "long": 0.0},
+        {"sequence": 1, "lat": 4.0, "long": 4.0},
+    ]
+
+
+def test_snapshot_gives_the_same_output(network):
+    snapshot = load_network(network["snapshot_date"], network["itineraries"])
+    assert run_simulation(network, 1, save=False) == run_simulation(
+        network, 1, save=False, network=snapshot
+    )
+
+
+@pytest.mark.parametrize(
+    "grid",
+    [{"time_horizon": []}, {"seed": [1, 2]}, {"env_start": [0], "active_stations": []}],
+)
+def test_bad_grid(grid):
+    with pytest.raises(ValueError):
+        run_sweep({}, 1, grid)
@@ -0,0 +1,73 @@
+from io import StringIO
+import backend.trace
+from backend.sim import (
+    BusRoute,
+    Itinerary,
+    SimulationContext,
+    Station,
+    Suburb,
+    Trip,
+)
+from backend.trace import TRACE_EVENTS, TRACE_OFF, TRACE_VERBOSE, Tracer
+
+
+VERBOSE_KINDS = {"no_passengers", "no_seats", "no_deload"}
+
+
+def trace_network(level: int) -> list[tuple]:
+    env = SimulationContext(seed=3)
+    env.trace = Tracer(level)
+    stops = [Station(env, str(i), f"S{i}", (i, i), 1, 0) for i in range(4)]
+    for station in stops:
+        env.station_names[station.name] = station
+    trips = [
+        Trip([(s.name, 5 + k * 6 + j * 4) for j, s in enumerate(stops)])
+        for k in range(10)
+    ]
+    route = BusRoute(env, 0, "R1", "R1", stops, trips, transporter_spawn_max=10)
+    env.itineraries.append(Itinerary(env, 0, [(route, stops[-1])]))
+    env.station_itinerary_lookup[stops[0]] = [0]
+    Suburb(env, "X", {stops[0]: 100}, stops, 200, 10, 2, True, 0)
+    env.run(120)
+    return env.trace.records()
+
+
+def test_levels_filter_events():
+    """Tracing off records nothing, and stops where nothing happened need TRACE_VERBOSE"""
+
+    assert trace_network(TRACE_OFF) == []
+
+    events = trace_network(TRACE_EVENTS)
+    verbose = trace_network(TRACE_VERBOSE)
+    assert events
+    assert not {record[1] for record in events} & VERBOSE_KINDS
+    assert {record[1] for record in verbose} & VERBOSE_KINDS
+    assert [r for r in verbose if r[1] not in VERBOSE_KINDS] == events
+
+
+def test_buffer_wraps():
+    """Only the newest 'size' records are kept, oldest first"""
+
+    tracer = Tracer(TRACE_EVENTS, size=3)
+    for time in range(5):
+        tracer.record(time, "arrived", "Bus", time, "S0")
+
+    assert [record[0] for record in tracer.records()] == [2, 3, 4]
+    out = StringIO()
+    tracer.dump(out)
+    assert out.getvalue().splitlines() == [
+        "(2): Bus 2 arrived at S0",
+        "(3): Bus 3 arrived at S0",
+        "(4): Bus 4 arrived at S0",
+    ]
+
+
+def test_save(tmp_path, monkeypatch):
+    """A run's trace is written to TRACE_DIR when it is set"""
+
+    monkeypatch.setattr(backend.trace, "TRACE_DIR", str(tmp_path))
+    tracer = Tracer(TRACE_EVENTS)
+    tracer.record(1, "despawned", "Bus", 0)
+    tracer.save(7)
+
+    assert (tmp_path / "sim_7.log").read_text() == "(1): Bus 0 ended its journey.\n"
@@ -0,0 +1,148 @@
+from threading import Event
+from time import sleep, time
+import pytest
+import backend.writer
+from backend.writer import FAILED, PENDING, SPILLED, STORED, OutputWriter
+from db.models import SimulationOutput
+
+
+class FakeSave:
+    """
+    Stands in for load_sim_data_into_db. Fails the first 'failures' attempts at each output, and
+    waits for 'release' to be set before saving anything.
+    """
+
+    def __init__(self, failures: int = 0) -> None:
+        self.failures = failures
+        self.attempts: dict[int, int] = {}
+        self.saved: list[int] = []
+        self.started = Event()
+        self.release = Event()
+        self.release.set()
+
+    def __call__(self, sim_id: int, output: dict) -> None:
+        self.started.set()
+        self.release.wait(10)
+        self.attempts[sim_id] = self.attempts.get(sim_id, 0) + 1
+        if self.attempts[sim_id] <= self.failures:
+            raise RuntimeError("database is locked")
+        assert output == {"Simulation_id": sim_id}
+        self.saved.append(sim_id)
+
+
+@pytest.fixture
+def save(monkeypatch):
+    save = FakeSave()
+    monkeypatch.setattr(backend.writer, "load_sim_data_into_db", save)
+    monkeypatch.setattr(backend.writer, "WRITE_RETRY_DELAY", 0.01)
+    return save
+
+
+@pytest.fixture
+def writers(tmp_path):
+    """
+    Makes writers spilling to a temporary directory, and stops them after the test.
+    """
+
+    made = []
+
+    def make(max_queued: int = 16) -> OutputWriter:
+        writer = OutputWriter(tmp_path, max_queued)
+        made.append(writer)
+        return writer
+
+    yield make
+    for writer in made:
+        writer.shutdown(timeout=1)
+
+
+def wait_until(condition, timeout: float = 10) -> None:
+    end = time() + timeout
+    while not condition() and time() < end:
+        sleep(0.02)
+    assert condition()
+
+
+def output(sim_id: int) -> dict:
+    return {"Simulation_id": sim_id}
+
+
+def test_outputs_are_saved_in_the_background(save, writers):
+    save.release.clear()
+    writer = writers()
+    assert writer.submit(1, output(1)) == PENDING
+    assert writer.status(1) == PENDING
+
+    save.release.set()
+    wait_until(lambda: save.saved == [1] and not writer.statuses)
+
+
+def test_stored_status_comes_from_the_database(save, writers, rollback):
+    writer = writers()
+    writer.submit(1, output(1))
+    wait_until(lambda: not writer.statuses)
+
+    SimulationOutput.objects.filter(simulation_id__in=[1, 2]).delete()
+    assert writer.status(1) is None
+    SimulationOutput.objects.create(simulation_id=1)
+    assert writer.status(1) == STORED
+
+
+def test_spill_when_full(save, writers, tmp_path):
+    """Outputs which don't fit in the queue are spilled, then saved once it has emptied"""
+
+    save.release.clear()
+    writer = writers(max_queued=1)
+    writer.submit(1, output(1))
+    assert save.started.wait(10)  # 1 is being saved, so the queue is empty
+
+    statuses = [writer.submit(sim_id, output(sim_id)) for sim_id in (2, 3, 4)]
+    assert statuses == [PENDING, SPILLED, SPILLED]
+    assert sorted(path.name for path in tmp_path.iterdir()) == [
+        "sim_3.pkl",
+        "sim_4.pkl",
+    ]
+
+    save.release.set()
+    wait_until(lambda: save.saved == [1, 2, 3, 4])
+    wait_until(lambda: not list(tmp_path.iterdir()))
+
+
+def test_failed_saves_are_retried(save, writers):
+    save.failures = 2
+    writer = writers()
+    writer.submit(1, output(1))
+    wait_until(lambda: save.saved == [1])
+    assert save.attempts[1] == 3
+
+
+def test_failed_output_is_saved_after_restart(save, writers, tmp_path):
+    save.failures = backend.writer.WRITE_RETRIES
+    writer = writers()
+    writer.submit(1, output(1))
+    wait_until(lambda: writer.status(1) == FAILED)
+    assert save.attempts[1] == backend.writer.WRITE_RETRIES
+    assert (tmp_path / "sim_1.pkl").exists()
+    writer.shutdown(timeout=1)
+
+    restarted = writers()
+    assert restarted.status(1) == SPILLED
+    restarted.start()
+    wait_until(lambda: save.saved == [1])
+    wait_until(lambda: not (tmp_path / "sim_1.pkl").exists())
+
+
+def test_shutdown_spills_the_queue(save, writers, tmp_path):
+    save.release.clear()
+    writer = writers()
+    for sim_id in (1, 2, 3):
+        writer.submit(sim_id, output(sim_id))
+    assert save.started.wait(10)
+
+    writer.shutdown(timeout=0.2)
+    assert [writer.status(sim_id) for sim_id in (2, 3)] == [SPILLED, SPILLED]
+    assert sorted(path.name for path in tmp_path.iterdir()) == [
+        "sim_2.pkl",
+        "sim_3.pkl",
+    ]
+    save.release.set()
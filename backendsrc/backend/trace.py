@@ -0,0 +1,76 @@
+from __future__ import annotations
+from collections import deque
+from typing import TextIO
+import os
+import sys
+
+
+TRACE_OFF = 0
+TRACE_EVENTS = 1  # Stop arrivals, loads, drop offs, walks and arrivals from suburbs
+TRACE_VERBOSE = 2  # Also records stops where nothing happened
+
+TRACE_BUFFER_SIZE = 100000  # Number of records kept before the oldest are overwritten
+
+# If set, each traced run's buffer is written to this directory as sim_<id>.log when the run
+# ends, instead of being printed
+TRACE_DIR = os.environ.get("SIM_TRACE_DIR")
+
+# Formats used to turn a record back into a readable line when the buffer is dumped.
+TRACE_FORMATS = {
+    "no_passengers": "No passengers at stop {0}",
+    "no_seats": "No seats left on {0} {1}",
+    "loaded": "{0} {1} loaded {2} people from {3} ({4})",
+    "no_deload": "No passengers got off {0}: {1}",
+    "deloaded": "{0} {1} has dropped off {2} people at {3} ({4})",
+    "arrived": "{0} {1} arrived at {2}",
+    "travelled": "{0} {1} travelled from {2} to {3} ({4} mins)",
+    "despawned": "{0} {1} ended its journey.",
+    "walked": "{0} people walked from {1} to {2} ({3} mins)",
+    "distributed": "{0} people arrived at {1} in {2}",
+}
+
+
+class Tracer:
+    """
+    Leveled trace facility for the simulation. Call sites check 'level' before recording, so
+    when tracing is off the only cost is that comparison. When on, each event is stored as a
+    compact tuple (time, kind, *fields) in a fixed size ring buffer; nothing is formatted or
+    printed until the buffer is dumped.
+    """
+
+    def __init__(self, level: int = TRACE_OFF, size: int = TRACE_BUFFER_SIZE) -> None:
+        self.level = level
+        self.buffer = deque(maxlen=size)
+
+    def record(self, time: float, kind: str, *fields) -> None:
+        self.buffer.append((time, kind) + fields)
+
+    def records(self) -> list[tuple]:
+        return list(self.buffer)
+
+    def clear(self) -> None:
+        self.buffer.clear()
+
+    def dump(self, out: TextIO = sys.stdout) -> None:
+        """
+        Writes the buffered records to 'out' as readable lines, oldest first.
+        """
+
+        for time, kind, *fields in self.buffer:
+            out.write(f"({time}): {TRACE_FORMATS[kind].format(*fields)}\n")
+
+    def save(self, sim_id: int) -> None:
+        """
+        Dumps the buffer at the end of a traced run, to sim_<sim_id>.log in TRACE_DIR if it is
+        set, otherwise to stdout.
+        """
+
+        if not TRACE_DIR:
+            self.dump()
+            return
+
+        with open(os.path.join(TRACE_DIR, f"sim_{sim_id}.log"), "w") as f:
+            self.dump(f)
+
+
+TRACE = Tracer(int(os.environ.get("SIM_TRACE", TRACE_OFF)))
@@ -0,0 +1,218 @@
+from __future__ import annotations
+from collections import deque
+from pathlib import Path
+from queue import Empty, Full, Queue
+from threading import Lock, Thread
+from time import sleep
+from uuid import uuid4
+import atexit
+import os
+import pickle
+from django.db import connections
+from db.models import SimulationOutput
+from .sim import load_sim_data_into_db
+
+
+# Outputs waiting in memory to be saved before new ones are spilled to disk instead
+WRITE_QUEUE_SIZE = int(os.environ.get("SIM_WRITE_QUEUE_SIZE", 16))
+WRITE_RETRIES = 5  # Attempts at saving an output before leaving it spilled
+WRITE_RETRY_DELAY = 0.5  # Seconds before the first retry, doubled after each one
+WRITE_SHUTDOWN_TIMEOUT = 30  # Seconds the writer gets to catch up on shutdown
+
+# Directory outputs are spilled to until they have been saved
+SPILL_DIR = Path(
+    os.environ.get(
+        "SIM_SPILL_DIR", Path(__file__).resolve().parent.parent / "sim_spill"
+    )
+)
+SPILL_SUFFIX = ".pkl"
+
+PENDING = "pending"
+SPILLED = "spilled"
+STORED = "stored"
+FAILED = "failed"
+
+
+class OutputWriter:
+    """
+    Saves simulation outputs to the database on a background thread, so a request can return
+    its output without waiting for the database writes. Outputs are handed to the thread through
+    a bounded queue. When the queue is full, because the database has fallen behind, outputs are
+    pickled to the spill directory instead and saved from there once the queue has emptied.
+
+    A failed save is retried WRITE_RETRIES times with a growing delay. An output which still
+    can't be saved is kept in the spill directory, as is anything left in the queue when the
+    server stops, and everything in the spill directory is saved again when the writer next
+    starts. 'status' tells whether a simulation's output has been durably stored yet.
+
+    Outputs mustn't be changed after they have been submitted, as the thread reads them
+    while they are waiting in the queue.
+    """
+
+    def __init__(
+        self, directory: Path = SPILL_DIR, max_queued: int = WRITE_QUEUE_SIZE
+    ) -> None:
+        self.directory = Path(directory)
+        self.queue: Queue[tuple[int, dict] | None] = Queue(max_queued)
+        self.spilled: deque[int] = deque()  # Sim ids waiting in the spill directory
+        self.statuses: dict[int, str] = {}
+        self.lock = Lock()
+        self.thread = None
+
+    def submit(self, sim_id: int, output: dict) -> str:
+        """
+        Queues a simulation's output to be saved, and returns its status.
+        """
+
+        with self.lock:
+            self.start()
+            try:
+                self.queue.put_nowait((sim_id, output))
+                self.statuses[sim_id] = PENDING
+            except Full:
+                self.spill(sim_id, output)
+                self.spilled.append(sim_id)
+                self.statuses[sim_id] = SPILLED
+            return self.statuses[sim_id]
+
+    def status(self, sim_id: int) -> str | None:
+        """
+        Returns whether a simulation's output is waiting to be saved ("pending" in memory or
+        "spilled" to disk), has been stored in the database ("stored") or couldn't be saved
+        ("failed", it is kept on disk and tried again on the next restart). Returns None if the
+        simulation has never been submitted or saved.
+        """
+
+        # Only outputs which haven't been stored are tracked in memory
+        with self.lock:
+            status = self.statuses.get(sim_id)
+        if status is not None:
+            return status
+        if self.path(sim_id).exists():
+            return SPILLED
+        if SimulationOutput.objects.filter(simulation_id=sim_id).exists():
+            return STORED
+        return None
+
+    def path(self, sim_id: int) -> Path:
+        return self.directory / f"sim_{sim_id}{SPILL_SUFFIX}"
+
+    def spill(self, sim_id: int, output: dict) -> None:
+        self.directory.mkdir(parents=True, exist_ok=True)
+        # Written to a temporary file first so a half written output is never read back
+        temp = self.directory / f".sim_{sim_id}.{uuid4().hex}"
+        with open(temp, "wb") as f:
+            pickle.dump(output, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(temp, self.path(sim_id))
+
+    def start(self) -> None:
+        if self.thread is not None:
+            return
+
+        # Outputs spilled before the last shutdown are saved again
+        for path in sorted(self.directory.glob(f"sim_*{SPILL_SUFFIX}")):
+            sim_id = int(path.stem.removeprefix("sim_"))
+            if sim_id in self.spilled:
+                continue
+            self.spilled.append(sim_id)
+            self.statuses[sim_id] = SPILLED
+
+        self.thread = Thread(target=self.run, name="sim-output-writer", daemon=True)
+        self.thread.start()
+
+    def run(self) -> None:
+        while True:
+            try:
+                # Spilled outputs are saved straight away when nothing is queued
+                item = self.queue.get(block=not self.spilled, timeout=1)
+            except Empty:
+                item = self.unspill()
+                if item is None:
+                    continue
+            else:
+                if item is None:
+                    return
+
+            sim_id, output = item
+            stored = self.write(sim_id, output)
+            with self.lock:
+                if stored:
+                    # status finds stored outputs in the database, so they aren't kept here
+                    self.path(sim_id).unlink(missing_ok=True)
+                    self.statuses.pop(sim_id, None)
+                else:
+                    if not self.path(sim_id).exists():
+                        self.spill(sim_id, output)
+                    self.statuses[sim_id] = FAILED
+
+    def unspill(self) -> tuple[int, dict] | None:
+        """
+        Reads back the oldest spilled output, or returns None if nothing is spilled.
+        """
+
+        with self.lock:
+            if not self.spilled:
+                return None
+            sim_id = self.spilled.popleft()
+
+        try:
+            with open(self.path(sim_id), "rb") as f:
+                return sim_id, pickle.load(f)
+        except (OSError, pickle.UnpicklingError, EOFError) as e:
+            print(
+                f"Simulation #{sim_id} couldn't be read back from {self.path(sim_id)}: {e}"
+            )
+            with self.lock:
+                self.statuses[sim_id] = FAILED
+            return None
+
+    def write(self, sim_id: int, output: dict) -> bool:
+        delay = WRITE_RETRY_DELAY
+        for attempt in range(1, WRITE_RETRIES + 1):
+            try:
+                load_sim_data_into_db(sim_id, output)
+                print(f"Simulation #{sim_id} loaded into db.")
+                return True
+            except Exception as e:
+                print(
+                    f"Saving simulation #{sim_id} failed "
+                    f"(attempt {attempt} of {WRITE_RETRIES}): {e}"
+                )
+                # A broken connection is replaced by a new one on the next attempt
+                connections.close_all()
+                if attempt < WRITE_RETRIES:
+                    sleep(delay)
+                    delay *= 2
+        return False
+
+    def shutdown(self, timeout: float = WRITE_SHUTDOWN_TIMEOUT) -> None:
+        """
+        Gives the thread up to 'timeout' seconds to save what is queued, then spills whatever
+        is still left in the queue so it is saved after the next start.
+        """
+
+        with self.lock:
+            thread = self.thread
+            self.thread = None
+        if thread is None:
+            return
+
+        try:
+            self.queue.put(None, timeout=timeout)
+        except Full:
+            pass
+        thread.join(timeout)
+
+        with self.lock:
+            while True:
+                try:
+                    item = self.queue.get_nowait()
+                except Empty:
+                    break
+                if item is not None:
+                    self.spill(*item)
+                    self.statuses[item[0]] = SPILLED
+
+
+WRITER = OutputWriter()
+atexit.register(WRITER.shutdown)
@@ -0,0 +1,135 @@
+from __future__ import annotations
+from math import ceil
+import numpy as np
+from backend.sim import (
+    BusRoute,
+    Itinerary,
+    Route,
+    SimulationContext,
+    Station,
+    Suburb,
+    Trip,
+    Walk,
+)
+
+
+STOPS_PER_ROUTE = 10  # Stops on each route before it reaches the stadium
+HEADWAY = 5  # Minutes between trips on a route
+STATIONS_PER_SUBURB = 10
+WALK_EVERY = 3  # Every third itinerary starts with a walk to the stop
+
+
+def build_network(
+    env: SimulationContext,
+    env_start: int,
+    num_stations: int,
+    num_routes: int,
+    trips_per_route: int,
+    attendance: int,
+    num_itineraries: int,
+    seed: int = 0,
+) -> tuple[list[Station], list[Trip], list[Route], list[Itinerary], list[Suburb]]:
+    """
+    Builds a synthetic network directly out of sim objects, without the database, in the same
+    shape as get_data: 'num_stations' stations plus Suncorp Stadium, 'num_routes' bus routes
+    which each run through STOPS_PER_ROUTE random stations to the stadium with
+    'trips_per_route' trips, 'num_itineraries' itineraries boarding those routes (some of them
+    walking to the stop first), and suburbs which send 'attendance' people out between them.
+
+    The layout is drawn from its own generator seeded with 'seed', so the same arguments always
+    build the same network whatever the simulation's seed is.
+    """
+
+    rng = np.random.default_rng(seed)
+
+    stadium = Station(env, "-1", "Suncorp Stadium", (0.0, 0.0), 1, env_start)
+    stations = [
+        Station(env, str(i), f"Station {i}", tuple(rng.random(2)), 1, env_start)
+        for i in range(num_stations)
+    ]
+    for station in stations + [stadium]:
+        env.station_names[station.name] = station
+
+    all_trips = []
+    routes = []
+    stops_per_route = min(STOPS_PER_ROUTE, num_stations)
+    for r in range(num_routes):
+        stops = [
+            stations[i]
+            for i in rng.choice(num_stations, stops_per_route, replace=False)
+        ] + [stadium]
+        leg_times = np.cumsum(rng.integers(2, 6, len(stops)))
+        trips = [
+            Trip(
+                [
+                    (stop.name, env_start + k * HEADWAY + int(leg_time))
+                    for stop, leg_time in zip(stops, leg_times)
+                ]
+            )
+            for k in range(trips_per_route)
+        ]
+        all_trips += trips
+        routes.append(
+            BusRoute(
+                env,
+                env_start,
+                str(r),
+                f"R{r}",
+                stops,
+                trips,
+                transporter_spawn_max=trips_per_route,
+            )
+        )
+
+    walks = {}
+    itineraries = []
+    for i in range(num_itineraries):
+        route = routes[i % num_routes]
+        boards_at = route.stops[int(rng.integers(0, len(route.stops) - 1))]
+        legs = [(route, stadium)]
+        starts_at = boards_at
+        if i % WALK_EVERY == WALK_EVERY - 1:
+            starts_at = stations[int(rng.integers(0, num_stations))]
+            if starts_at != boards_at:
+                key = (starts_at, boards_at)
+                if key not in walks:
+                    walks[key] = Walk(
+                        env,
+                        env_start,
+                        f"Walk_{len(walks)}",
+                        [starts_at, boards_at],
+                        0,
+                        [],
+                    )
+                legs.insert(0, (walks[key], boards_at))
+
+        itinerary = Itinerary(env, i, legs)
+        env.station_itinerary_lookup.setdefault(starts_at, []).append(
+            len(env.itineraries)
+        )
+        env.itineraries.append(itinerary)
+        itineraries.append(itinerary)
+
+    starts = list(env.station_itinerary_lookup.keys())
+    num_suburbs = ceil(len(starts) / STATIONS_PER_SUBURB)
+    suburbs = []
+    for s in range(num_suburbs):
+        suburb_stations = starts[
+            s * STATIONS_PER_SUBURB : (s + 1) * STATIONS_PER_SUBURB
+        ]
+        suburbs.append(
+            Suburb(
+                env,
+                f"Suburb {s}",
+                {station: 100 / len(suburb_stations) for station in suburb_stations},
+                [station.id for station in suburb_stations],
+                ceil(attendance / num_suburbs),
+                10,
+                2,
+                True,
+                env_start,
+            )
+        )
+
+    routes = routes + list(walks.values())
+    return stations + [stadium], all_trips, routes, itineraries, suburbs
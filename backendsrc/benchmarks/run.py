@@ -0,0 +1,164 @@
+"""
+Benchmarks the simulation engines on synthetic networks, without the database.
+
+Every combination of the given scales is built with build_network and run in its own process
+(so each case's peak RSS is its own), and the results are printed as JSON, or written to the
+file given with --output, so runs can be compared. Progress goes to stderr. For example, from
+backendsrc:
+
+    python -m benchmarks.run --stations 50 200 --routes 5 20 --attendance 10000 100000
+"""
+
+from __future__ import annotations
+from argparse import ArgumentParser
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from itertools import product
+from time import perf_counter
+import json
+import platform
+import resource
+import sys
+from backend.sim import SimulationContext, average_wait_times
+from .network import build_network
+
+
+ENV_START = 0
+TIME_HORIZON = 180
+
+
+def run_case(case: dict) -> dict:
+    """
+    Builds and runs one benchmark case, returning its timings alongside the case. For the
+    SimPy engine, output_time is how long working out the average waits from the journey logs
+    takes, which is usually the most expensive part of processing the output.
+    """
+
+    env = SimulationContext(seed=case["seed"])
+    start = perf_counter()
+    stations, trips, routes, itineraries, suburbs = build_network(
+        env,
+        ENV_START,
+        case["stations"],
+        case["routes"],
+        case["trips"],
+        case["attendance"],
+        case["itineraries"],
+        case["seed"],
+    )
+    build_time = perf_counter() - start
+
+    events = 0
+    output_time = None
+    if case["engine"] == "fast":
+        from backend.fastsim import FastSimulation
+
+        start = perf_counter()
+        FastSimulation(
+            env, ENV_START, case["time_horizon"], stations, routes, suburbs
+        ).run()
+        wall_time = perf_counter() - start
+    else:
+        step = env.step
+
+        def counted_step() -> None:
+            nonlocal events
+            events += 1
+            step()
+
+        env.step = counted_step
+        start = perf_counter()
+        env.run(case["time_horizon"])
+        wall_time = perf_counter() - start
+
+        start = perf_counter()
+        average_wait_times(env, ENV_START + env.now)
+        output_time = perf_counter() - start
+
+    return {
+        **case,
+        "build_time": build_time,
+        "wall_time": wall_time,
+        "output_time": output_time,
+        "events": events,
+        "events_per_sec": events / wall_time if wall_time else None,
+        "peak_rss_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        "people": env.num_in_simulation,
+        "arrived": stations[-1].num_people(),
+    }
+
+
+def run_matrix(cases: list[dict]) -> list[dict]:
+    """
+    Runs each case in a fresh worker process, one at a time so cases don't compete for the CPU.
+    """
+
+    results = []
+    for case in cases:
+        with ProcessPoolExecutor(max_workers=1) as executor:
+            result = executor.submit(run_case, case).result()
+        print(
+            f"{case['engine']:<6} stations={case['stations']:<6} routes={case['routes']:<5} "
+            f"trips={case['trips']:<5} attendance={case['attendance']:<8} "
+            f"itineraries={case['itineraries']:<5} wall={result['wall_time']:.3f}s "
+            f"events={result['events']} rss={result['peak_rss_kb']}KB",
+            file=sys.stderr,
+        )
+        results.append(result)
+    return results
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--stations", type=int, nargs="+", default=[50])
+    parser.add_argument("--routes", type=int, nargs="+", default=[5])
+    parser.add_argument("--trips", type=int, nargs="+", default=[20])
+    parser.add_argument("--attendance", type=int, nargs="+", default=[10000, 100000])
+    parser.add_argument("--itineraries", type=int, nargs="+", default=[20])
+    parser.add_argument(
+        "--engine", nargs="+", default=["agent"], choices=["agent", "fast"]
+    )
+    parser.add_argument("--time-horizon", type=int, default=TIME_HORIZON)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="JSON file to write (default: stdout)")
+    args = parser.parse_args(argv)
+
+    cases = [
+        {
+            "engine": engine,
+            "stations": stations,
+            "routes": routes,
+            "trips": trips,
+            "attendance": attendance,
+            "itineraries": itineraries,
+            "time_horizon": args.time_horizon,
+            "seed": args.seed,
+        }
+        for engine, stations, routes, trips, attendance, itineraries in product(
+            args.engine,
+            args.stations,
+            args.routes,
+            args.trips,
+            args.attendance,
+            args.itineraries,
+        )
+    ]
+
+    output = {
+        "date": datetime.now().isoformat(timespec="seconds"),
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "cases": run_matrix(cases),
+    }
+    if args.output is None:
+        json.dump(output, sys.stdout, indent=2)
+        print()
+        return
+
+    with open(args.output, "w") as out:
+        json.dump(output, out, indent=2)
+    print(f"Results written to {args.output}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
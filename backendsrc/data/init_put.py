@@ -27,6 +27,7 @@ os.environ.setdefault("DJANGO_SETTINGS_MODULE", "backend.settings")
 django.setup()
 
 from db.models import *  # noqa: E402
+from backend.cache import RESULTS  # noqa: E402
 
 
 def parse_data(path: str, model: str) -> None:
@@ -136,6 +137,8 @@ def load_everything():
     parse_data("./gtfsdata/stop_times.txt", "Timetable")
     add_suburbs_to_stations("./gtfsdata/stop_id_postcode_suburb.csv")
     add_start_end_date_to_calendar()
+    # Cached simulation results were worked out from the old data
+    RESULTS.invalidate()
 
 
 if __name__ == "__main__":
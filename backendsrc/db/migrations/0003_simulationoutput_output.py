@@ -0,0 +1,25 @@
+# Generated by Django 4.2.4 on 2026-10-18 15:29
+
+from django.db import migrations, models
+import rest_framework.utils.encoders
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("db", "0002_alter_itinerarysim_unique_together"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="simulationoutput",
+            name="created",
+            field=models.DateTimeField(auto_now_add=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="simulationoutput",
+            name="output",
+            field=models.JSONField(
+                encoder=rest_framework.utils.encoders.JSONEncoder, null=True
+            ),
+        ),
+    ]
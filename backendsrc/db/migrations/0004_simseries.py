@@ -0,0 +1,47 @@
+# Generated by Django 4.2.4 on 2026-10-18 15:32
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("db", "0003_simulationoutput_output"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="SimSeries",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("entity_id", models.CharField(max_length=255)),
+                ("kind", models.PositiveSmallIntegerField()),
+                ("times", models.BinaryField()),
+                ("values", models.BinaryField()),
+                (
+                    "sim_id",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        to="db.simulationoutput",
+                    ),
+                ),
+            ],
+            options={
+                "indexes": [
+                    models.Index(
+                        fields=["sim_id", "entity_id"],
+                        name="db_simserie_sim_id__93a1c0_idx",
+                    )
+                ],
+                "unique_together": {("sim_id", "entity_id", "kind")},
+            },
+        ),
+    ]
@@ -1,5 +1,6 @@
 from django.db import models
 from datetime import datetime
+from rest_framework.utils.encoders import JSONEncoder
 
 
 class Calendar(models.Model):
@@ -93,6 +94,32 @@ class TravelTimes(models.Model):
 
 class SimulationOutput(models.Model):
     simulation_id = models.IntegerField(primary_key=True)
+    created = models.DateTimeField(auto_now_add=True, null=True)
+    # Output of the simulation as it was sent to the frontend
+    output = models.JSONField(encoder=JSONEncoder, null=True)
+
+
+class SimSeries(models.Model):
+    """
+    One time series of a simulation (e.g. the number of people at a station over time), stored
+    as packed little endian arrays of float64 times and int64 values.
+    """
+
+    sim_id = models.ForeignKey(SimulationOutput, on_delete=models.CASCADE)
+    entity_id = models.CharField(max_length=255)  # Station, transporter or walk
+    # One of the record kinds in backend/recorder.py
+    kind = models.PositiveSmallIntegerField()
+    times = models.BinaryField()
+    values = models.BinaryField()
+
+    class Meta:
+        unique_together = ("sim_id", "entity_id", "kind")
+        indexes = [models.Index(fields=["sim_id", "entity_id"])]
+
+
+# The per-point tables below held saved simulations before SimSeries. Nothing writes or reads
+# them any more, so simulations saved only in them can't be opened with get_sim_data; they are
+# kept so the data already in them isn't dropped.
 
 
 class TransporterTimeOut(models.Model):
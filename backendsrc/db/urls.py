@@ -3,6 +3,12 @@ from db import views
 
 urlpatterns = [
     path("run_simulation/<int:sim_id>/", views.sim_request),
+    path("save_status/<int:sim_id>/", views.save_status),
+    path("run_sweep/<int:sim_id>/", views.sweep_request),
+    path("submit_job/<int:sim_id>/", views.submit_job),
+    path("job_status/<str:job_id>/", views.job_status),
+    path("job_result/<str:job_id>/", views.job_result),
+    path("cancel_job/<str:job_id>/", views.cancel_job),
     path("station_suburbs", views.station_suburbs),
     path("itin_check/", views.itin_check),
     path("list_saved_sims/", views.list_saved_sims),
@@ -1,5 +1,5 @@
 from django.shortcuts import render
-from django.http import HttpResponse, JsonResponse
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
 from rest_framework.decorators import api_view
 from rest_framework.parsers import JSONParser
 from db.models import Station, SimulationOutput
@@ -7,11 +7,24 @@ from rest_framework.response import Response
 from db.serializers import SimulationOutputSerializer
 from rest_framework import status
 from rest_framework.request import Request
+from rest_framework.utils.encoders import JSONEncoder
 from rest_framework.response import Response
-from backend.sim import run_simulation, generate_itins
+from backend.sim import (
+    SAVED_SIMS_PAGE_SIZE,
+    generate_itins,
+    list_saved_sim_outputs,
+    load_sim_output,
+    run_simulation,
+)
+from backend.cache import RESULTS
+from backend.jobs import DONE, FAILED, JOBS
+from backend.replications import run_replications
+from backend.streaming import stream_simulation
+from backend.sweep import run_sweep
+from backend.writer import WRITER
 from backend.queries import get_station_suburbs
 from logging import warning
-from backend.sim import INPUT_ITINS
+import json
 
 
 @api_view(["POST"])
@@ -41,8 +54,26 @@ def sim_request(request: Request, sim_id: int) -> Response:
         "snapshot_date": str, (yyyy-mm-dd format)
         "active_suburbs": list[str], (suburb names)
         "active_stations": list[str], (station ids)
+        "seed": int, (optional, makes the run reproducible)
+        "replications": int, (optional, runs this many seeded copies and merges them)
+        "engine": str, (optional, "agent" (default) or "fast" for the macroscopic engine)
+        "profile": bool, (optional, adds a "Profile" of where the run's time went)
+        "stream": bool, (optional, streams the run back as NDJSON, see below)
     }
 
+    When "replications" is more than 1 the response is the merged summary produced by
+    run_replications rather than a single simulation output.
+
+    When "stream" is true (and there is a single replication) the response is streamed back as
+    newline delimited JSON while the simulation runs: progress messages with the number of
+    people at each station as the run advances, then each section of the output as soon as it
+    is ready. See stream_simulation for the messages sent.
+
+    Otherwise, a request with a "seed" which has been run before is answered from the result
+    cache without running it again, and only its output is uploaded to the database. The output
+    is uploaded in the background after the response has been sent, see save_status for when
+    it has been stored.
+
     NOTE: Go to test_sim.py to see examples
     """
 
@@ -50,8 +81,175 @@ def sim_request(request: Request, sim_id: int) -> Response:
     if not request.data:
         warning(f"Simulation #{sim_id} has not recieved any user data.")
 
+    try:
+        replications = int(request.data.get("replications", 1))
+    except (TypeError, ValueError):
+        replications = 0
+    if replications < 1:
+        return Response(
+            data={"error": "replications must be a positive integer."},
+            status=status.HTTP_400_BAD_REQUEST,
+        )
+
+    if replications > 1:
+        print(f"Running {replications} replications of simulation #{sim_id}.")
+        output = run_replications(request.data, sim_id, replications)
+        return Response(data=output, status=status.HTTP_201_CREATED)
+
+    if request.data.get("stream"):
+        print(f"Streaming simulation #{sim_id}.")
+        messages = stream_simulation(request.data, sim_id)
+        return StreamingHttpResponse(
+            (json.dumps(message, cls=JSONEncoder) + "\n" for message in messages),
+            content_type="application/x-ndjson",
+            status=status.HTTP_201_CREATED,
+        )
+
+    profile = request.data.get("profile")
+    output = None if profile else RESULTS.get(request.data)
+    if output is not None:
+        print(f"Simulation #{sim_id} found in the result cache.")
+        output["Simulation_id"] = sim_id
+        WRITER.submit(sim_id, output)
+        return Response(data=output, status=status.HTTP_201_CREATED)
+
     print(f"Running simulation #{sim_id}.")
     output = run_simulation(request.data, sim_id)
+    if not profile:
+        RESULTS.put(request.data, output)
+
+    return Response(data=output, status=status.HTTP_201_CREATED)
+
+
+@api_view(["POST"])
+def submit_job(request: Request, sim_id: int) -> Response:
+    """
+    This is the request responsible for running a simulation in the background. It takes the
+    same request.data as sim_request (without "replications" or "stream") and returns
+    straight away with the id of the job running it:
+
+    {
+        "job_id": str,
+        "sim_id": int,
+        "status": "queued",
+        "progress": 0.0,
+        "time": None,
+    }
+
+    The job can then be followed with job_status, its output fetched with job_result and it
+    can be stopped with cancel_job.
+    """
+
+    print(f"Simulation #{sim_id} job request recieved.")
+    if not request.data:
+        return Response(
+            data={"error": "No user data received."},
+            status=status.HTTP_400_BAD_REQUEST,
+        )
+
+    job = JOBS.submit(request.data, sim_id)
+    print(f"Simulation #{sim_id} queued as job {job.id}.")
+    return Response(data=job.describe(), status=status.HTTP_202_ACCEPTED)
+
+
+@api_view(["GET"])
+def job_status(request: Request, job_id: str) -> Response:
+    """
+    Returns the status and progress of a job, in the format described in submit_job.
+    """
+
+    job = JOBS.get(job_id)
+    if job is None:
+        return Response(status=status.HTTP_404_NOT_FOUND)
+
+    return Response(data=job.describe(), status=status.HTTP_200_OK)
+
+
+@api_view(["GET"])
+def job_result(request: Request, job_id: str) -> Response:
+    """
+    Returns the output of a finished job in the same format as the sim_request response. While
+    the job hasn't finished (or if it was cancelled) its status is returned instead, with a
+    202 or 410 response, and a failed job's status is returned with a 500 response.
+    """
+
+    job = JOBS.get(job_id)
+    if job is None:
+        return Response(status=status.HTTP_404_NOT_FOUND)
+
+    description = job.describe()
+    if description["status"] == DONE:
+        return Response(data=job.future.result(), status=status.HTTP_200_OK)
+    if description["status"] == FAILED:
+        return Response(data=description, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+    if job.future.done():
+        return Response(data=description, status=status.HTTP_410_GONE)
+    return Response(data=description, status=status.HTTP_202_ACCEPTED)
+
+
+@api_view(["POST"])
+def cancel_job(request: Request, job_id: str) -> Response:
+    """
+    Cancels a job. A job which is still queued never runs, and a running job stops after
+    the slice of the simulation it is on, without anything being uploaded to the database.
+    """
+
+    job = JOBS.cancel(job_id)
+    if job is None:
+        return Response(status=status.HTTP_404_NOT_FOUND)
+
+    print(f"Job {job_id} cancelled.")
+    return Response(data=job.describe(), status=status.HTTP_202_ACCEPTED)
+
+
+@api_view(["GET"])
+def save_status(request: Request, sim_id: int) -> Response:
+    """
+    Returns whether a simulation's output has been stored in the database yet, as
+    {"sim_id": int, "status": str}. The status is "pending" or "spilled" while the output waits
+    to be saved (in memory or on disk), "stored" once it is durably in the database, or
+    "failed" if saving it kept failing (it is tried again when the server restarts).
+    """
+
+    save = WRITER.status(sim_id)
+    if save is None:
+        return Response(status=status.HTTP_404_NOT_FOUND)
+
+    return Response(data={"sim_id": sim_id, "status": save}, status=status.HTTP_200_OK)
+
+
+@api_view(["POST"])
+def sweep_request(request: Request, sim_id: int) -> Response:
+    """
+    This is the request responsible for running several variants of one simulation request
+    at once and sending every variant's output back to the frontend. Nothing is uploaded to
+    the database.
+
+    request.data is expected to contain the same fields as sim_request, plus a "grid" of
+    values to try for any of the fields below. Every combination of values is run.
+    {
+        ...,
+        "grid": {
+            "env_start": list[int],
+            "time_horizon": list[int],
+            "active_suburbs": list[list[str]],
+            "active_stations": list[list[str]],
+        }
+    }
+    """
+
+    print(f"Sweep #{sim_id} request recieved.")
+    if not request.data or not request.data.get("grid"):
+        return Response(
+            data={"error": "A grid of values to sweep over is required."},
+            status=status.HTTP_400_BAD_REQUEST,
+        )
+
+    user_data = {k: v for k, v in request.data.items() if k != "grid"}
+    try:
+        output = run_sweep(user_data, sim_id, request.data["grid"])
+    except ValueError as e:
+        return Response(data={"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
 
     return Response(data=output, status=status.HTTP_201_CREATED)
 
@@ -138,13 +336,40 @@ def itin_check(request: Request) -> Response:
 @api_view(["GET"])
 def list_saved_sims(request: Request) -> Response:
     """
-    Reponisble for returning the list of saved simulations to the frontend.
-    NOTE: This will send just sim ids for now
+    Reponisble for returning the list of saved simulations to the frontend, one page at a time.
+    Only simulations which can be opened with get_sim_data are listed.
+
+    query params (both optional):
+    {
+        "after": int, (the "next" of the previous page)
+        "limit": int, (simulations per page, 50 by default)
+    }
+
+    return json of the form:
+    {
+        "results": [
+            {
+                "sim_id": int,
+                "created": str, (when the simulation was saved)
+            }, ...
+        ],
+        "next": int or None, (the "after" for the next page, None if this is the last)
+    }
     """
 
     print(f"Request for list of saved simulations received.")
 
-    output = [{"sim_id": 1}, {"sim_id": 2}, {"sim_id": 3}]
+    try:
+        after = request.query_params.get("after")
+        after = int(after) if after is not None else None
+        limit = int(request.query_params.get("limit", SAVED_SIMS_PAGE_SIZE))
+    except ValueError:
+        return Response(status=status.HTTP_400_BAD_REQUEST)
+    if limit < 1:
+        return Response(status=status.HTTP_400_BAD_REQUEST)
+
+    page, next_after = list_saved_sim_outputs(after, limit)
+    output = {"results": page, "next": next_after}
 
     return Response(data=output, status=status.HTTP_201_CREATED)
 
@@ -153,33 +378,27 @@ def list_saved_sims(request: Request) -> Response:
 def get_sim_data(request: Request) -> Response:
     """
     Given a sim_id, this will return the data for that sim in the same
-    format as the sim_request response.
+    format as the sim_request response. The output stored when the sim was
+    saved is sent back, so the sim isn't run again.
 
-    request o.t.f:
+    request o.t.f (or a sim_id query param):
     {
         sim_id: int
     }
     """
 
-    if not request.data:
+    sim_id = request.query_params.get("sim_id", request.data.get("sim_id"))
+    if sim_id is None:
         warning(f"No user data received.")
+        return Response(status=status.HTTP_400_BAD_REQUEST)
 
     print(f"Request for saved sim received")
 
     try:
-        if request.data["sim_id"] == 1:
-            user_data = {
-                "env_start": 0,
-                "time_horizon": 355,
-                "itineraries": [INPUT_ITINS["1850"][0]],
-                "snapshot_date": "2023-07-12",
-                "active_suburbs": "St Lucia",
-                "active_stations": "1850",
-            }
-
-            output = run_simulation(user_data, 1)
-
-    except:
+        output = load_sim_output(int(sim_id))
+    except ValueError:
         return Response(status=status.HTTP_400_BAD_REQUEST)
+    if output is None:
+        return Response(status=status.HTTP_404_NOT_FOUND)
 
     return Response(data=output, status=status.HTTP_201_CREATED)